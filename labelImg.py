@@ -6,9 +6,8 @@ import re
 import sys
 import subprocess
 import time
-import requests
 import math
-from PIL import Image
+import sqlite3
 
 from functools import partial
 from collections import defaultdict
@@ -32,7 +31,7 @@ except ImportError:
 import resources
 # Add internal libs
 from libs.constants import *
-from libs.lib import struct, newAction, newIcon, addActions, fmtShortcut
+from libs.lib import struct, newAction, newIcon, addActions, fmtShortcut, StageTimer
 from libs.settings import Settings
 from libs.shape import Shape, DEFAULT_LINE_COLOR, DEFAULT_FILL_COLOR
 from libs.canvas import Canvas
@@ -43,6 +42,18 @@ from libs.labelFile import LabelFile, LabelFileError
 from libs.toolBar import ToolBar
 from libs.pascal_voc_io import PascalVocReader
 from libs.pascal_voc_io import XML_EXT
+from libs.prefetcher import ImagePrefetcher, PREFETCH_BOTH, annotationPathFor
+from libs.imageCache import ImageCache, DEFAULT_CACHE_BYTES, fileIdentity
+from libs.tiledImage import isTileable, readRegion
+from libs.imageLoader import ImageLoader, previewFactor, readPreview
+from libs.labelChecker import LabelChecker, CheckJob, DEFAULT_BATCH_SIZE
+from libs.checkCache import CheckCache, checkKey, DEFAULT_MAX_ENTRIES
+from libs.boxRefiner import refineShapes
+from libs.saveQueue import SaveQueue, SaveRecord
+from libs.editJournal import EditJournal, applyEdits
+from libs.dirScanner import DirectoryScanner, scanImages, imageSortKey
+from libs.fileListModel import FileListModel
+from libs.datasetIndex import DatasetIndex
 from libs.ustr import ustr
 
 __appname__ = 'labelImg WAL'
@@ -97,7 +108,7 @@ class MainWindow(QMainWindow, WindowMixin):
         self.defaultSaveDir = None
         self.usingPascalVocFormat = True
         # For loading all image under a directory
-        self.mImgList = []
+        self.mImgList = FileListModel()
         self.labelHist = []
         self.dirname = None
         self.lastOpenDir = None
@@ -160,8 +171,11 @@ class MainWindow(QMainWindow, WindowMixin):
         self.dock.setWidget(labelListContainer)
 
         # Tzutalin 20160906 : Add file list and dock to move faster
-        self.fileListWidget = QListWidget()
-        self.fileListWidget.itemDoubleClicked.connect(self.fileitemDoubleClicked)
+        # Backed by a model so that only the visible rows cost anything.
+        self.fileListWidget = QListView()
+        self.fileListWidget.setUniformItemSizes(True)
+        self.fileListWidget.setModel(self.mImgList)
+        self.fileListWidget.doubleClicked.connect(self.fileitemDoubleClicked)
         filelistLayout = QVBoxLayout()
         filelistLayout.setContentsMargins(0, 0, 0, 0)
         filelistLayout.addWidget(self.fileListWidget)
@@ -189,7 +203,7 @@ class MainWindow(QMainWindow, WindowMixin):
         self.canvas.scrollRequest.connect(self.scrollRequest)
 
         self.canvas.newShape.connect(self.newShape)
-        self.canvas.shapeMoved.connect(self.setDirty)
+        self.canvas.shapeMoved.connect(self.shapeMoved)
         self.canvas.selectionChanged.connect(self.shapeSelectionChanged)
         self.canvas.drawingPolygon.connect(self.toggleDrawingSensitive)
 
@@ -279,6 +293,15 @@ class MainWindow(QMainWindow, WindowMixin):
         help = action('&Tutorial', self.tutorial, 'Ctrl+T', 'help',
                       u'Show demos')
 
+        cacheStats = action('Image &Cache Statistics', self.imageCacheStats,
+                            tip=u'Show image cache hits, misses and evictions')
+        latencyStats = action('Input &Latency Statistics', self.inputLatencyStats,
+                              tip=u'Show the delay from mouse and key input to the canvas frame')
+        saveStats = action('Annotation &Save Statistics', self.annotationSaveStats,
+                           tip=u'Show how many annotation files were written and how many saves left them unchanged')
+        clearCheckCache = action('Clear Label Check &Results', self.clearCheckCache,
+                                 tip=u'Forget the saved label check answers, e.g. after the server model changed')
+
         zoom = QWidgetAction(self)
         zoom.setDefaultWidget(self.zoomWidget)
         self.zoomWidget.setWhatsThis(
@@ -400,16 +423,23 @@ class MainWindow(QMainWindow, WindowMixin):
         self.singleClassMode.setCheckable(True)
         self.lastLabel = None
 
+        # Check labels by snapping them to image edges here instead of
+        # sending them to the server at self.url.
+        self.localRefine = QAction("Refine Labels Locally", self)
+        self.localRefine.setCheckable(True)
+
         addActions(self.menus.file,
                    (open, opendir, changeSavedir,openNextImgWithSameLabels, openAnnotation, self.menus.recentFiles, save, saveAs, close, None, quit))
         addActions(self.menus.help, (help,))
         addActions(self.menus.view, (
             self.autoSaving,
             self.singleClassMode,
+            self.localRefine,
             labels, advancedMode, None,
             hideAll, showAll, None,
             zoomIn, zoomOut, zoomOrg, None,
-            fitWindow, fitWidth))
+            fitWindow, fitWidth, None,
+            cacheStats, latencyStats, saveStats, clearCheckCache))
 
         self.menus.file.aboutToShow.connect(self.updateFileMenu)
 
@@ -481,6 +511,53 @@ class MainWindow(QMainWindow, WindowMixin):
         # Add chris
         Shape.difficult = self.difficult
 
+        # Images of an opened directory are listed in the background.
+        self.dirScanner = DirectoryScanner(parent=self)
+        self.dirScanGeneration = None
+        self.dirScanner.batchFound.connect(self.dirBatchFound)
+        self.dirScanner.finished.connect(self.dirScanFinished)
+        self.dirScanner.indexed.connect(self.dirIndexed)
+        self.datasetIndex = None
+        # Every shape edit is logged here as it is made, see EditJournal.
+        self.editJournal = None
+        self.scannedImages = []
+        # The first image of a scan is opened once, even if it fails to load.
+        self.firstImageTried = False
+
+        # Decoded images shared by loadFile, the prefetcher and checkPoints.
+        self.imageCache = ImageCache(int(settings.get(SETTING_IMAGE_CACHE_SIZE, DEFAULT_CACHE_BYTES)))
+        # Decode neighbouring images in the background while annotating.
+        self.prefetcher = ImagePrefetcher(
+            self.imageCache,
+            depth=int(settings.get(SETTING_PREFETCH_DEPTH, 2)),
+            direction=int(settings.get(SETTING_PREFETCH_DIRECTION, PREFETCH_BOTH)),
+            parent=self)
+        # JPEGs are first shown from a reduced decode, see loadFile.
+        self.imageLoader = ImageLoader(self)
+        self.imageLoader.loaded.connect(self.fullImageLoaded)
+        self.previewPath = None
+        # Annotations are written behind the user's back, so moving on to
+        # the next image does not wait for the disk.
+        self.saveQueue = SaveQueue(self)
+        self.saveQueue.saved.connect(self.annotationSaved)
+        self.saveQueue.failed.connect(self.annotationSaveFailed)
+        # Absolute path -> fingerprint of what that file holds, for the
+        # current image's annotation files; saves that would not change
+        # them are skipped.
+        self.savedFingerprints = {}
+        # Label checks run in the background and correct shapes as they
+        # come back; answers for unchanged crops are reused from disk.
+        self.checkCache = CheckCache(
+            maxEntries=int(settings.get(SETTING_CHECK_CACHE_SIZE, DEFAULT_MAX_ENTRIES)))
+        self.labelChecker = LabelChecker(
+            batchSize=int(settings.get(SETTING_CHECK_BATCH_SIZE, DEFAULT_BATCH_SIZE)),
+            cache=self.checkCache, parent=self)
+        self.labelChecker.checked.connect(self.labelChecked)
+        self.labelChecker.failed.connect(self.labelCheckFailed)
+        self.labelChecker.progress.connect(self.labelCheckProgress)
+        self.labelChecker.finished.connect(self.labelCheckFinished)
+        self.labelChecker.cacheFailed.connect(self.labelCheckCacheFailed)
+
         def xbool(x):
             if isinstance(x, QVariant):
                 return x.toBool()
@@ -489,12 +566,17 @@ class MainWindow(QMainWindow, WindowMixin):
         if xbool(settings.get(SETTING_ADVANCE_MODE, False)):
             self.actions.advancedMode.setChecked(True)
             self.toggleAdvancedMode()
+        self.localRefine.setChecked(xbool(settings.get(SETTING_CHECK_LOCAL, False)))
 
         # Populate the File menu dynamically.
         self.updateFileMenu()
         # Since loading the file may take some time, make sure it runs in the
         # background.
         self.queueEvent(partial(self.loadFile, self.filePath or ""))
+        # Without a file to open, reopen the last directory if it was indexed.
+        if not self.filePath and self.lastOpenDir and os.path.isdir(self.lastOpenDir) \
+                and DatasetIndex.exists(self.lastOpenDir):
+            self.queueEvent(partial(self.importDirImages, self.lastOpenDir))
 
         # Callbacks:
         self.zoomWidget.valueChanged.connect(self.paintCanvas)
@@ -572,6 +654,10 @@ class MainWindow(QMainWindow, WindowMixin):
         self.filePath = None
         self.imageData = None
         self.labelFile = None
+        self.loadTimings = []
+        self.previewPath = None
+        self.imageLoader.cancel()
+        self.labelChecker.cancel()
         self.canvas.resetState()
 
     def currentItem(self):
@@ -672,9 +758,52 @@ class MainWindow(QMainWindow, WindowMixin):
             self.setDirty()
 
 
-    def checkPoints(self,points,label):
-        img=Image.open(self.filePath)
-        imgWidth,imgHeight=img.size
+    def checkPoints(self, points, label, shape=None):
+        self.checkShapes([(points, label, shape or self.canvas.selectedShape)])
+
+    def checkShapes(self, shapes):
+        """Check, or refine here, the (points, label, shape) of the current image."""
+        size = self.canvas.imageSize()
+        windows = [self.checkArea(size, points) for points, label, shape in shapes]
+        # Decoded once for all of them.
+        image, origin = self.checkRegion(windows)
+        if image is None:
+            self.status('Cannot check labels: %s cannot be read' % self.filePath)
+            return
+        if not self.localRefine.isChecked():
+            self.labelChecker.check(self.url, [
+                self.checkJob(image, origin, bigArea, label, shape)
+                for (points, label, shape), bigArea in zip(shapes, windows)])
+            return
+        # Fast enough to run here: all shapes of an image in one pass, and
+        # only the windows are needed, not crops or cache keys.
+        start = time.time()
+        values = refineShapes(image, [shape for points, label, shape in shapes], windows, origin)
+        for (points, label, shape), bigArea, response in zip(shapes, windows, values):
+            self.moveCheckedShape(shape, bigArea, response)
+        self.status('Refined %d labels in %.0f ms' % (len(shapes), (time.time() - start) * 1000))
+
+    def checkRegion(self, windows):
+        """(QImage, (x, y) of its top left corner) covering windows, or (None, None).
+
+        An image opened tiled is too big to decode whole: only the part
+        the windows cover is read.
+        """
+        tiles = self.canvas.tiles
+        if not tiles.isOpen():
+            return self.decodedImage(self.filePath)[1], (0, 0)
+        left = int(math.floor(min(window[0] for window in windows)))
+        top = int(math.floor(min(window[1] for window in windows)))
+        right = int(math.ceil(max(window[2] for window in windows)))
+        bottom = int(math.ceil(max(window[3] for window in windows)))
+        image = readRegion(tiles.path, QRect(left, top, right - left, bottom - top), 1)
+        if image.isNull():
+            return None, None
+        return image, (left, top)
+
+    def checkArea(self, size, points):
+        """The area around points, half the box size on each side, within size."""
+        imgWidth,imgHeight=size.width(),size.height()
         area=self.deFormatedPoints(points)
         pWidth=round((area[2]-area[0])*0.5,0)
         pHeight=round((area[3]-area[1])*0.5,0)
@@ -691,45 +820,52 @@ class MainWindow(QMainWindow, WindowMixin):
         botRightY=area[3]+pHeight
         if botRightY> imgHeight:
             botRightY=imgHeight
-        bigArea=(topLeftX,topLeftY,botRightX,botRightY)
+        return (topLeftX,topLeftY,botRightX,botRightY)
+
+    def checkJob(self, img, origin, bigArea, label, shape):
+        """CheckJob for the crop bigArea of img, whose top left corner is at origin."""
         formIndex=self.filePath.rfind(".")
         formatImg=self.filePath[formIndex:]
-        crops=img.crop(area)
-        bigCrops=img.crop(bigArea)
-        # crops.show()
-        # bigCrops.show()
-        directory=self.dirname
-        try:
-            os.chdir(directory+"\\temp")
-        except:
-            os.chdir(directory)
-        if not os.path.exists(directory+"\\temp"):
-            os.makedirs('temp')
-            os.chdir(directory+"\\temp")
+        bigCrops=img.copy(QRect(int(bigArea[0])-origin[0], int(bigArea[1])-origin[1],
+                                int(bigArea[2]-bigArea[0]), int(bigArea[3]-bigArea[1])))
         imageName=label+" "+format(round(bigArea[0],0))+"&"+format(round(bigArea[3],0))+formatImg
-        bigCrops.save(imageName)
-        #  Send to server and get response
-        files={'file': open(imageName,'rb')}
-        r=requests.post(self.url,files=files)
-        # print(r)
-        if format(r)=="<Response [200]>":
-            # print(imageName+" is good  !!!")
-            response=[0.5,0.5,1,0.5]
-            ######nebaigtas tettragonu patikrinimas#########
-            if self.canvas.selectedShape.tetragon:
-                response=[0.3,0.3,0.6,0.3,0.6,0.6,0.3,0.6]
-            if len(response)==4:
-                self.movePoints(response,bigArea)
-            elif len(response)==8:
-                self.moveTetragonPoints(response,bigArea)
-            else:
-                print("response array Fail = ",response)
+        # The crop is encoded in memory by the checker's workers.
+        return CheckJob(shape, label, bigCrops, bigArea, shape.tetragon, imageName,
+                        formatImg[1:].upper(),
+                        checkKey(self.url, self.filePath, bigArea, shape.tetragon, label))
+
+    def labelChecked(self, job, response):
+        self.moveCheckedShape(job.shape, job.bigArea, response)
+
+    def moveCheckedShape(self, shape, bigArea, response):
+        if shape not in self.canvas.shapes:
+            # Deleted while the check was running.
+            return
+        if len(response)==4:
+            self.movePoints(response,bigArea,shape)
+        elif len(response)==8:
+            self.moveTetragonPoints(response,bigArea,shape)
         else:
-            print(imageName+" is bad  XXX")
-            print(r)
-        r.close()
+            print("response array Fail = ",response)
+            return
+        self.journalShape(shape)
+        self.setDirty()
+
+    def labelCheckFailed(self, job, error):
+        print(job.name+" is bad  XXX")
+        print(error)
+
+    def labelCheckCacheFailed(self, error):
+        self.status('Label check results not cached: %s' % error)
+
+    def labelCheckProgress(self, done, total):
+        self.status('Checking labels: %d/%d' % (done, total), 0)
+
+    def labelCheckFinished(self):
+        print("DONE!! patikrinta %s etikeciu " % self.labelChecker.total)
+        self.status('Checked %d labels' % self.labelChecker.total)
 
-    def movePoints(self,arr,bigArea):
+    def movePoints(self,arr,bigArea,shape=None):
         pWidth=bigArea[2]-bigArea[0]
         pHeigh=bigArea[3]-bigArea[1]
         CenterPoint=[arr[0]*pWidth+bigArea[0],arr[1]*pHeigh+bigArea[1]]
@@ -739,10 +875,10 @@ class MainWindow(QMainWindow, WindowMixin):
         botRightY=round(CenterPoint[1]+(arr[2]*pHeigh)/2,0)
         checkedArr=[topLeftX,topLeftY,botRightX,botRightY]
         # Paiting place
-        self.canvas.selectedShape.points=self.formatedPoints(checkedArr)
-        self.repaint()
+        (shape or self.canvas.selectedShape).points=self.formatedPoints(checkedArr)
+        self.canvas.update()
 
-    def moveTetragonPoints(self,arr,bigArea):
+    def moveTetragonPoints(self,arr,bigArea,shape=None):
         # print(arr,bigArea)
         pWidth=bigArea[2]-bigArea[0]
         pHeigh=bigArea[3]-bigArea[1]
@@ -756,8 +892,8 @@ class MainWindow(QMainWindow, WindowMixin):
         k3y=round((pHeigh*arr[7]+bigArea[1]),0)
         ret=[QPointF(k0x,k0y),QPointF(k1x,k1y),QPointF(k2x,k2y),QPointF(k3x,k3y)]
         # print(ret)
-        self.canvas.selectedShape.points=ret
-        self.repaint()
+        (shape or self.canvas.selectedShape).points=ret
+        self.canvas.update()
 
     def formatedPoints(self,arr):
         topLeft=QPointF(arr[0],arr[1])
@@ -788,18 +924,19 @@ class MainWindow(QMainWindow, WindowMixin):
             self.checkPoints(points,label)
 
     def checkAllLabels(self):
-        allLabels=self.shapesToItems
-        for i in allLabels:
-            self.canvas.selectShape(i)
-            self.checkPoints(i.points,i.label)
-        print("DONE!! patikrinta %s etikeciu " % self.labelList.count())
+        # Every shape goes out at once, several crops per request when the
+        # server takes batches; corrections are applied as answers arrive.
+        if self.shapesToItems:
+            self.checkShapes([(shape.points, shape.label, shape) for shape in self.shapesToItems])
 
     # Tzutalin 20160906 : Add file list and dock to move faster
-    def fileitemDoubleClicked(self, item=None):
-        currIndex = self.mImgList.index(ustr(item.text()))
-        if currIndex < len(self.mImgList):
+    def fileitemDoubleClicked(self, index=None):
+        currIndex = index.row()
+        if 0 <= currIndex < len(self.mImgList):
             filename = self.mImgList[currIndex]
             if filename:
+                # A jump makes the neighbours being decoded useless.
+                self.prefetcher.cancel()
                 self.loadFile(filename)
 
     # Add chris
@@ -823,6 +960,7 @@ class MainWindow(QMainWindow, WindowMixin):
         try:
             if difficult != shape.difficult:
                 shape.difficult = difficult
+                self.journalShape(shape)
                 self.setDirty()
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
@@ -886,12 +1024,7 @@ class MainWindow(QMainWindow, WindowMixin):
 
         self.canvas.loadShapes(s)
 
-    def saveLabels(self, annotationFilePath):
-        annotationFilePath = ustr(annotationFilePath)
-        if self.labelFile is None:
-            self.labelFile = LabelFile()
-            self.labelFile.verified = self.canvas.verified
-
+    def formatShapes(self):
         def format_shape(s):
             return dict(label=s.label,
                         line_color=s.line_color.getRgb()
@@ -905,26 +1038,160 @@ class MainWindow(QMainWindow, WindowMixin):
                         deg=s.deg,
                         shape3D=s.shape3D)
 
-        shapes = [format_shape(shape) for shape in self.canvas.shapes]
+        return [format_shape(shape) for shape in self.canvas.shapes]
+
+    def changedFingerprint(self, path, fingerprint):
+        """fingerprint, or None if the file at path already holds it."""
+        path = os.path.abspath(path)
+        if path not in self.savedFingerprints:
+            # Darknet files are only read once a save needs them.
+            data = read(path, None) if path.endswith('.txt') else None
+            self.savedFingerprints[path] = None if data is None else LabelFile.textFingerprint(data)
+        if self.savedFingerprints[path] == fingerprint:
+            return None
+        self.savedFingerprints[path] = fingerprint
+        return fingerprint
+
+    def saveLabels(self, annotationFilePath):
+        annotationFilePath = ustr(annotationFilePath)
+        if self.labelFile is None:
+            self.labelFile = LabelFile()
+            self.labelFile.verified = self.canvas.verified
+
+        shapes = self.formatShapes()
         # print(shapes)
         # Can add differrent annotation formats here
         try:
             if self.usingPascalVocFormat is True:
                 annotationFilePath = annotationFilePath.split(".")[0] + XML_EXT
                 print('Img: ' + self.filePath +' -> Its xml: ' + annotationFilePath)
-                self.labelFile.savePascalVocFormat(annotationFilePath, shapes, self.filePath, self.imageData,self.lineColor.getRgb(), self.fillColor.getRgb())
-                self.labelFile.saveDarknetTxtFormat(self.filePath, self.image, shapes, self.labelHist)
+                verified = self.labelFile.verified
+                darknetText = LabelFile.darknetText(self.canvas.imageSize(), shapes,
+                                                    self.labelHist)
+                # Only the files the save would change are written.
+                fingerprint = LabelFile.shapesFingerprint(shapes, verified)
+                xmlShapes = tuple(shapes) if self.changedFingerprint(
+                    annotationFilePath, fingerprint) else None
+                if not self.changedFingerprint(LabelFile.darknetPath(self.filePath),
+                                               LabelFile.textFingerprint(darknetText)):
+                    darknetText = None
+                # A snapshot: the shapes may change, or another image be
+                # loaded, before the writer gets to it.
+                record = SaveRecord(
+                    annotationFilePath, self.filePath, xmlShapes, verified, darknetText,
+                    self.lineColor.getRgb(), self.fillColor.getRgb(),
+                    self.journalSaving(fingerprint) if xmlShapes is not None
+                    else self.journalSeq())
+                if xmlShapes is None and not self.saveQueue.isQueued(annotationFilePath):
+                    # The file already holds the edits.
+                    self.journalSaved(record)
+                self.saveQueue.submit(record)
             else:
                 self.labelFile.save(annotationFilePath, shapes, self.filePath, self.imageData,
                                     self.lineColor.getRgb(), self.fillColor.getRgb())
+                self.journalSaved(SaveRecord(annotationFilePath, self.filePath, shapes, None,
+                                             None, None, None, self.journalSeq()))
             return True
-        except LabelFileError as e:
+        except (LabelFileError, ValueError) as e:
             self.errorMessage(u'Error saving label data',
                               u'<b>%s</b>' % e)
             return False
 
+    def annotationSaved(self, record):
+        # Before indexing, which may have an error to show instead.
+        self.status('Saved to  %s' % record.annotationPath)
+        if record.shapes is not None:
+            self.indexAnnotation(record.imagePath, record.annotationPath, record.verified,
+                                 len(record.shapes))
+            self.journalSaved(record)
+
+    def journalSeq(self):
+        return self.editJournal.seq if self.editJournal is not None else 0
+
+    def journalSaving(self, fingerprint):
+        if self.editJournal is None:
+            return 0
+        return self.editJournal.saving(self.filePath, fingerprint)
+
+    def journalSaved(self, record):
+        if self.editJournal is not None:
+            self.editJournal.saved(record.imagePath, record.journalSeq)
+
+    def openEditJournal(self, root):
+        if self.editJournal is not None:
+            self.editJournal.close()
+            self.editJournal = None
+        if not root:
+            return
+        try:
+            self.editJournal = EditJournal(root, parent=self)
+        except (IOError, OSError) as e:
+            self.errorMessage(u'Edit journal unavailable',
+                              u'Edits will not survive a crash.<br>%s' % e)
+            return
+        self.editJournal.syncFailed.connect(self.editJournalSyncFailed)
+
+    def editJournalSyncFailed(self, error):
+        self.status('Edit journal not written to disk, edits may not survive a crash: %s' % error)
+
+    def recoveredNote(self):
+        """What the status bar says about images with recovered edits."""
+        if self.editJournal is None or not self.editJournal.unsavedImages():
+            return ''
+        return ', unsaved edits recovered for %d images' % len(self.editJournal.unsavedImages())
+
+    def recoverEdits(self, reader):
+        """Reapply the journaled edits the annotation of this image misses.
+
+        They are edits that were neither saved nor discarded, because the
+        program stopped first; the image is left dirty, for the user to
+        save them.  Returns how many there were.
+        """
+        if self.editJournal is None:
+            return 0
+        if reader is not None:
+            # The program may have died after the annotation was written
+            # but before the save was journaled.
+            upTo = self.editJournal.savedUpTo(
+                self.filePath, self.savedFingerprints.get(os.path.abspath(reader.filepath)))
+            if upTo:
+                self.editJournal.saved(self.filePath, upTo)
+        edits = self.editJournal.unsavedEdits(self.filePath)
+        if not edits:
+            return 0
+        shapes = applyEdits(reader.getShapes() if reader is not None else [], edits)
+        self.itemsToShapes.clear()
+        self.shapesToItems.clear()
+        self.labelList.clear()
+        self.loadLabels(shapes)
+        self.setDirty()
+        return len(edits)
+
+    def annotationSaveFailed(self, record, error):
+        if record.imagePath == self.filePath:
+            # What is on disk is no longer known.
+            self.savedFingerprints = {}
+            self.setDirty()
+        self.errorMessage(u'Error saving label data',
+                          u'<b>%s</b><br>%s' % (record.annotationPath, error))
+
+    def flushSaves(self):
+        """Wait for the queued saves, reporting any that failed."""
+        for record, error in self.saveQueue.flush():
+            self.annotationSaveFailed(record, error)
+
+    def indexAnnotation(self, imagePath, annotationFilePath, verified, objects):
+        if self.datasetIndex is None or imagePath not in self.mImgList:
+            return
+        try:
+            self.datasetIndex.updateAnnotation(imagePath, annotationFilePath, verified, objects)
+        except sqlite3.Error as e:
+            self.status('Dataset index not updated: %s' % e)
+
     def copySelectedShape(self):
-        self.addLabel(self.canvas.copySelectedShape())
+        shape = self.canvas.copySelectedShape()
+        self.addLabel(shape)
+        self.journalShape(shape)
         # fix copy and delete
         self.shapeSelectionChanged(True)
 
@@ -942,10 +1209,36 @@ class MainWindow(QMainWindow, WindowMixin):
         label = item.text()
         if label != shape.label:
             shape.label = item.text()
+            self.journalShape(shape)
             self.setDirty()
         else:  # User probably changed item visibility
             self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
 
+    def shapeMoved(self):
+        canvas = self.canvas
+        # A dragged vertex or rotation handle moves the highlighted shape.
+        self.journalShape(canvas.hShape if canvas.selectedVertex()
+                          else canvas.selectedShape or canvas.hShape)
+        self.setDirty()
+
+    def journalShape(self, shape):
+        if self.editJournal is None or not self.filePath:
+            return
+        try:
+            index = self.canvas.shapes.index(shape)
+        except ValueError:
+            return
+        self.editJournal.shapeChanged(self.filePath, index, shape)
+
+    def journalShapes(self):
+        if self.editJournal is not None and self.filePath:
+            self.editJournal.shapesLoaded(self.filePath, self.canvas.shapes)
+
+    def journalDiscarded(self):
+        """Record that the unsaved changes to the current image are dropped."""
+        if self.dirty and self.filePath and self.editJournal is not None:
+            self.editJournal.discard(self.filePath)
+
     # Callback functions:
     def newShape(self):
         """Pop-up and give focus to the label editor.
@@ -968,7 +1261,9 @@ class MainWindow(QMainWindow, WindowMixin):
         self.diffcButton.setChecked(False)
         if text is not None:
             self.prevLabelText = text
-            self.addLabel(self.canvas.setLastLabel(text))
+            shape = self.canvas.setLastLabel(text)
+            self.addLabel(shape)
+            self.journalShape(shape)
             if self.beginner():  # Switch to edit mode.
                 self.canvas.setEditing(True)
                 self.actions.create.setEnabled(True)
@@ -1066,86 +1361,192 @@ class MainWindow(QMainWindow, WindowMixin):
             item.setCheckState(Qt.Checked if value else Qt.Unchecked)
 
     def loadFile(self, filePath=None):
-        """Load the specified file, or the last opened file if None."""
+        """Load the specified file, or the last opened file if None.
+
+        The load runs as a pipeline: resolve paths, read and decode the
+        image once, parse the annotation once, build the shapes and paint
+        once.  Per-stage timings in ms end up in self.loadTimings.
+        """
+        # Unsaved changes left behind were discarded.
+        self.journalDiscarded()
         self.resetState()
         self.canvas.setEnabled(False)
         if filePath is None:
             filePath = self.settings.get(SETTING_FILENAME)
 
+        timer = StageTimer()
         unicodeFilePath = ustr(filePath)
         # Tzutalin 20160906 : Add file list and dock to move faster
         # Highlight the file item
-        if unicodeFilePath and self.fileListWidget.count() > 0:
-            index = self.mImgList.index(unicodeFilePath)
-            fileWidgetItem = self.fileListWidget.item(index)
-            fileWidgetItem.setSelected(True)
-
-        if unicodeFilePath and os.path.exists(unicodeFilePath):
-            if LabelFile.isLabelFile(unicodeFilePath):
-                try:
-                    self.labelFile = LabelFile(unicodeFilePath)
-                except LabelFileError as e:
-                    self.errorMessage(u'Error opening file',
-                                      (u"<p><b>%s</b></p>"
-                                       u"<p>Make sure <i>%s</i> is a valid label file.")
-                                      % (e, unicodeFilePath))
-                    self.status("Error reading %s" % unicodeFilePath)
-                    return False
-                self.imageData = self.labelFile.imageData
-                #self.lineColor = QColor(*self.labelFile.lineColor)
-                #self.fillColor = QColor(*self.labelFile.fillColor)
-            else:
-                # Load image:
-                # read data first and store for saving into label file.
-                self.imageData = read(unicodeFilePath, None)
-                # Label xml file and show bound box according to its filename
-                self.labelFile = None
-                if self.usingPascalVocFormat is True:
-
-                    basename = unicodeFilePath.split(".")[0] + XML_EXT
-                    if os.path.exists(basename):
-                        self.labelFile = LabelFile(basename)
-
-            image = QImage.fromData(self.imageData)
-            if image.isNull():
+        if unicodeFilePath and len(self.mImgList) > 0:
+            self.selectFileListRow(self.mImgList.rowOf(unicodeFilePath))
+
+        if not (unicodeFilePath and os.path.exists(unicodeFilePath)):
+            return False
+
+        # Resolve paths. A label file names its image, so it is parsed first.
+        reader = None
+        if LabelFile.isLabelFile(unicodeFilePath):
+            try:
+                reader = PascalVocReader(unicodeFilePath)
+            except LabelFileError as e:
                 self.errorMessage(u'Error opening file',
-                                  u"<p>Make sure <i>%s</i> is a valid image file." % unicodeFilePath)
+                                  (u"<p><b>%s</b></p>"
+                                   u"<p>Make sure <i>%s</i> is a valid label file.")
+                                  % (e, unicodeFilePath))
                 self.status("Error reading %s" % unicodeFilePath)
                 return False
-            self.status("Loaded %s" % os.path.basename(unicodeFilePath))
-            self.image = image
-            self.filePath = unicodeFilePath
-            self.canvas.loadPixmap(QPixmap.fromImage(image))
-            self.setClean()
-            self.canvas.setEnabled(True)
-            self.adjustScale(initial=True)
-            self.paintCanvas()
-            self.addRecentFile(self.filePath)
-            self.toggleActions(True)
+            imagePath = reader.imagePath
+            timer.mark('parse')
+        else:
+            imagePath = unicodeFilePath
+        xmlPath = self.annotationPath(unicodeFilePath)
+        timer.mark('resolve')
+
+        # Read and decode the image, at most once.  Very large images are
+        # never decoded whole: the canvas decodes the tiles in view.  JPEGs
+        # that will be shown reduced are first decoded at the size they are
+        # shown at; the full image follows in the background.
+        tiled = isTileable(imagePath)
+        factor, fullSize = 1, None
+        if tiled:
+            self.imageData, image = None, self.canvas.loadTiledImage(imagePath)
+            timer.mark('decode')
+        else:
+            if imagePath not in self.imageCache:
+                factor, fullSize = previewFactor(imagePath, self.fitWindowSize(),
+                                                 self.canvas.pixelRatio())
+            if factor > 1:
+                self.imageData, image = None, readPreview(imagePath, factor)
+                timer.mark('preview')
+                if image.isNull():
+                    image = None
+            else:
+                self.imageData, image = self.decodedImage(imagePath, timer)
+        if image is None:
+            self.errorMessage(u'Error opening file',
+                              u"<p>Make sure <i>%s</i> is a valid image file." % unicodeFilePath)
+            self.status("Error reading %s" % unicodeFilePath)
+            return False
 
-            # Label xml file and show bound box according to its filename
-            if self.usingPascalVocFormat is True:
-                if self.defaultSaveDir is not None:
-                    basename = os.path.basename(
-                        os.path.splitext(self.filePath)[0]) + XML_EXT
-                    xmlPath = os.path.join(self.defaultSaveDir, basename)
-                    # print(xmlPath)
-                    self.loadPascalXMLByFilename(xmlPath)
-                else:
-                    xmlPath = os.path.splitext(filePath)[0] + XML_EXT
-                    if os.path.isfile(xmlPath):
-                        self.loadPascalXMLByFilename(xmlPath)
-
-            self.setWindowTitle(__appname__ + ' ' + filePath)
-
-            # Default : select last item if there is at least one item
-            if self.labelList.count():
-                self.labelList.setCurrentItem(self.labelList.item(self.labelList.count()-1))
-                self.labelList.item(self.labelList.count()-1).setSelected(True)
-
-            self.canvas.setFocus(True)
-            return True
-        return False
+        # Parse the annotation, unless the prefetcher or the label file
+        # branch above already did.
+        labelReader = reader
+        if self.usingPascalVocFormat is True:
+            if self.saveQueue.isQueued(xmlPath):
+                # Coming back before its save was written.
+                self.flushSaves()
+            if reader is None or reader.filepath != xmlPath:
+                reader = self.prefetcher.takeReader(unicodeFilePath, xmlPath)
+                if self.saveQueue.takeWritten(xmlPath):
+                    # Parsed before the last save, perhaps.
+                    reader = None
+            if reader is None and os.path.isfile(xmlPath):
+                reader = PascalVocReader(xmlPath)
+                timer.mark('parse')
+        labelReader = labelReader or reader
+        self.labelFile = LabelFile(reader=labelReader) if labelReader is not None else None
+        self.savedFingerprints = {}
+
+        self.image = image
+        self.filePath = unicodeFilePath
+        if factor > 1:
+            self.canvas.loadPreview(QPixmap.fromImage(image), fullSize)
+            self.previewPath = imagePath
+            self.imageLoader.load(imagePath)
+        elif not tiled:
+            self.canvas.loadPixmap(QPixmap.fromImage(image), image)
+        self.setClean()
+        self.canvas.setEnabled(True)
+        self.addRecentFile(self.filePath)
+        self.toggleActions(True)
+
+        # Build the shapes.
+        if reader is not None:
+            self.loadAnnotation(reader)
+            self.savedFingerprints[os.path.abspath(reader.filepath)] = \
+                LabelFile.shapesFingerprint(self.formatShapes(), reader.verified)
+        recovered = self.recoverEdits(reader)
+        self.setWindowTitle(__appname__ + ' ' + filePath)
+
+        # Default : select last item if there is at least one item
+        if self.labelList.count():
+            self.labelList.setCurrentItem(self.labelList.item(self.labelList.count()-1))
+            self.labelList.item(self.labelList.count()-1).setSelected(True)
+        timer.mark('shapes')
+
+        # Paint: loadPixmap and loadShapes only schedule an update, so the
+        # canvas is drawn once after the scale is known.
+        self.adjustScale(initial=True)
+        self.paintCanvas()
+        timer.mark('paint')
+
+        self.loadTimings = timer.timings
+        self.status("Loaded %s in %d ms" % (os.path.basename(unicodeFilePath), timer.total()) +
+                    (", %d unsaved edits recovered" % recovered if recovered else ""))
+        self.canvas.setFocus(True)
+        self.prefetcher.prefetch(self.mImgList, self.mImgList.rowOf(self.filePath),
+                                 self.defaultSaveDir)
+        return True
+
+    def selectFileListRow(self, row):
+        if row < 0:
+            return
+        index = self.mImgList.index(row)
+        self.fileListWidget.setCurrentIndex(index)
+        self.fileListWidget.scrollTo(index)
+
+    def annotationPath(self, imagePath):
+        return annotationPathFor(imagePath, self.defaultSaveDir)
+
+    def decodedImage(self, imagePath, timer=None):
+        """Return (imageData, QImage) for imagePath, going through the image cache."""
+        entry = self.imageCache.get(imagePath)
+        if entry is not None:
+            timer and timer.mark('cache')
+            return entry.imageData, entry.image
+        identity = fileIdentity(imagePath)
+        imageData = read(imagePath, None)
+        timer and timer.mark('read')
+        if imageData is None:
+            return None, None
+        image = QImage.fromData(imageData)
+        timer and timer.mark('decode')
+        if image.isNull():
+            return imageData, None
+        self.imageCache.put(imagePath, imageData, image, identity)
+        return imageData, image
+
+    def imageCacheStats(self):
+        stats = self.imageCache.stats()
+        self.status('Image cache: %d images, %.1f/%.1f MB, %d hits, %d misses, %d evictions' %
+                    (stats['entries'], stats['bytes'] / 1048576.0, stats['maxBytes'] / 1048576.0,
+                     stats['hits'], stats['misses'], stats['evictions']))
+        return stats
+
+    def inputLatencyStats(self):
+        stats = self.canvas.latency.stats()
+        self.status('Input latency: %.1f ms mean, %.1f ms p95, %.1f ms max over %d frames; '
+                    '%d events handled in %d updates' %
+                    (stats['mean'], stats['p95'], stats['max'], stats['frames'],
+                     stats['events'], stats['updates']))
+        return stats
+
+    def annotationSaveStats(self):
+        stats = self.saveQueue.stats()
+        self.status('Annotation saves: %d XML and %d Darknet files written, '
+                    '%d and %d left unchanged' %
+                    (stats['xmlWrites'], stats['darknetWrites'],
+                     stats['xmlSkipped'], stats['darknetSkipped']))
+        return stats
+
+    def clearCheckCache(self):
+        try:
+            self.checkCache.clear()
+        except sqlite3.Error as e:
+            self.errorMessage(u'Error clearing label check results', u'<b>%s</b>' % e)
+            return
+        self.status('Label check results cleared (%d reused this session)' % self.checkCache.hits)
 
     def resizeEvent(self, event):
         if self.canvas and not self.image.isNull() \
@@ -1153,9 +1554,28 @@ class MainWindow(QMainWindow, WindowMixin):
             self.adjustScale()
         super(MainWindow, self).resizeEvent(event)
 
+    def fullImageLoaded(self, generation, record):
+        if generation != self.imageLoader.generation or record.path != self.previewPath:
+            return
+        self.imageCache.put(record.path, record.imageData, record.image, record.identity)
+        self.showFullImage(record.imageData, record.image)
+
+    def showFullImage(self, imageData, image):
+        self.previewPath = None
+        self.imageData = imageData
+        self.image = image
+        self.canvas.upgradePixmap(QPixmap.fromImage(image), image)
+
     def paintCanvas(self):
         assert not self.image.isNull(), "cannot paint null image"
         self.canvas.scale = 0.01 * self.zoomWidget.value()
+        if self.previewPath is not None and self.canvas.previewTooSmall():
+            # Zoomed in past the preview before the background decode
+            # finished: decode here rather than show a blurred image.
+            self.imageLoader.cancel()
+            imageData, image = self.decodedImage(self.previewPath)
+            if image is not None:
+                self.showFullImage(imageData, image)
         self.canvas.adjustSize()
         self.canvas.update()
 
@@ -1163,26 +1583,32 @@ class MainWindow(QMainWindow, WindowMixin):
         value = self.scalers[self.FIT_WINDOW if initial else self.zoomMode]()
         self.zoomWidget.setValue(int(100 * value))
 
+    def fitWindowSize(self):
+        e = 2.0  # So that no scrollbars are generated.
+        return QSizeF(self.centralWidget().width() - e, self.centralWidget().height() - e)
+
     def scaleFitWindow(self):
         """Figure out the size of the pixmap in order to fit the main widget."""
-        e = 2.0  # So that no scrollbars are generated.
-        w1 = self.centralWidget().width() - e
-        h1 = self.centralWidget().height() - e
+        area = self.fitWindowSize()
+        w1 = area.width()
+        h1 = area.height()
         a1 = w1 / h1
         # Calculate a new scale value based on the pixmap's aspect ratio.
-        w2 = self.canvas.pixmap.width() - 0.0
-        h2 = self.canvas.pixmap.height() - 0.0
+        w2 = self.canvas.imageSize().width() - 0.0
+        h2 = self.canvas.imageSize().height() - 0.0
         a2 = w2 / h2
         return w1 / w2 if a2 >= a1 else h1 / h2
 
     def scaleFitWidth(self):
         # The epsilon does not seem to work too well here.
         w = self.centralWidget().width() - 2.0
-        return w / self.canvas.pixmap.width()
+        return w / self.canvas.imageSize().width()
 
     def closeEvent(self, event):
         if not self.mayContinue():
             event.ignore()
+        else:
+            self.journalDiscarded()
         settings = self.settings
         # If it loads images from dir, don't load it at the begining
         if self.dirname is None:
@@ -1197,6 +1623,17 @@ class MainWindow(QMainWindow, WindowMixin):
         settings[SETTING_FILL_COLOR] = self.fillColor
         settings[SETTING_RECENT_FILES] = self.recentFiles
         settings[SETTING_ADVANCE_MODE] = not self._beginner
+        settings[SETTING_PREFETCH_DEPTH] = self.prefetcher.depth
+        settings[SETTING_PREFETCH_DIRECTION] = self.prefetcher.direction
+        settings[SETTING_IMAGE_CACHE_SIZE] = self.imageCache.maxBytes
+        settings[SETTING_CHECK_BATCH_SIZE] = self.labelChecker.batchSize
+        settings[SETTING_CHECK_CACHE_SIZE] = self.checkCache.maxEntries
+        settings[SETTING_CHECK_LOCAL] = self.localRefine.isChecked()
+        self.prefetcher.clear()
+        self.dirScanner.cancel()
+        self.flushSaves()
+        if event.isAccepted():
+            self.openEditJournal(None)
         if self.defaultSaveDir is not None and len(self.defaultSaveDir) > 1:
             settings[SETTING_SAVE_DIR] = ustr(self.defaultSaveDir)
         else:
@@ -1215,17 +1652,7 @@ class MainWindow(QMainWindow, WindowMixin):
             self.loadFile(filename)
 
     def scanAllImages(self, folderPath):
-        extensions = ['.jpeg', '.jpg', '.png', '.bmp']
-        images = []
-
-        for root, dirs, files in os.walk(folderPath):
-            for file in files:
-                if file.lower().endswith(tuple(extensions)):
-                    relativePath = os.path.join(root, file)
-                    path = ustr(os.path.abspath(relativePath))
-                    images.append(path)
-        images.sort(key=lambda x: x.lower())
-        return images
+        return scanImages(folderPath)
 
     def changeSavedir(self, _value=False):
         if self.defaultSaveDir is not None:
@@ -1279,14 +1706,71 @@ class MainWindow(QMainWindow, WindowMixin):
         if dirpath is not None and len(dirpath) > 1:
             self.lastOpenDir = dirpath
 
+        self.importDirImages(dirpath)
+
+    def importDirImages(self, dirpath):
+        """Fill the file list from the dataset index, then rescan dirpath in the background."""
         self.dirname = dirpath
+        self.journalDiscarded()
         self.filePath = None
-        self.fileListWidget.clear()
-        self.mImgList = self.scanAllImages(dirpath)
-        self.openNextImg()
-        for imgPath in self.mImgList:
-            item = QListWidgetItem(imgPath)
-            self.fileListWidget.addItem(item)
+        self.prefetcher.clear()
+        self.dirScanner.cancel()
+        self.mImgList.clear()
+        self.scannedImages = []
+        self.firstImageTried = False
+        self.datasetIndex = None
+        self.openEditJournal(dirpath)
+        if not dirpath:
+            return
+        self.datasetIndex = DatasetIndex(dirpath)
+        indexNote = ''
+        try:
+            self.mImgList.setPaths(self.datasetIndex.paths())
+        except sqlite3.Error as e:
+            indexNote = ', dataset index unavailable: %s' % e
+            self.datasetIndex = None
+        self.dirScanGeneration = self.dirScanner.scan(dirpath)
+        self.status('Scanning %s ...' % dirpath + indexNote + self.recoveredNote(), 0)
+        if len(self.mImgList):
+            self.firstImageTried = True
+            self.openNextImg()
+
+    def dirBatchFound(self, generation, paths):
+        if generation != self.dirScanGeneration:
+            return
+        self.scannedImages.extend(paths)
+        # Paths already listed from the index are not added twice.
+        paths = sorted((path for path in paths if path not in self.mImgList), key=imageSortKey)
+        self.mImgList.appendPaths(paths)
+        if not self.firstImageTried and self.filePath is None and len(self.mImgList):
+            # Show the first image while the rest of the tree is scanned.
+            self.firstImageTried = True
+            self.openNextImg()
+
+    def dirScanFinished(self, generation):
+        if generation != self.dirScanGeneration:
+            return
+        # Batches arrive in discovery order, restore the sorted order and
+        # drop indexed images that no longer exist.
+        images = sorted(self.scannedImages, key=imageSortKey)
+        self.scannedImages = []
+        if images != self.mImgList.paths:
+            self.mImgList.setPaths(images)
+            self.selectFileListRow(self.mImgList.rowOf(self.filePath))
+        self.status('Found %d images in %s' % (len(self.mImgList), self.dirname) +
+                    self.recoveredNote())
+        if self.datasetIndex is not None:
+            self.dirScanner.reconcile(self.datasetIndex, images, self.defaultSaveDir)
+
+    def dirIndexed(self, generation, result):
+        if generation != self.dirScanGeneration:
+            return
+        if isinstance(result, Exception):
+            self.status('Dataset index not updated: %s' % result)
+            return
+        changed, removed = result
+        if changed or removed:
+            self.status('Dataset index: %d images updated, %d removed' % (changed, removed))
 
     def verifyImg(self, _value=False):
         # Proceding next image without dialog if having any label
@@ -1315,7 +1799,7 @@ class MainWindow(QMainWindow, WindowMixin):
             return
         if self.filePath is None:
             return
-        currIndex = self.mImgList.index(self.filePath)
+        currIndex = self.mImgList.rowOf(self.filePath)
         if currIndex - 1 >= 0:
             filename = self.mImgList[currIndex - 1]
             if filename:
@@ -1323,7 +1807,7 @@ class MainWindow(QMainWindow, WindowMixin):
 
     def openNextImgWithSameLabels(self):
         self.openNextImg()
-        currIndex = self.mImgList.index(self.filePath)
+        currIndex = self.mImgList.rowOf(self.filePath)
         filename = self.mImgList[currIndex - 1]
         xmlFileName=filename[:filename.rfind(".")]+XML_EXT
         self.loadPascalXMLByFilename(xmlFileName)
@@ -1343,7 +1827,7 @@ class MainWindow(QMainWindow, WindowMixin):
         if self.filePath is None:
             filename = self.mImgList[0]
         else:
-            currIndex = self.mImgList.index(self.filePath)
+            currIndex = self.mImgList.rowOf(self.filePath)
             if currIndex + 1 < len(self.mImgList):
                 filename = self.mImgList[currIndex + 1]
             else:
@@ -1398,9 +1882,13 @@ class MainWindow(QMainWindow, WindowMixin):
         return ''
 
     def _saveFile(self, annotationFilePath):
+        # annotationSaved() reports the write once it is done.
         if annotationFilePath and self.saveLabels(annotationFilePath):
             self.setClean()
-            self.statusBar().showMessage('Saved to  %s' % annotationFilePath)
+            if self.saveQueue.isQueued(annotationFilePath):
+                self.statusBar().showMessage('Saving to  %s' % annotationFilePath)
+            else:
+                self.statusBar().showMessage('No changes to save in  %s' % annotationFilePath)
             self.statusBar().show()
 
     def closeFile(self, _value=False):
@@ -1447,6 +1935,9 @@ class MainWindow(QMainWindow, WindowMixin):
             self.setDirty()
 
     def deleteSelectedShape(self):
+        shape = self.canvas.selectedShape
+        if shape is not None and self.editJournal is not None and self.filePath:
+            self.editJournal.shapeDeleted(self.filePath, self.canvas.shapes.index(shape))
         self.remLabel(self.canvas.deleteSelected())
         self.setDirty()
         if self.noShapes():
@@ -1472,10 +1963,12 @@ class MainWindow(QMainWindow, WindowMixin):
     def copyShape(self):
         self.canvas.endMove(copy=True)
         self.addLabel(self.canvas.selectedShape)
+        self.journalShape(self.canvas.selectedShape)
         self.setDirty()
 
     def moveShape(self):
         self.canvas.endMove(copy=False)
+        self.journalShape(self.canvas.selectedShape)
         self.setDirty()
 
     def loadPredefinedClasses(self, predefClassesFile):
@@ -1491,13 +1984,19 @@ class MainWindow(QMainWindow, WindowMixin):
     def loadPascalXMLByFilename(self, xmlPath):
         if self.filePath is None:
             return
+        if self.saveQueue.isQueued(xmlPath):
+            self.flushSaves()
         if os.path.isfile(xmlPath) is False:
             return
 
-        tVocParseReader = PascalVocReader(xmlPath)
-        shapes = tVocParseReader.getShapes()
-        self.loadLabels(shapes)
-        self.canvas.verified = tVocParseReader.verified
+        self.loadAnnotation(PascalVocReader(xmlPath))
+        # The image's own annotation no longer holds its shapes.
+        self.journalShapes()
+        self.setDirty()
+
+    def loadAnnotation(self, reader):
+        self.loadLabels(reader.getShapes())
+        self.canvas.verified = reader.verified
 
 
 def inverted(color):
@@ -0,0 +1,183 @@
+import numpy as np
+
+try:
+    from PyQt5.QtGui import QImage
+    from PyQt5.QtCore import QRect
+except ImportError:
+    from PyQt4.QtGui import QImage
+    from PyQt4.QtCore import QRect
+
+from libs.geometry import toArray
+
+# Each edge may move by up to this fraction of the box size, so it cannot
+# jump to the opposite side of the object.
+SEARCH_FRACTION = 0.25
+MIN_SEARCH = 2
+# Mean grey-level step along an edge below which it is left alone.
+MIN_EDGE_STRENGTH = 12.0
+# Grey levels of edge strength given up per pixel moved, so that of two
+# similar edges the nearer one wins.
+DISTANCE_PENALTY = 0.2
+PASSES = 2
+
+
+def greyView(image):
+    """(height, width) uint8 grey levels of a QImage, and the image they live in.
+
+    Qt converts to 8-bit grey itself where it can; the array shares that
+    image's pixels, so the returned image must be kept alive as long as
+    the array is used.
+    """
+    greyFormat = getattr(QImage, 'Format_Grayscale8', None)
+    if greyFormat is not None:
+        if image.format() != greyFormat:
+            image = image.convertToFormat(greyFormat)
+        channels = 1
+    elif image.format() not in (QImage.Format_RGB32, QImage.Format_ARGB32,
+                                QImage.Format_ARGB32_Premultiplied):
+        image = image.convertToFormat(QImage.Format_RGB32)
+        channels = 4
+    else:
+        channels = 4
+    bits = image.constBits()
+    bits.setsize(image.bytesPerLine() * image.height())
+    rows = np.frombuffer(bits, np.uint8).reshape(image.height(), -1)
+    if channels == 1:
+        return rows[:, :image.width()], image
+    pixels = rows.reshape(image.height(), -1, 4)[:, :image.width()]
+    # Luma of the B, G, R bytes.
+    return ((pixels[..., 2].astype(np.uint16) * 77 + pixels[..., 1].astype(np.uint16) * 150 +
+             pixels[..., 0].astype(np.uint16) * 29) >> 8).astype(np.uint8), image
+
+
+def accumulate(steps, out):
+    """Running sum of steps down its rows into out.
+
+    A row at a time: np.cumsum along the first axis of a large array is
+    several times slower than these contiguous row additions.
+    """
+    out[0] = steps[0]
+    for y in range(1, len(steps)):
+        np.add(out[y - 1], steps[y], out=out[y])
+
+
+def edgeIntegrals(g):
+    """Summed |gradient| tables for the grey image g.
+
+    cols[y, x] is the sum, over the rows above y, of the step between
+    columns x - 1 and x; rows[y, x] the sum, over the columns left of x,
+    of the step between rows y - 1 and y.  Both are (h + 1, w + 1), so
+    the strength of any edge segment is a difference of two entries.
+    """
+    h, w = g.shape
+    cols = np.zeros((h + 1, w + 1), np.int32)
+    if h and w > 1:
+        accumulate(np.abs(np.subtract(g[:, 1:], g[:, :-1], dtype=np.int16)), cols[1:, 1:w])
+    rows = np.zeros((h + 1, w + 1), np.int32)
+    if w and h > 1:
+        np.cumsum(np.abs(np.subtract(g[1:], g[:-1], dtype=np.int16)), axis=1, dtype=np.int32,
+                  out=rows[1:h, 1:])
+    return cols, rows
+
+
+def snapEdges(table, edges, starts, ends, lows, highs, radius):
+    """Move each edge to the strongest nearby step; all arrays are (S,).
+
+    table is cols for vertical edges, with starts and ends the rows they
+    span, or rows transposed for horizontal ones.  Edges stay within [lows, highs].
+    """
+    reach = int(radius.max())
+    offsets = np.arange(-reach, reach + 1)
+    candidates = edges[:, None] + offsets[None, :]
+    valid = (np.abs(offsets)[None, :] <= radius[:, None]) & \
+        (candidates >= lows[:, None]) & (candidates <= highs[:, None])
+    candidates = np.clip(candidates, 0, table.shape[1] - 1)
+    length = np.maximum(ends - starts, 1)[:, None]
+    strength = (table[ends[:, None], candidates] - table[starts[:, None], candidates]) / length
+    score = np.where(valid, strength - DISTANCE_PENALTY * np.abs(offsets)[None, :], -np.inf)
+    best = score.argmax(axis=1)
+    picked = np.arange(len(edges))
+    strong = valid[picked, best] & (strength[picked, best] >= MIN_EDGE_STRENGTH)
+    return np.where(strong, candidates[picked, best], edges)
+
+
+def refineBoxes(image, boxes, windows, origin=(0, 0)):
+    """Snap the edges of boxes to strong grey-level steps inside windows.
+
+    boxes and windows are (S, 4) arrays of x1, y1, x2, y2 in image
+    pixels; every box is refined in the same few array operations.
+    image may be just a region of the image, with its top left corner at
+    origin.  Returns the refined boxes as an (S, 4) float array.
+    """
+    boxes = np.asarray(boxes, np.float64).reshape(-1, 4)
+    if not len(boxes):
+        return boxes
+    offset = np.tile(np.asarray(origin, np.float64), 2)
+    boxes = boxes - offset
+    width, height = image.width(), image.height()
+    windows = np.clip(np.round(np.asarray(windows, np.float64).reshape(-1, 4) - offset),
+                      0, (width, height, width, height)).astype(np.int64)
+    # Only the part of the image the windows cover is looked at.
+    left, top = windows[:, 0].min(), windows[:, 1].min()
+    right, bottom = windows[:, 2].max(), windows[:, 3].max()
+    if (right - left) * (bottom - top) < width * height // 2:
+        grey, image = greyView(image.copy(QRect(int(left), int(top),
+                                                int(right - left), int(bottom - top))))
+    else:
+        # Converting it all beats copying most of it first.
+        grey, image = greyView(image)
+        grey = grey[top:bottom, left:right]
+    cols, rows = edgeIntegrals(grey)
+    local = windows - (left, top, left, top)
+    x1, y1, x2, y2 = (np.clip(np.round(boxes[:, i]) - (left, top)[i % 2],
+                              local[:, i % 2], local[:, 2 + i % 2]).astype(np.int64)
+                      for i in range(4))
+    for _ in range(PASSES):
+        xRadius = np.maximum(np.round((x2 - x1) * SEARCH_FRACTION), MIN_SEARCH).astype(np.int64)
+        yRadius = np.maximum(np.round((y2 - y1) * SEARCH_FRACTION), MIN_SEARCH).astype(np.int64)
+        xMid, yMid = (x1 + x2) // 2, (y1 + y2) // 2
+        nx1 = snapEdges(cols, x1, y1, y2, local[:, 0], xMid - 1, xRadius)
+        nx2 = snapEdges(cols, x2, y1, y2, xMid + 1, local[:, 2], xRadius)
+        ny1 = snapEdges(rows.T, y1, x1, x2, local[:, 1], yMid - 1, yRadius)
+        ny2 = snapEdges(rows.T, y2, x1, x2, yMid + 1, local[:, 3], yRadius)
+        x1, y1, x2, y2 = nx1, ny1, nx2, ny2
+    return np.stack([x1 + left, y1 + top, x2 + left, y2 + top], axis=1).astype(np.float64) + offset
+
+
+def normalizedBox(box, window):
+    """[cx, cy, h, w] of box as fractions of window, as movePoints takes them."""
+    wx1, wy1, wx2, wy2 = window
+    ww, wh = float(wx2 - wx1), float(wy2 - wy1)
+    x1, y1, x2, y2 = box
+    return [((x1 + x2) / 2 - wx1) / ww, ((y1 + y2) / 2 - wy1) / wh,
+            (y2 - y1) / wh, (x2 - x1) / ww]
+
+
+def normalizedTetragon(coords, old, new, window):
+    """The 8 corner fractions of window that moveTetragonPoints takes.
+
+    The corners in coords are stretched along with their bounding box
+    from old to new.
+    """
+    coords = np.asarray(coords, np.float64).reshape(-1, 2)
+    old = np.asarray(old, np.float64)
+    new = np.asarray(new, np.float64)
+    scale = (new[2:] - new[:2]) / np.maximum(old[2:] - old[:2], 1e-9)
+    moved = (coords - old[:2]) * scale + new[:2]
+    wx1, wy1, wx2, wy2 = window
+    return ((moved - (wx1, wy1)) / (float(wx2 - wx1), float(wy2 - wy1))).reshape(-1).tolist()
+
+
+def refineShapes(image, shapes, windows, origin=(0, 0)):
+    """Refine shapes inside their windows in one pass over image.
+
+    For each shape returns what the label-check server would: [cx, cy,
+    h, w] for a box, or 8 corner fractions for a tetragon.  image and
+    origin are as for refineBoxes().
+    """
+    coords = [toArray(shape.points) for shape in shapes]
+    boxes = [np.concatenate([c.min(axis=0), c.max(axis=0)]) for c in coords]
+    refined = refineBoxes(image, boxes, windows, origin)
+    return [normalizedTetragon(c, old, new, window) if shape.tetragon
+            else normalizedBox(new, window)
+            for shape, c, old, new, window in zip(shapes, coords, boxes, refined, windows)]
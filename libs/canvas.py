@@ -1,4 +1,5 @@
 import math
+import time
 try:
     from PyQt5.QtGui import *
     from PyQt5.QtCore import *
@@ -10,7 +11,14 @@ except ImportError:
 #from PyQt4.QtOpenGL import *
 
 from libs.shape import Shape
-from libs.lib import distance
+from libs.lib import distance, LatencyCounter
+from libs.geometry import rotatePoints, pointBounds
+from libs.shapeIndex import ShapeIndex
+from libs.imagePyramid import ImagePyramid
+from libs.tiledImage import TiledImage
+
+# Larger visible areas are painted without a cached shape layer.
+LAYER_MAX_PIXELS = 16 * 1024 * 1024
 
 CURSOR_DEFAULT = Qt.ArrowCursor
 CURSOR_POINT = Qt.PointingHandCursor
@@ -18,6 +26,13 @@ CURSOR_DRAW = Qt.CrossCursor
 CURSOR_MOVE = Qt.ClosedHandCursor
 CURSOR_GRAB = Qt.OpenHandCursor
 
+# Used when the screen does not report its refresh rate.
+FRAME_MS = 1000.0 / 60
+
+ARROW_KEYS = {Qt.Key_Left: 'Left', Qt.Key_Right: 'Right', Qt.Key_Up: 'Up', Qt.Key_Down: 'Down'}
+PIXEL_STEPS = {'Left': QPointF(-1.0, 0), 'Right': QPointF(1.0, 0),
+               'Up': QPointF(0, -1.0), 'Down': QPointF(0, 1.0)}
+
 class Canvas(QWidget):
     zoomRequest = pyqtSignal(int)
     scrollRequest = pyqtSignal(int, int)
@@ -35,6 +50,14 @@ class Canvas(QWidget):
         # Initialise local state.
         self.mode = self.EDIT
         self.shapes = []
+        # Hit-testing looks only at the shapes near the cursor.
+        self.shapeIndex = ShapeIndex(margin=self.epsilon, listener=self.shapeChanged)
+        # Idle shapes are painted once into this pixmap, see shapeLayer().
+        self.layer = None
+        self.layerKey = None
+        self.layerRect = QRect()
+        self.layerExcluded = set()
+        self.layerDirty = []
         self.current = None
         self.selectedShape = None  # save the selected shape here
         self.selectedShapeCopy = None
@@ -45,6 +68,16 @@ class Canvas(QWidget):
         self.offsets = QPointF(), QPointF()
         self.scale = 1.0
         self.pixmap = QPixmap()
+        # Zoomed out, the image is drawn from a smaller copy.
+        self.pyramid = ImagePyramid(self)
+        self.pyramid.levelReady.connect(self.pyramidLevelReady)
+        self.drawnFactor = 1
+        # Very large images are shown from an overview plus decoded tiles;
+        # self.pixmap then holds the overview, see imageSize().
+        self.tiles = TiledImage(parent=self)
+        self.tiles.tilesReady.connect(self.update)
+        # Size of the full image while self.pixmap is a reduced preview.
+        self.previewSize = None
         self.visible = {}
         self._hideBackround = False
         self.hideBackround = False
@@ -54,6 +87,20 @@ class Canvas(QWidget):
         self.rotationPoint=None
         self._painter = QPainter()
         self._cursor = CURSOR_DEFAULT
+        self._cursorOverridden = False
+        # Mouse moves and arrow key repeats are queued and handled at most
+        # once per frame, see flushInput().
+        self.pendingMove = None
+        self.pendingNudges = []
+        self.inputSince = None
+        self.inputHandled = None
+        self.frameRequested = False
+        self.lastFlush = 0.0
+        self.inputTimer = QTimer(self)
+        self.inputTimer.setSingleShot(True)
+        self.inputTimer.timeout.connect(self.flushInput)
+        self.latency = LatencyCounter()
+        self.pointerCursor = CURSOR_DEFAULT
         self.draw3DMode=False
         self.clicksCount=0
         self.sk=0
@@ -69,9 +116,11 @@ class Canvas(QWidget):
         self.overrideCursor(self._cursor)
 
     def leaveEvent(self, ev):
+        self.flushInput()
         self.restoreCursor()
 
     def focusOutEvent(self, ev):
+        self.flushInput()
         self.restoreCursor()
 
     def isVisible(self, shape):
@@ -127,24 +176,72 @@ class Canvas(QWidget):
         self.current.addPoint(pos-delta)
 
     def mouseMoveEvent(self, ev):
+        # Only the latest position matters; it is handled by flushInput().
+        self.queueInput()
+        self.pendingMove = (QPoint(ev.pos()), ev.buttons())
+
+    def queueInput(self):
+        self.latency.events += 1
+        if self.inputSince is None:
+            self.inputSince = time.time()
+        if not self.inputTimer.isActive():
+            # Right away after an idle frame, otherwise at the next frame.
+            elapsed = (self.inputSince - self.lastFlush) * 1000
+            self.inputTimer.start(int(max(0, self.frameInterval() - elapsed)))
+
+    def frameInterval(self):
+        screen = QApplication.primaryScreen() if hasattr(QApplication, 'primaryScreen') else None
+        rate = screen.refreshRate() if screen is not None else 0
+        return 1000.0 / rate if rate > 0 else FRAME_MS
+
+    def flushInput(self):
+        """Handle the queued mouse move and arrow keys, as one update."""
+        self.inputTimer.stop()
+        if self.inputSince is None:
+            return
+        move, self.pendingMove = self.pendingMove, None
+        nudges, self.pendingNudges = self.pendingNudges, []
+        # The next frame painted shows this input, see paintEvent().
+        self.inputHandled = self.inputSince
+        self.frameRequested = False
+        if move is not None:
+            self.pointerCursor = CURSOR_DEFAULT
+            self.moveTo(*move)
+            # Only a change of cursor touches the override cursor stack.
+            self.overrideCursor(self.pointerCursor)
+        if nudges and self.selectedShape:
+            self.movePixels(nudges)
+        self.latency.updates += 1
+        self.inputSince = None
+        self.lastFlush = time.time()
+        if not self.frameRequested and self.inputHandled is not None:
+            # Nothing to paint: the input took effect right here.
+            self.latency.record((self.lastFlush - self.inputHandled) * 1000)
+            self.inputHandled = None
+
+    def update(self, *args):
+        self.frameRequested = True
+        super(Canvas, self).update(*args)
+
+    def moveTo(self, widgetPos, buttons):
         """Update line with last point and current coordinates."""
-        pos = self.transformPos(ev.pos())
-        self.restoreCursor()
+        pos = self.transformPos(widgetPos)
 
         #  3D drawing while drawing
         if self.draw3DMode:
-            self.overrideCursor(CURSOR_DRAW)
+            self.pointerCursor = CURSOR_DRAW
+            before = self.shapeRect([self.current])
             pos=QPointF(round(pos.x()),round(pos.y()))
             if self.clicksCount==0:
                 if len(self.current.points)==0:
                     self.current.addPoint(pos)
                 elif len(self.current.points)==1:
-                    self.current.points[0]=pos
+                    self.current[0]=pos
             if self.clicksCount==1:
                 if len(self.current.points)==1:
                     self.current.addPoint(pos)
                 elif len(self.current.points)==2:
-                    self.current.points[1]=pos
+                    self.current[1]=pos
 
             if self.clicksCount==2:
                 if len(self.current.points)==2:
@@ -172,14 +269,15 @@ class Canvas(QWidget):
                     self.addVirtualPoint(self.current[2],self.current[0],pos)
 
 
-            self.repaint()
+            self.updateShapes([self.current], before)
             return
 
 
         # Polygon drawing.
         if self.drawing():
-            self.overrideCursor(CURSOR_DRAW)
+            self.pointerCursor = CURSOR_DRAW
             if self.current:
+                before = self.shapeRect([self.current, self.line])
                 color = self.lineColor
                 if self.outOfPixmap(pos):
                     # Don't allow the user to draw outside the pixmap.
@@ -190,46 +288,51 @@ class Canvas(QWidget):
                     # user:
                     pos = self.current[0]
                     color = self.current.line_color
-                    self.overrideCursor(CURSOR_POINT)
+                    self.pointerCursor = CURSOR_POINT
                     self.current.highlightVertex(0, Shape.NEAR_VERTEX)
 
                 self.line[1] = pos
                 self.line.line_color = color
-                self.repaint()
+                # Painted synchronously: the highlight is cleared right after.
+                self.repaint(before.united(self.shapeRect([self.current, self.line])))
                 self.current.highlightClear()
 
             return
 
         # Polygon copy moving.
-        if Qt.RightButton & ev.buttons():
+        if Qt.RightButton & buttons:
             if self.selectedShapeCopy and self.prevPoint:
-                self.overrideCursor(CURSOR_MOVE)
+                self.pointerCursor = CURSOR_MOVE
+                before = self.shapeRect([self.selectedShapeCopy])
                 self.boundedMoveShape(self.selectedShapeCopy, pos)
-                self.repaint()
+                self.updateShapes([self.selectedShapeCopy], before)
             elif self.selectedShape:
                 self.selectedShapeCopy = self.selectedShape.copy()
-                self.repaint()
+                self.updateShapes([self.selectedShapeCopy])
             return
 
         # Polygon/Vertex moving.
-        if Qt.LeftButton & ev.buttons():
+        if Qt.LeftButton & buttons:
             if self.selectedVertex():
+                before = self.shapeRect([self.hShape])
                 self.boundedMoveVertex(pos)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateShapes([self.hShape], before)
             elif self.selectedShape and self.prevPoint:
-                self.overrideCursor(CURSOR_MOVE)
+                self.pointerCursor = CURSOR_MOVE
+                before = self.shapeRect([self.selectedShape])
                 self.boundedMoveShape(self.selectedShape, pos)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateShapes([self.selectedShape], before)
             elif self.selectedRotationPoint:
-                self.overrideCursor(CURSOR_MOVE)
+                self.pointerCursor = CURSOR_MOVE
+                before = self.shapeRect([self.hShape])
                 try:
                     self.rotateShape(self.hShape,pos)
                 except:
                     pass
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateShapes([self.hShape], before)
             return
 
         # Just hovering over the canvas, 2 posibilities:
@@ -237,7 +340,9 @@ class Canvas(QWidget):
         # - Highlight vertex
         # Update shape/vertex fill and tooltip value accordingly.
         # self.setToolTip("Image")
-        for shape in reversed([s for s in self.shapes if self.isVisible(s)]):
+        # Only the previously and the newly highlighted shape need painting.
+        previous = self.hShape
+        for shape in [s for s in self.shapeIndex.candidates(pos) if self.isVisible(s)]:
             # Look for a nearby vertex to highlight. If that fails,
             # check if we happen to be inside a shape.
             # print(shape.points)
@@ -249,17 +354,17 @@ class Canvas(QWidget):
                     self.hShape.highlightClear()
                 self.hVertex, self.hShape = index, shape
                 shape.highlightVertex(index, shape.MOVE_VERTEX)
-                self.overrideCursor(CURSOR_POINT)
+                self.pointerCursor = CURSOR_POINT
                 # self.setToolTip("Click & drag to move point")
                 # self.setStatusTip(self.toolTip())
-                self.update()
+                self.updateShapes([previous, shape])
                 break
             elif shape.overRotationPoint(pos,self.epsilon):
                 self.hShape=self.selectedShape
-                self.overrideCursor(CURSOR_POINT)
+                self.pointerCursor = CURSOR_POINT
                 # self.setToolTip("Click & drag to rotate label")
                 # self.setStatusTip(self.toolTip())
-                self.update()
+                self.updateShapes([previous, shape, self.hShape])
                 break
             elif shape.containsPoint(pos):
                 # print(shape.points)
@@ -268,18 +373,54 @@ class Canvas(QWidget):
                 self.hVertex, self.hShape = None, shape
                 # self.setToolTip("Click & drag to move shape '%s'" % shape.label)
                 # self.setStatusTip(self.toolTip())
-                self.overrideCursor(CURSOR_GRAB)
-                self.update()
+                self.pointerCursor = CURSOR_GRAB
+                self.updateShapes([previous, shape])
                 break
         else:  # Nothing found, clear highlights, reset state.
 
             if self.hShape:
                 self.hShape.highlightClear()
-                self.update()
+                self.updateShapes([self.hShape])
             self.hVertex, self.hShape = None, None
 
+    def paintMargin(self):
+        """Image pixels around a shape's hull that painting it can touch."""
+        # The rotation handle and its box, then vertices (up to 4x their
+        # size when highlighted) and the pen, which keep their size on
+        # screen at any zoom.
+        return (Shape.rotation_handle_distance + Shape.point_size / 2.0 + 1 +
+                (4 * Shape.point_size + 4) / self.scale)
+
+    def shapeRect(self, shapes):
+        """Widget rectangle that painting shapes can touch."""
+        xmin = ymin = float('inf')
+        xmax = ymax = float('-inf')
+        for shape in shapes:
+            if shape is None or not shape.points:
+                continue
+            rect = shape.boundingRect()
+            xmin = min(xmin, rect.left())
+            ymin = min(ymin, rect.top())
+            xmax = max(xmax, rect.right())
+            ymax = max(ymax, rect.bottom())
+        if xmin > xmax:
+            return QRect()
+        m = self.paintMargin()
+        offset = self.offsetToCenter()
+        s = self.scale
+        return QRectF(QPointF((xmin - m + offset.x()) * s, (ymin - m + offset.y()) * s),
+                      QPointF((xmax + m + offset.x()) * s, (ymax + m + offset.y()) * s)).toAlignedRect()
+
+    def updateShapes(self, shapes, before=None):
+        """Schedule a repaint of shapes only, and of before if given."""
+        rect = self.shapeRect(shapes)
+        if before is not None:
+            rect = rect.united(before)
+        if not rect.isEmpty():
+            self.update(rect)
+
     def getRotatedShape(self,shape,angle):
-        return [Shape.rotatePoint(self, shape.centerPoint,point,angle) for point in shape.points]
+        return rotatePoints(shape.points, shape.centerPoint, angle)
 
     def rotateShape(self,shape,pos):
         zeroPoint=shape.centerPoint+QPointF(0,-10)
@@ -305,6 +446,7 @@ class Canvas(QWidget):
 
 
     def mousePressEvent(self, ev):
+        self.flushInput()
         pos = self.transformPos(ev.pos())
 
         if ev.button() == Qt.LeftButton:
@@ -312,25 +454,26 @@ class Canvas(QWidget):
                 self.handleDrawing(pos)
             elif self.draw3DMode:
                 self.pointsCountingFor3DShape(pos)
-                self.repaint()
+                self.update()
             else:
                 self.selectShapePoint(pos)
                 self.prevPoint = pos
-                self.repaint()
+                self.update()
         elif ev.button() == Qt.RightButton and self.editing():
             self.selectShapePoint(pos)
             self.prevPoint = pos
-            self.repaint()
+            self.update()
 
     def mouseReleaseEvent(self, ev):
+        self.flushInput()
         if ev.button() == Qt.RightButton:
             menu = self.menus[bool(self.selectedShapeCopy)]
             self.restoreCursor()
             if not menu.exec_(self.mapToGlobal(ev.pos()))\
                and self.selectedShapeCopy:
                 # Cancel the move by deleting the shadow copy.
+                self.updateShapes([self.selectedShapeCopy])
                 self.selectedShapeCopy = None
-                self.repaint()
         elif self.draw3DMode:
             self.overrideCursor(CURSOR_DRAW)
         elif ev.button() == Qt.LeftButton and self.selectedShape:
@@ -347,9 +490,10 @@ class Canvas(QWidget):
         #del shape.line_color
         if copy:
             self.shapes.append(shape)
+            self.shapeIndex.add(shape)
             self.selectedShape.selected = False
             self.selectedShape = shape
-            self.repaint()
+            self.update()
         else:
             self.selectedShape.points = [p for p in shape.points]
         self.selectedShapeCopy = None
@@ -360,7 +504,7 @@ class Canvas(QWidget):
             # Only hide other shapes if there is a current selection.
             # Otherwise the user will not be able to select a shape.
             self.setHiding(True)
-            self.repaint()
+            self.update()
 
     def handleDrawing(self, pos):
         if self.current and self.current.reachMaxPoints() is False:
@@ -394,6 +538,7 @@ class Canvas(QWidget):
         return self.drawing() and self.current and len(self.current) > 2
 
     def mouseDoubleClickEvent(self, ev):
+        self.flushInput()
         # We need at least 4 points here, since the mousePress handler
         # adds an extra one before this handler is called.
         if self.canCloseShape() and len(self.current) > 3:
@@ -409,12 +554,7 @@ class Canvas(QWidget):
         self.update()
 
     def transformTetragon(self,points):
-        arrX=[]
-        arrY=[]
-        for x in points:
-            arrX.append(x.x())
-            arrY.append(x.y())
-        return [min(arrX),min(arrY),max(arrX),max(arrY)]
+        return pointBounds(points)
 
     def selectShapePoint(self, point):
         """Select the first shape created which contains this point."""
@@ -423,7 +563,7 @@ class Canvas(QWidget):
             index, shape = self.hVertex, self.hShape
             shape.highlightVertex(index, shape.MOVE_VERTEX)
             return
-        for shape in reversed(self.shapes):
+        for shape in self.shapeIndex.candidates(point):
             if self.isVisible(shape) and shape.containsPoint(point):
                 shape.selected = True
                 self.selectedShape = shape
@@ -493,8 +633,9 @@ class Canvas(QWidget):
             pos -= QPointF(min(0, o1.x()), min(0, o1.y()))
         o2 = pos + self.offsets[1]
         if self.outOfPixmap(o2):
-            pos += QPointF(min(0, self.pixmap.width() - o2.x()),
-                           min(0, self.pixmap.height() - o2.y()))
+            size = self.imageSize()
+            pos += QPointF(min(0, size.width() - o2.x()),
+                           min(0, size.height() - o2.y()))
         # The next line tracks the new position of the cursor
         # relative to the shape, but also results in making it
         # a bit "shaky" when nearing the border and allows it to
@@ -512,6 +653,7 @@ class Canvas(QWidget):
         if self.selectedShape:
             shape = self.selectedShape
             self.shapes.remove(self.selectedShape)
+            self.shapeIndex.remove(self.selectedShape)
             self.selectedShape = None
             self.update()
             return shape
@@ -521,6 +663,7 @@ class Canvas(QWidget):
             shape = self.selectedShape.copy()
             self.deSelectShape()
             self.shapes.append(shape)
+            self.shapeIndex.add(shape)
             shape.selected = True
             self.selectedShape = shape
             self.boundedShiftShape(shape)
@@ -546,15 +689,44 @@ class Canvas(QWidget):
         p.setRenderHint(QPainter.HighQualityAntialiasing)
         p.setRenderHint(QPainter.SmoothPixmapTransform)
 
+        # Only the exposed part of the image and the shapes that can reach
+        # it are drawn; mouse interaction mostly exposes small regions.
+        exposed = event.rect()
+        p.setClipRect(exposed)
         p.scale(self.scale, self.scale)
         p.translate(self.offsetToCenter())
 
-        p.drawPixmap(0, 0, self.pixmap)
+        area = QRectF(self.transformPos(QPointF(exposed.topLeft())),
+                      self.transformPos(QPointF(exposed.bottomRight() + QPoint(1, 1))))
+        # Whole pixels plus a border keep the smooth transform seamless at
+        # the edges of the region.
+        size = self.imageSize()
+        source = area.adjusted(-2, -2, 2, 2).toAlignedRect().intersected(QRect(QPoint(0, 0), size))
+        if not source.isEmpty():
+            if self.pixmap.size() != size:
+                # An overview or preview: there is nothing sharper to draw.
+                level = self.pixmap
+            else:
+                factor, level = self.pyramid.level(self.scale * self.pixelRatio())
+                self.drawnFactor = factor
+            sx = float(level.width()) / size.width()
+            sy = float(level.height()) / size.height()
+            p.drawPixmap(QRectF(source), level,
+                         QRectF(source.x() * sx, source.y() * sy,
+                                source.width() * sx, source.height() * sy))
+            if self.tiles.isOpen():
+                self.paintTiles(p, source)
         Shape.scale = self.scale
-        for shape in self.shapes:
-            if (shape.selected or not self._hideBackround) and self.isVisible(shape):
-                shape.fill = shape.selected or shape == self.hShape
-                shape.paint(p)
+        active = self.activeShapes()
+        layer = self.shapeLayer(active)
+        if layer is not None and self.layerRect.contains(exposed):
+            p.save()
+            p.resetTransform()
+            p.drawPixmap(self.layerRect.topLeft(), layer)
+            p.restore()
+            self.paintShapes(p, exposed, lambda shape: shape in active)
+        else:
+            self.paintShapes(p, exposed)
         if self.current:
             self.current.paint(p)
             self.line.paint(p)
@@ -574,6 +746,10 @@ class Canvas(QWidget):
             p.setBrush(brush)
             p.drawRect(leftTop.x(), leftTop.y(), rectWidth, rectHeight)
 
+        if self.inputHandled is not None:
+            self.latency.record((time.time() - self.inputHandled) * 1000)
+            self.inputHandled = None
+
         self.setAutoFillBackground(True)
         if self.verified:
             pal = self.palette()
@@ -586,6 +762,121 @@ class Canvas(QWidget):
 
         p.end()
 
+    def paintTiles(self, p, source):
+        """Draw the decoded tiles over source, asking for the visible ones."""
+        scale = self.scale * self.pixelRatio()
+        visible = self.visibleRegion().boundingRect()
+        if visible.isEmpty():
+            visible = self.rect()
+        self.tiles.request(QRectF(self.transformPos(QPointF(visible.topLeft())),
+                                  self.transformPos(QPointF(visible.bottomRight() + QPoint(1, 1))))
+                           .toAlignedRect(), scale)
+        for rect, tile in self.tiles.tiles(source, scale):
+            p.drawPixmap(QRectF(rect), tile, QRectF(tile.rect()))
+
+    def imageSize(self):
+        """Size of the image in the image coordinates shapes are kept in."""
+        if self.tiles.isOpen():
+            return self.tiles.size
+        if self.previewSize is not None:
+            return self.previewSize
+        return self.pixmap.size()
+
+    def previewTooSmall(self):
+        """True if a preview is shown with fewer pixels than the zoom can show."""
+        if self.previewSize is None:
+            return False
+        needed = self.previewSize.width() * self.scale * self.pixelRatio()
+        return self.pixmap.width() < int(needed)
+
+    def pixelRatio(self):
+        return self.devicePixelRatioF() if hasattr(self, 'devicePixelRatioF') else 1.0
+
+    def pyramidLevelReady(self, factor):
+        wanted = self.pyramid.wantedFactor(self.scale * self.pixelRatio())
+        if self.drawnFactor < factor <= wanted:
+            self.update()
+
+    def activeShapes(self):
+        """Shapes painted over the layer, as they change during interaction."""
+        return set(shape for shape in (self.selectedShape, self.hShape) if shape is not None)
+
+    def paintShapes(self, p, rect, include=None):
+        """Paint the visible shapes that can reach the widget rect."""
+        area = QRectF(self.transformPos(QPointF(rect.topLeft())),
+                      self.transformPos(QPointF(rect.bottomRight() + QPoint(1, 1))))
+        m = self.paintMargin()
+        area.adjust(-m, -m, m, m)
+        for shape in self.shapeIndex.intersecting(area):
+            if include is not None and not include(shape):
+                continue
+            if (shape.selected or not self._hideBackround) and self.isVisible(shape):
+                shape.fill = shape.selected or shape == self.hShape
+                if shape.points:
+                    r = shape.boundingRect()
+                    if r.right() < area.left() or r.left() > area.right() or \
+                            r.bottom() < area.top() or r.top() > area.bottom():
+                        continue
+                shape.paint(p)
+
+    def shapeLayer(self, active):
+        """Pixmap of the visible area with every shape but active painted.
+
+        It is kept until the zoom, the visible area, the shape set or the
+        default colors change.  Shapes that become active or idle, and idle
+        shapes shown or hidden, only have their own region redrawn; any
+        other edit of an idle shape drops the layer.
+        """
+        rect = self.visibleRegion().boundingRect()
+        if rect.isEmpty():
+            rect = self.rect()
+        if rect.width() * rect.height() > LAYER_MAX_PIXELS:
+            self.layer = None
+            return None
+        ratio = self.pixelRatio()
+        offset = self.offsetToCenter()
+        key = (self.scale, offset.x(), offset.y(), rect.getRect(), ratio,
+               self._hideBackround, self.shapeIndex.revision, self.pixmap.cacheKey(),
+               Shape.line_color.rgba(), Shape.fill_color.rgba())
+        if self.layer is None or key != self.layerKey:
+            self.layer = QPixmap(rect.size() * ratio)
+            if ratio != 1.0:
+                self.layer.setDevicePixelRatio(ratio)
+            self.layer.fill(Qt.transparent)
+            self.layerKey = key
+            self.layerRect = rect
+            self.layerExcluded = set(active)
+            self.layerDirty = [rect]
+        elif active != self.layerExcluded:
+            self.layerDirty.append(self.shapeRect(active.symmetric_difference(self.layerExcluded)))
+            self.layerExcluded = set(active)
+        if self.layerDirty:
+            p = QPainter(self.layer)
+            p.setRenderHint(QPainter.Antialiasing)
+            p.setRenderHint(QPainter.HighQualityAntialiasing)
+            p.translate(-rect.topLeft())
+            for dirty in self.layerDirty:
+                dirty = dirty.intersected(rect)
+                if dirty.isEmpty():
+                    continue
+                p.save()
+                p.setCompositionMode(QPainter.CompositionMode_Clear)
+                p.fillRect(dirty, Qt.transparent)
+                p.setCompositionMode(QPainter.CompositionMode_SourceOver)
+                p.setClipRect(dirty)
+                p.scale(self.scale, self.scale)
+                p.translate(offset)
+                self.paintShapes(p, dirty, lambda shape: shape not in self.layerExcluded)
+                p.restore()
+            p.end()
+            self.layerDirty = []
+        return self.layer
+
+    def shapeChanged(self, shape):
+        # Active shapes are painted over the layer, so their edits are free.
+        if shape not in self.layerExcluded:
+            self.layer = None
+
     def transformPos(self, point):
         """Convert from widget-logical coordinates to painter-logical coordinates."""
         return point / self.scale - self.offsetToCenter()
@@ -593,14 +884,16 @@ class Canvas(QWidget):
     def offsetToCenter(self):
         s = self.scale
         area = super(Canvas, self).size()
-        w, h = self.pixmap.width() * s, self.pixmap.height() * s
+        size = self.imageSize()
+        w, h = size.width() * s, size.height() * s
         aw, ah = area.width(), area.height()
         x = (aw - w) / (2 * s) if aw > w else 0
         y = (ah - h) / (2 * s) if ah > h else 0
         return QPointF(x, y)
 
     def outOfPixmap(self, p):
-        w, h = self.pixmap.width(), self.pixmap.height()
+        size = self.imageSize()
+        w, h = size.width(), size.height()
         return not (0 <= p.x() <= w and 0 <= p.y() <= h)
 
     def shapeOutOfPixmap(self,points):
@@ -612,7 +905,10 @@ class Canvas(QWidget):
     def finalise(self):
         assert self.current
         self.current.close()
+        # Its points were edited in place while drawing.
+        self.current.invalidate()
         self.shapes.append(self.current)
+        self.shapeIndex.add(self.current)
         self.current = None
         self.setHiding(False)
         self.newShape.emit()
@@ -628,7 +924,7 @@ class Canvas(QWidget):
         # Cycle through each image edge in clockwise fashion,
         # and find the one intersecting the current line segment.
         # http://paulbourke.net/geometry/lineline2d/
-        size = self.pixmap.size()
+        size = self.imageSize()
         points = [(0, 0),
                   (size.width(), 0),
                   (size.width(), size.height()),
@@ -680,10 +976,11 @@ class Canvas(QWidget):
 
     def minimumSizeHint(self):
         if self.pixmap:
-            return self.scale * self.pixmap.size()
+            return self.scale * self.imageSize()
         return super(Canvas, self).minimumSizeHint()
 
     def wheelEvent(self, ev):
+        self.flushInput()
         qt_version = 4 if hasattr(ev, "delta") else 5
         if qt_version == 4:
             if ev.orientation() == Qt.Vertical:
@@ -716,6 +1013,13 @@ class Canvas(QWidget):
 
     def keyPressEvent(self, ev):
         key = ev.key()
+        if key in ARROW_KEYS and self.selectedShape:
+            # Auto-repeat can outpace painting; the steps are applied
+            # together by flushInput().
+            self.queueInput()
+            self.pendingNudges.append(ARROW_KEYS[key])
+            return
+        self.flushInput()
         if key == Qt.Key_Escape and self.current:
             print('ESC press')
             self.current = None
@@ -723,43 +1027,25 @@ class Canvas(QWidget):
             self.update()
         elif key == Qt.Key_Return and self.canCloseShape():
             self.finalise()
-        elif key == Qt.Key_Left and self.selectedShape:
-            self.moveOnePixel('Left')
-        elif key == Qt.Key_Right and self.selectedShape:
-            self.moveOnePixel('Right')
-        elif key == Qt.Key_Up and self.selectedShape:
-            self.moveOnePixel('Up')
-        elif key == Qt.Key_Down and self.selectedShape:
-            self.moveOnePixel('Down')
 
     def moveOnePixel(self, direction):
-        # print(self.selectedShape.points)
-        if direction == 'Left' and not self.moveOutOfBound(QPointF(-1.0, 0)):
-            # print("move Left one pixel")
-            self.selectedShape.points[0] += QPointF(-1.0, 0)
-            self.selectedShape.points[1] += QPointF(-1.0, 0)
-            self.selectedShape.points[2] += QPointF(-1.0, 0)
-            self.selectedShape.points[3] += QPointF(-1.0, 0)
-        elif direction == 'Right' and not self.moveOutOfBound(QPointF(1.0, 0)):
-            # print("move Right one pixel")
-            self.selectedShape.points[0] += QPointF(1.0, 0)
-            self.selectedShape.points[1] += QPointF(1.0, 0)
-            self.selectedShape.points[2] += QPointF(1.0, 0)
-            self.selectedShape.points[3] += QPointF(1.0, 0)
-        elif direction == 'Up' and not self.moveOutOfBound(QPointF(0, -1.0)):
-            # print("move Up one pixel")
-            self.selectedShape.points[0] += QPointF(0, -1.0)
-            self.selectedShape.points[1] += QPointF(0, -1.0)
-            self.selectedShape.points[2] += QPointF(0, -1.0)
-            self.selectedShape.points[3] += QPointF(0, -1.0)
-        elif direction == 'Down' and not self.moveOutOfBound(QPointF(0, 1.0)):
-            # print("move Down one pixel")
-            self.selectedShape.points[0] += QPointF(0, 1.0)
-            self.selectedShape.points[1] += QPointF(0, 1.0)
-            self.selectedShape.points[2] += QPointF(0, 1.0)
-            self.selectedShape.points[3] += QPointF(0, 1.0)
+        self.movePixels([direction])
+
+    def movePixels(self, directions):
+        """Move the selected shape one pixel per direction, as one update."""
+        before = self.shapeRect([self.selectedShape])
+        offset = QPointF(0, 0)
+        for direction in directions:
+            # Each step stops at the image border on its own, as separate
+            # key presses would.
+            step = offset + PIXEL_STEPS[direction]
+            if not self.moveOutOfBound(step):
+                offset = step
+        if not offset.isNull():
+            for i in range(4):
+                self.selectedShape.moveVertexBy(i, offset)
         self.shapeMoved.emit()
-        self.repaint()
+        self.updateShapes([self.selectedShape], before)
 
     def moveOutOfBound(self, step):
         points = [p1+p2 for p1, p2 in zip(self.selectedShape.points, [step]*4)]
@@ -773,6 +1059,7 @@ class Canvas(QWidget):
     def undoLastLine(self):
         assert self.shapes
         self.current = self.shapes.pop()
+        self.shapeIndex.remove(self.current)
         self.current.setOpen()
         self.line.points = [self.current[-1], self.current[0]]
         self.drawingPolygon.emit(True)
@@ -780,6 +1067,7 @@ class Canvas(QWidget):
     def resetAllLines(self):
         assert self.shapes
         self.current = self.shapes.pop()
+        self.shapeIndex.remove(self.current)
         self.current.setOpen()
         self.line.points = [self.current[-1], self.current[0]]
         self.drawingPolygon.emit(True)
@@ -787,29 +1075,77 @@ class Canvas(QWidget):
         self.drawingPolygon.emit(False)
         self.update()
 
-    def loadPixmap(self, pixmap):
+    def loadPixmap(self, pixmap, image=None):
+        """Show pixmap; pass the QImage it came from, if any, to save a copy."""
+        self.tiles.clear()
+        self.showPixmap(pixmap, image)
+
+    def loadTiledImage(self, path):
+        """Show the image at path without decoding it whole.
+
+        Return the overview QImage drawn until the visible tiles are
+        decoded, or None if path cannot be read.
+        """
+        image = self.tiles.open(path)
+        if image is not None:
+            self.showPixmap(QPixmap.fromImage(image), image)
+        return image
+
+    def loadPreview(self, pixmap, size):
+        """Show pixmap, a reduced copy of an image of size, until upgradePixmap()."""
+        self.tiles.clear()
+        self.showPixmap(pixmap)
+        self.previewSize = size
+
+    def upgradePixmap(self, pixmap, image=None):
+        """Replace the preview with the full image, keeping the shapes."""
+        self.previewSize = None
+        self.pixmap = pixmap
+        self.pyramid.reset(pixmap, image)
+        self.drawnFactor = 1
+        self.update()
+
+    def showPixmap(self, pixmap, image=None):
+        self.previewSize = None
         self.pixmap = pixmap
+        self.pyramid.reset(pixmap, image)
+        self.drawnFactor = 1
         self.shapes = []
-        self.repaint()
+        self.shapeIndex.clear()
+        self.update()
 
     def loadShapes(self, shapes):
         self.shapes = list(shapes)
+        self.shapeIndex.rebuild(self.shapes)
         self.current = None
-        self.repaint()
+        self.update()
 
     def setShapeVisible(self, shape, value):
         self.visible[shape] = value
-        self.repaint()
+        self.layerDirty.append(self.shapeRect([shape]))
+        self.updateShapes([shape])
 
     def overrideCursor(self, cursor):
-        self.restoreCursor()
+        if not self._cursorOverridden:
+            QApplication.setOverrideCursor(cursor)
+            self._cursorOverridden = True
+        elif cursor != self._cursor:
+            QApplication.changeOverrideCursor(cursor)
         self._cursor = cursor
-        QApplication.setOverrideCursor(cursor)
 
     def restoreCursor(self):
-        QApplication.restoreOverrideCursor()
+        if self._cursorOverridden:
+            QApplication.restoreOverrideCursor()
+            self._cursorOverridden = False
 
     def resetState(self):
+        self.inputTimer.stop()
+        self.pendingMove = None
+        self.pendingNudges = []
+        self.inputSince = None
         self.restoreCursor()
         self.pixmap = None
+        self.previewSize = None
+        self.pyramid.clear()
+        self.tiles.clear()
         self.update()
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from libs.imageCache import fileIdentity
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.labelImg', 'checkCache.sqlite')
+DEFAULT_MAX_ENTRIES = 100000
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, response TEXT, used REAL)',
+    'CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)',
+)
+
+
+def checkKey(url, imagePath, bigArea, tetragon, label):
+    """Hash of what the server at url sees: the image file, the crop and the shape type.
+
+    The image is identified by its path, mtime and size, so an edited
+    image never hits; None if it cannot be stat'ed.
+    """
+    identity = fileIdentity(imagePath)
+    if identity is None:
+        return None
+    text = json.dumps([url, os.path.abspath(imagePath), identity[0], identity[1],
+                       [int(round(v)) for v in bigArea], bool(tetragon), label])
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class CheckCache(object):
+    """Persistent cache of label-check answers, keyed by checkKey().
+
+    Answers live in one SQLite file (~/.labelImg/checkCache.sqlite) with
+    the time each was last used; beyond maxEntries the least recently
+    used are dropped.  The version of the server's model is kept with
+    them and setModelVersion() drops every answer when it changes.
+    Like DatasetIndex, every call opens its own connection.
+    """
+
+    def __init__(self, dbPath=None, maxEntries=DEFAULT_MAX_ENTRIES):
+        self.dbPath = dbPath or CACHE_PATH
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+
+    def connect(self):
+        folder = os.path.dirname(self.dbPath)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        connection = sqlite3.connect(self.dbPath, timeout=30)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        return connection
+
+    def lookup(self, keys):
+        """{key: response} for the keys that are cached."""
+        keys = [key for key in keys if key is not None]
+        found = {}
+        connection = self.connect()
+        try:
+            # Stay well below SQLite's limit on query parameters.
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                found.update((key, json.loads(response)) for key, response in connection.execute(
+                    'SELECT key, response FROM results WHERE key IN (%s)'
+                    % ','.join('?' * len(chunk)), chunk))
+            if found:
+                with connection:
+                    now = time.time()
+                    connection.executemany('UPDATE results SET used = ? WHERE key = ?',
+                                           [(now, key) for key in found])
+        finally:
+            connection.close()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def store(self, results):
+        """Cache (key, response) pairs, then evict down to maxEntries."""
+        rows = [(key, json.dumps(response), time.time()) for key, response in results
+                if key is not None]
+        if not rows:
+            return
+        connection = self.connect()
+        try:
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?)', rows)
+                connection.execute(
+                    'DELETE FROM results WHERE key NOT IN '
+                    '(SELECT key FROM results ORDER BY used DESC LIMIT ?)', (self.maxEntries,))
+        finally:
+            connection.close()
+
+    def modelVersion(self):
+        connection = self.connect()
+        try:
+            row = connection.execute(
+                "SELECT value FROM meta WHERE name = 'modelVersion'").fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    def setModelVersion(self, version):
+        """Record the server's model version, dropping answers from any other."""
+        if version == self.modelVersion():
+            return
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute('DELETE FROM results')
+                connection.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('modelVersion', ?)", (version,))
+        finally:
+            connection.close()
+
+    def clear(self):
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute('DELETE FROM results')
+        finally:
+            connection.close()
+
+    def count(self):
+        connection = self.connect()
+        try:
+            return connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        finally:
+            connection.close()
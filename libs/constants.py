@@ -8,4 +8,10 @@ SETTING_FILL_COLOR = 'fill/color'
 SETTING_ADVANCE_MODE = 'advanced'
 SETTING_WIN_STATE = 'window/state'
 SETTING_SAVE_DIR = 'savedir'
-SETTING_LAST_OPEN_DIR = 'lastOpenDir'
\ No newline at end of file
+SETTING_LAST_OPEN_DIR = 'lastOpenDir'
+SETTING_PREFETCH_DEPTH = 'prefetch/depth'
+SETTING_PREFETCH_DIRECTION = 'prefetch/direction'
+SETTING_IMAGE_CACHE_SIZE = 'imageCache/maxBytes'
+SETTING_CHECK_BATCH_SIZE = 'labelCheck/batchSize'
+SETTING_CHECK_CACHE_SIZE = 'labelCheck/cacheEntries'
+SETTING_CHECK_LOCAL = 'labelCheck/local'
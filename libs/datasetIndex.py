@@ -0,0 +1,142 @@
+import hashlib
+import os
+import sqlite3
+
+from lxml import etree
+
+from libs.dirScanner import imageSortKey
+from libs.imageCache import fileIdentity
+from libs.imageProbe import probeImage
+from libs.prefetcher import annotationPathFor
+
+INDEX_DIR = os.path.join(os.path.expanduser('~'), '.labelImg', 'index')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    width INTEGER,
+    height INTEGER,
+    annotation TEXT,
+    annotationMtime REAL,
+    verified INTEGER,
+    objects INTEGER
+)
+'''
+
+
+def indexPathFor(root):
+    root = os.path.abspath(root)
+    digest = hashlib.md5(root.encode('utf-8')).hexdigest()
+    return os.path.join(INDEX_DIR, digest + '.sqlite')
+
+
+def annotationSummary(xmlPath):
+    """Return (verified, number of objects) of a VOC xml file."""
+    try:
+        root = etree.parse(xmlPath).getroot()
+    except (etree.XMLSyntaxError, IOError, OSError):
+        return False, 0
+    return root.get('verified') == 'yes', len(root.findall('object'))
+
+
+class DatasetIndex(object):
+    """On-disk index of the images below one dataset root.
+
+    One SQLite file per root (under ~/.labelImg/index) remembers, for every
+    image, its size and mtime, its dimensions, where its annotation lives,
+    whether that annotation is verified and how many objects it holds.
+    Reopening a directory lists the indexed paths straight from the file,
+    and reconcile() brings it up to date by only probing the images and
+    annotations whose size or mtime changed.  Every call opens its own
+    connection, so the index can be used from worker threads.
+    """
+
+    def __init__(self, root, dbPath=None):
+        self.root = os.path.abspath(root)
+        self.dbPath = dbPath or indexPathFor(self.root)
+
+    @staticmethod
+    def exists(root):
+        return os.path.isfile(indexPathFor(root))
+
+    def connect(self):
+        folder = os.path.dirname(self.dbPath)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        connection = sqlite3.connect(self.dbPath, timeout=30)
+        connection.execute(SCHEMA)
+        return connection
+
+    def paths(self):
+        """All indexed image paths, in file list order."""
+        if not os.path.isfile(self.dbPath):
+            return []
+        connection = self.connect()
+        try:
+            paths = [row[0] for row in connection.execute('SELECT path FROM images')]
+        finally:
+            connection.close()
+        paths.sort(key=imageSortKey)
+        return paths
+
+    def record(self, path):
+        connection = self.connect()
+        try:
+            return connection.execute(
+                'SELECT path, size, mtime, width, height, annotation, annotationMtime, '
+                'verified, objects FROM images WHERE path = ?', (path,)).fetchone()
+        finally:
+            connection.close()
+
+    def reconcile(self, paths, saveDir=None, stale=None):
+        """Update the index to match paths, return (changed, removed) counts."""
+        connection = self.connect()
+        try:
+            known = dict((row[0], row[1:]) for row in connection.execute(
+                'SELECT path, size, mtime, width, height, annotation, annotationMtime FROM images'))
+            rows = []
+            for path in paths:
+                if stale is not None and stale():
+                    return 0, 0
+                identity = fileIdentity(path)
+                if identity is None:
+                    continue
+                mtime, size = identity
+                xmlPath = annotationPathFor(path, saveDir)
+                xmlIdentity = fileIdentity(xmlPath)
+                xmlMtime = xmlIdentity[0] if xmlIdentity else None
+                old = known.pop(path, None)
+                sameImage = old is not None and old[0] == size and old[1] == mtime
+                if sameImage and old[4] == xmlPath and old[5] == xmlMtime:
+                    continue
+                if sameImage:
+                    width, height = old[2], old[3]
+                else:
+                    width, height, _ = probeImage(path)
+                verified, objects = annotationSummary(xmlPath) if xmlIdentity else (False, 0)
+                rows.append((path, size, mtime, width, height, xmlPath, xmlMtime,
+                             int(verified), objects))
+            with connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                connection.executemany('DELETE FROM images WHERE path = ?',
+                                       [(path,) for path in known])
+            return len(rows), len(known)
+        finally:
+            connection.close()
+
+    def updateAnnotation(self, imagePath, xmlPath, verified, objects):
+        """Record a freshly saved annotation without waiting for a rescan."""
+        xmlIdentity = fileIdentity(xmlPath)
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute(
+                    'UPDATE images SET annotation = ?, annotationMtime = ?, verified = ?, '
+                    'objects = ? WHERE path = ?',
+                    (xmlPath, xmlIdentity[0] if xmlIdentity else None, int(verified),
+                     objects, imagePath))
+        finally:
+            connection.close()
@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import threading
+
+try:
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtCore import *
+
+from libs.ustr import ustr
+
+try:
+    from os import scandir
+except ImportError:
+    # Python < 3.5
+    scandir = None
+
+IMAGE_EXTENSIONS = ('.jpeg', '.jpg', '.png', '.bmp')
+BATCH_SIZE = 2000
+
+
+def imageSortKey(path):
+    return path.lower()
+
+
+def iterDirectory(folderPath):
+    """Yield (path, isDir) for the entries of one directory.
+
+    Symlinked directories are reported as files-that-are-not-images so
+    that, like os.walk, they are never descended into.
+    """
+    if scandir is not None:
+        for entry in scandir(folderPath):
+            isDir = entry.is_dir() and not entry.is_symlink()
+            yield entry.path, isDir
+    else:
+        for name in os.listdir(folderPath):
+            path = os.path.join(folderPath, name)
+            yield path, os.path.isdir(path) and not os.path.islink(path)
+
+
+def scanImages(folderPath):
+    """Synchronously return every image under folderPath, sorted."""
+    images = []
+    pending = [os.path.abspath(folderPath)]
+    while pending:
+        current = pending.pop()
+        try:
+            entries = list(iterDirectory(current))
+        except OSError:
+            continue
+        for path, isDir in entries:
+            if isDir:
+                pending.append(path)
+            elif path.lower().endswith(IMAGE_EXTENSIONS):
+                images.append(ustr(path))
+    images.sort(key=imageSortKey)
+    return images
+
+
+class ScanSignals(QObject):
+    batchFound = pyqtSignal(int, object)
+    finished = pyqtSignal(int)
+    indexed = pyqtSignal(int, object)
+
+
+class ScanTask(QRunnable):
+
+    def __init__(self, scanner, generation, path):
+        super(ScanTask, self).__init__()
+        self.scanner = scanner
+        self.generation = generation
+        self.path = path
+
+    def stale(self):
+        return self.generation != self.scanner.generation
+
+    def run(self):
+        try:
+            self.scan()
+        finally:
+            self.scanner.taskDone(self.generation)
+
+    def scan(self):
+        if self.stale():
+            return
+        batch = []
+        try:
+            for path, isDir in iterDirectory(self.path):
+                if self.stale():
+                    return
+                if isDir:
+                    self.scanner.submit(self.generation, path)
+                elif path.lower().endswith(IMAGE_EXTENSIONS):
+                    batch.append(ustr(path))
+                    if len(batch) >= BATCH_SIZE:
+                        self.scanner.signals.batchFound.emit(self.generation, batch)
+                        batch = []
+        except OSError:
+            # Unreadable directories are skipped, as os.walk does.
+            pass
+        if batch and not self.stale():
+            self.scanner.signals.batchFound.emit(self.generation, batch)
+
+
+class ReconcileTask(QRunnable):
+
+    def __init__(self, scanner, generation, index, paths, saveDir):
+        super(ReconcileTask, self).__init__()
+        self.scanner = scanner
+        self.generation = generation
+        self.index = index
+        self.paths = paths
+        self.saveDir = saveDir
+
+    def stale(self):
+        return self.generation != self.scanner.generation
+
+    def run(self):
+        try:
+            result = self.index.reconcile(self.paths, self.saveDir, self.stale)
+        except (sqlite3.Error, IOError, OSError) as e:
+            result = e
+        if not self.stale():
+            self.scanner.signals.indexed.emit(self.generation, result)
+
+
+class DirectoryScanner(QObject):
+    """Scan a directory tree for images on a worker pool.
+
+    Every directory is listed by its own task, so sibling directories are
+    scanned in parallel.  Image paths are reported through batchFound as
+    they are discovered, in no particular order; finished is emitted once
+    the whole tree has been listed.  reconcile() then brings a
+    DatasetIndex up to date in the background and reports through
+    indexed.  All signals carry the generation returned by scan(), and
+    starting a new scan, or cancel(), makes older ones stale.
+    """
+
+    def __init__(self, maxThreads=4, parent=None):
+        super(DirectoryScanner, self).__init__(parent)
+        self.generation = 0
+        self.outstanding = 0
+        self.lock = threading.Lock()
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(maxThreads)
+        self.signals = ScanSignals()
+        self.batchFound = self.signals.batchFound
+        self.finished = self.signals.finished
+        self.indexed = self.signals.indexed
+
+    def scan(self, folderPath):
+        self.cancel()
+        self.submit(self.generation, os.path.abspath(folderPath))
+        return self.generation
+
+    def reconcile(self, index, paths, saveDir=None):
+        self.pool.start(ReconcileTask(self, self.generation, index, paths, saveDir))
+
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+            self.outstanding = 0
+
+    def scanning(self):
+        return self.outstanding > 0
+
+    def submit(self, generation, path):
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.outstanding += 1
+        self.pool.start(ScanTask(self, generation, path))
+
+    def taskDone(self, generation):
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.outstanding -= 1
+            done = self.outstanding == 0
+        if done:
+            self.signals.finished.emit(generation)
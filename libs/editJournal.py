@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import threading
+
+try:
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtCore import *
+
+JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.labelImg', 'journal')
+# The records appended within this long of each other share one fsync.
+COMMIT_INTERVAL_MS = 50
+
+# Record kinds; every record is a JSON list [seq, kind, image, ...].
+SHAPE = 's'      # [seq, SHAPE, image, index, shape]: shape index now reads shape
+DELETE = 'd'     # [seq, DELETE, image, index]: shape index was deleted
+SHAPES = 'a'     # [seq, SHAPES, image, [shape, ...]]: all the shapes were replaced
+SAVING = 'p'     # [seq, SAVING, image, fingerprint]: a save of the edits up to seq started
+SAVED = 'w'      # [seq, SAVED, image, upTo]: the annotation holds edits up to seq upTo
+DISCARD = 'x'    # [seq, DISCARD, image]: the unsaved edits were thrown away
+
+
+def journalPathFor(root):
+    root = os.path.abspath(root)
+    digest = hashlib.md5(root.encode('utf-8')).hexdigest()
+    return os.path.join(JOURNAL_DIR, digest + '.journal')
+
+
+def shapeRecord(shape):
+    """The compact form of a Shape: [label, [x, y, ...], difficult, tetragon, angle, shape3D]."""
+    points = []
+    for p in shape.points:
+        points.extend((p.x(), p.y()))
+    return [shape.label, points, shape.difficult, shape.tetragon, shape.deg, shape.shape3D]
+
+
+def applyEdits(shapes, edits):
+    """Replay edits on shapes, as MainWindow.loadLabels takes them; returns a new list."""
+    shapes = list(shapes)
+    for record in edits:
+        kind = record[1]
+        if kind == SHAPES:
+            shapes = [loadedShape(shape) for shape in record[3]]
+        elif kind == SHAPE and record[3] <= len(shapes):
+            if record[3] == len(shapes):
+                shapes.append(loadedShape(record[4]))
+            else:
+                shapes[record[3]] = loadedShape(record[4])
+        elif kind == DELETE and record[3] < len(shapes):
+            del shapes[record[3]]
+    return shapes
+
+
+def loadedShape(record):
+    label, points, difficult, tetragon, angle, shape3D = record
+    return (label, list(zip(points[::2], points[1::2])), None, None,
+            difficult, tetragon, angle, shape3D)
+
+
+class SyncTask(QRunnable):
+
+    def __init__(self, journal):
+        super(SyncTask, self).__init__()
+        self.journal = journal
+
+    def run(self):
+        journal = self.journal
+        with journal.lock:
+            if not journal.unsynced:
+                return
+            # Everything appended until now goes out with this fsync;
+            # appends during it wait for the next one.
+            journal.unsynced = 0
+        try:
+            os.fsync(journal.fd)
+        except OSError as e:
+            with journal.lock:
+                journal.syncFailures += 1
+            journal.syncFailed.emit(e)
+            return
+        with journal.lock:
+            journal.syncs += 1
+
+
+class EditJournal(QObject):
+    """Append-only log of the shape edits made in one dataset.
+
+    Each edit is one JSON line written straight to the journal file
+    (~/.labelImg/journal, one file per dataset root), so it survives the
+    program crashing.  A worker thread fsyncs COMMIT_INTERVAL_MS after
+    the first line written since the last fsync, once for all the lines
+    written by then, so appending costs no disk wait.  An
+    annotation save records how far it got and discarding changes is
+    recorded too; edits after those are the unsaved ones that
+    unsavedEdits() hands back, for instance after a crash.  A save is
+    recorded once more as it starts, with the fingerprint of what it
+    writes, in case the program dies after the file is written but
+    before the save is recorded.  Once every edit is saved the file is
+    emptied.
+    """
+
+    # An fsync failed, with the OSError: the edits since may not survive
+    # a crash.  Emitted from the sync thread.
+    syncFailed = pyqtSignal(object)
+
+    def __init__(self, root, path=None, parent=None, commitInterval=COMMIT_INTERVAL_MS):
+        super(EditJournal, self).__init__(parent)
+        self.path = path or journalPathFor(root)
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        self.lock = threading.Lock()
+        self.unsynced = 0
+        self.appends = 0
+        self.syncs = 0
+        self.syncFailures = 0
+        # image -> its unsaved edit records, in order
+        self.edits = {}
+        self.seq = 0
+        torn = self.replay()
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if torn:
+            # Do not run on from half a record.
+            os.write(self.fd, b'\n')
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(commitInterval)
+        self.timer.timeout.connect(self.commit)
+        if not self.edits:
+            self.compact()
+
+    def replay(self):
+        """Read the records in the file; whether its last line is unfinished."""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return False
+        for line in data.split(b'\n'):
+            try:
+                record = json.loads(line.decode('utf-8'))
+            except ValueError:
+                # The line being written when the program died.
+                continue
+            self.apply(record)
+            self.seq = max(self.seq, record[0])
+        return bool(data) and not data.endswith(b'\n')
+
+    def apply(self, record):
+        kind, image = record[1], record[2]
+        if kind == SAVED:
+            edits = [edit for edit in self.edits.get(image, ()) if edit[0] > record[3]]
+            if edits:
+                self.edits[image] = edits
+            else:
+                self.edits.pop(image, None)
+        elif kind == DISCARD:
+            self.edits.pop(image, None)
+        else:
+            self.edits.setdefault(image, []).append(record)
+
+    def append(self, kind, image, *fields):
+        self.seq += 1
+        record = [self.seq, kind, os.path.abspath(image)] + list(fields)
+        self.apply(record)
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        os.write(self.fd, line.encode('utf-8'))
+        self.appends += 1
+        with self.lock:
+            self.unsynced += 1
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def commit(self):
+        self.timer.stop()
+        self.pool.start(SyncTask(self))
+
+    def shapeChanged(self, image, index, shape):
+        """Shape index of image was added (index == count) or changed."""
+        self.append(SHAPE, image, index, shapeRecord(shape))
+
+    def shapeDeleted(self, image, index):
+        self.append(DELETE, image, index)
+
+    def shapesLoaded(self, image, shapes):
+        """All the shapes of image were replaced by shapes."""
+        self.append(SHAPES, image, [shapeRecord(shape) for shape in shapes])
+
+    def saving(self, image, fingerprint):
+        """A save of image's edits so far starts; returns the seq it covers.
+
+        fingerprint is LabelFile.shapesFingerprint of the shapes saved, so
+        that savedUpTo() can tell if the save got to disk.
+        """
+        image = os.path.abspath(image)
+        if image in self.edits:
+            self.append(SAVING, image, fingerprint)
+        return self.seq
+
+    def savedUpTo(self, image, fingerprint):
+        """The seq of the last save of image that wrote fingerprint, or 0."""
+        for record in reversed(self.edits.get(os.path.abspath(image), ())):
+            if record[1] == SAVING and record[3] == fingerprint:
+                return record[0]
+        return 0
+
+    def saved(self, image, upTo):
+        """The annotation of image now holds its edits up to seq upTo."""
+        image = os.path.abspath(image)
+        if image not in self.edits:
+            return
+        self.append(SAVED, image, upTo)
+        if not self.edits:
+            self.compact()
+
+    def discard(self, image):
+        image = os.path.abspath(image)
+        if image not in self.edits:
+            return
+        self.append(DISCARD, image)
+        if not self.edits:
+            self.compact()
+
+    def unsavedEdits(self, image):
+        return [edit for edit in self.edits.get(os.path.abspath(image), ())
+                if edit[1] != SAVING]
+
+    def unsavedImages(self):
+        return sorted(self.edits)
+
+    def compact(self):
+        # Nothing is unsaved: the records are no longer needed.
+        os.ftruncate(self.fd, 0)
+
+    def close(self):
+        if self.fd is None:
+            return
+        self.timer.stop()
+        self.pool.waitForDone()
+        os.fsync(self.fd)
+        os.close(self.fd)
+        self.fd = None
+
+    def stats(self):
+        with self.lock:
+            syncs, syncFailures = self.syncs, self.syncFailures
+        return {'appends': self.appends, 'syncs': syncs, 'syncFailures': syncFailures,
+                'unsaved': len(self.edits)}
@@ -0,0 +1,71 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+
+class FileListModel(QAbstractListModel):
+    """Image paths of the opened directory, for the file list dock.
+
+    The paths live in one plain list next to a path -> row dictionary, so
+    the view only asks for the rows it shows and navigation can look up
+    the row of a path in constant time.  It also behaves like a read-only
+    sequence (len, [], in, iteration) for the code that walks the images.
+    """
+
+    def __init__(self, parent=None):
+        super(FileListModel, self).__init__(parent)
+        self.paths = []
+        self.rows = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self.paths):
+            return None
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self.paths[index.row()]
+        return None
+
+    def setPaths(self, paths):
+        self.beginResetModel()
+        self.paths = list(paths)
+        self.rows = dict((path, row) for row, path in enumerate(self.paths))
+        self.endResetModel()
+
+    def appendPaths(self, paths):
+        if not paths:
+            return
+        first = len(self.paths)
+        self.beginInsertRows(QModelIndex(), first, first + len(paths) - 1)
+        for row, path in enumerate(paths, first):
+            self.rows[path] = row
+        self.paths.extend(paths)
+        self.endInsertRows()
+
+    def clear(self):
+        self.setPaths([])
+
+    def rowOf(self, path):
+        """Row of path, or -1 if it is not in the list."""
+        return self.rows.get(path, -1)
+
+    def pathAt(self, row):
+        return self.paths[row]
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, row):
+        return self.paths[row]
+
+    def __contains__(self, path):
+        return path in self.rows
+
+    def __iter__(self):
+        return iter(self.paths)
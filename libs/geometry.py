@@ -0,0 +1,65 @@
+import math
+
+import numpy as np
+
+try:
+    from PyQt5.QtCore import QPointF
+except ImportError:
+    from PyQt4.QtCore import QPointF
+
+# Shapes have 4 or 8 points: building an array for one costs more than
+# the loop over its points, so rotatePoints() and pointBounds() are plain
+# Python that only compute the trigonometry once per call.
+
+
+def toArray(points):
+    """(N, 2) array of a list of QPointF or (x, y) pairs."""
+    if points and isinstance(points[0], QPointF):
+        return np.array([(p.x(), p.y()) for p in points], dtype=np.float64).reshape(-1, 2)
+    return np.array(points, dtype=np.float64).reshape(-1, 2)
+
+
+def rotatePoints(points, center, angle):
+    """Rotate a short list of QPointF about the QPointF center."""
+    radians = (math.pi / 180) * angle
+    cos = math.cos(radians)
+    sin = math.sin(radians)
+    cx, cy = center.x(), center.y()
+    rotated = []
+    for point in points:
+        dx, dy = point.x() - cx, point.y() - cy
+        rotated.append(QPointF(cos * dx + sin * dy + cx, cos * dy - sin * dx + cy))
+    return rotated
+
+
+def pointBounds(points):
+    """[xmin, ymin, xmax, ymax] of a short list of QPointF."""
+    xs = [p.x() for p in points]
+    ys = [p.y() for p in points]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def convexHull(coords):
+    """Indices of the convex hull of (x, y) pairs, by Andrew's monotone chain.
+
+    Unlike scipy's ConvexHull this is cheap for the 4 and 8 point shapes
+    and does not raise for collinear or repeated points.
+    """
+    order = sorted(range(len(coords)), key=lambda i: coords[i])
+    if len(order) < 3:
+        return order
+    lower = []
+    for i in order:
+        while len(lower) >= 2 and _cross(coords[lower[-2]], coords[lower[-1]], coords[i]) <= 0:
+            lower.pop()
+        lower.append(i)
+    upper = []
+    for i in reversed(order):
+        while len(upper) >= 2 and _cross(coords[upper[-2]], coords[upper[-1]], coords[i]) <= 0:
+            upper.pop()
+        upper.append(i)
+    return lower[:-1] + upper[:-1]
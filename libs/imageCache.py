@@ -0,0 +1,126 @@
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_BYTES = 1024 * 1024 * 1024
+
+
+def imageBytes(image):
+    """Approximate memory held by a decoded QImage."""
+    if image is None:
+        return 0
+    if hasattr(image, 'sizeInBytes'):
+        return image.sizeInBytes()
+    return image.byteCount()
+
+
+def fileIdentity(path):
+    """(mtime, size) of path, or None if it cannot be stat'ed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+class CacheEntry(object):
+
+    def __init__(self, path, identity, imageData, image):
+        self.path = path
+        self.identity = identity
+        self.imageData = imageData
+        self.image = image
+        self.nbytes = len(imageData or b'') + imageBytes(image)
+
+
+class ImageCache(object):
+    """LRU cache of decoded images bounded by a byte budget.
+
+    Entries are keyed by path and are only returned while the file's
+    mtime and size still match what was cached.  The cache is shared by
+    the GUI thread and the prefetch workers, so every access is locked.
+    """
+
+    def __init__(self, maxBytes=DEFAULT_CACHE_BYTES):
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()
+        self.currentBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, path):
+        return self.peek(path) is not None
+
+    def peek(self, path):
+        """Like get(), but without touching the LRU order or the counters."""
+        identity = fileIdentity(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry.identity != identity:
+                return None
+            return entry
+
+    def get(self, path):
+        identity = fileIdentity(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry.identity != identity:
+                # The file changed on disk since it was decoded.
+                self._remove(path)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.pop(path)
+            self.entries[path] = entry
+            return entry
+
+    def put(self, path, imageData, image, identity=None):
+        if identity is None:
+            identity = fileIdentity(path)
+        entry = CacheEntry(path, identity, imageData, image)
+        with self.lock:
+            if path in self.entries:
+                self._remove(path)
+            if entry.nbytes > self.maxBytes:
+                return entry
+            self.entries[path] = entry
+            self.currentBytes += entry.nbytes
+            while self.currentBytes > self.maxBytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, path):
+        with self.lock:
+            if path in self.entries:
+                self._remove(path)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.currentBytes = 0
+
+    def setMaxBytes(self, maxBytes):
+        with self.lock:
+            self.maxBytes = maxBytes
+            while self.entries and self.currentBytes > self.maxBytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(entries=len(self.entries), bytes=self.currentBytes,
+                        maxBytes=self.maxBytes, hits=self.hits,
+                        misses=self.misses, evictions=self.evictions)
+
+    def _remove(self, path):
+        entry = self.entries.pop(path)
+        self.currentBytes -= entry.nbytes
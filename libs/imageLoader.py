@@ -0,0 +1,101 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.imageCache import fileIdentity
+from libs.imagePyramid import ImagePyramid
+from libs.labelFile import read
+from libs.tiledImage import scaledSize
+
+# libjpeg scales by 1/2, 1/4 and 1/8 while decoding (DCT scaling).
+MAX_PREVIEW_FACTOR = 8
+
+
+def previewFactor(path, fitSize, pixelRatio=1.0):
+    """(factor, full size) for a preview of path fitted into fitSize.
+
+    factor is the largest power of two, up to MAX_PREVIEW_FACTOR, by
+    which the image can be decoded smaller and still have one pixel per
+    device pixel when fitted, or 1 if a preview would not be faster:
+    only JPEG decoders scale while decoding, other formats decode in
+    full first.
+    """
+    reader = QImageReader(path)
+    size = reader.size()
+    if bytes(reader.format()).lower() not in (b'jpeg', b'jpg') or size.isEmpty():
+        return 1, size
+    scale = min(float(fitSize.width()) / size.width(), float(fitSize.height()) / size.height())
+    return min(ImagePyramid.wantedFactor(scale * pixelRatio), MAX_PREVIEW_FACTOR), size
+
+
+def readPreview(path, factor):
+    """Decode path at 1/factor of its size."""
+    reader = QImageReader(path)
+    reader.setScaledSize(scaledSize(reader.size(), factor))
+    return reader.read()
+
+
+class LoadRecord(object):
+
+    def __init__(self, path, identity, imageData, image):
+        self.path = path
+        self.identity = identity
+        self.imageData = imageData
+        self.image = image
+
+
+class LoaderSignals(QObject):
+    loaded = pyqtSignal(int, object)
+
+
+class LoadTask(QRunnable):
+
+    def __init__(self, loader, generation, path):
+        super(LoadTask, self).__init__()
+        self.loader = loader
+        self.generation = generation
+        self.path = path
+
+    def stale(self):
+        return self.generation != self.loader.generation
+
+    def run(self):
+        if self.stale():
+            return
+        identity = fileIdentity(self.path)
+        imageData = read(self.path, None)
+        if imageData is None or self.stale():
+            return
+        image = QImage.fromData(imageData)
+        if image.isNull() or self.stale():
+            return
+        self.loader.signals.loaded.emit(self.generation,
+                                        LoadRecord(self.path, identity, imageData, image))
+
+
+class ImageLoader(QObject):
+    """Decode the full image behind a preview on a worker thread.
+
+    load() returns a generation; loaded is emitted with it and a
+    LoadRecord once the image is decoded.  Loading another image, or
+    cancel(), makes earlier loads stale.
+    """
+
+    def __init__(self, parent=None):
+        super(ImageLoader, self).__init__(parent)
+        self.generation = 0
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = LoaderSignals()
+        self.loaded = self.signals.loaded
+
+    def load(self, path):
+        self.cancel()
+        self.pool.start(LoadTask(self, self.generation, path))
+        return self.generation
+
+    def cancel(self):
+        self.generation += 1
@@ -0,0 +1,123 @@
+import struct
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# SOFn markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) do not.
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - set([0xC4, 0xC8, 0xCC])
+PNG_CHANNELS = {0: 1, 2: 3, 4: 2, 6: 4}
+
+
+class ImageProbeError(Exception):
+    pass
+
+
+def _grayPalette(entries, stride):
+    for i in range(0, len(entries) - stride + 1, stride):
+        b, g, r = entries[i:i + 3]
+        if not (r == g == b):
+            return False
+    return True
+
+
+def _probeJpeg(f):
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise ImageProbeError('no SOF marker')
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            raise ImageProbeError('truncated jpeg')
+        code = ord(marker)
+        if code == 0x01 or 0xD0 <= code <= 0xD9:
+            # Standalone markers have no length field.
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        if code in JPEG_SOF_MARKERS:
+            _, height, width, components = struct.unpack('>BHHB', f.read(6))
+            return width, height, components
+        f.seek(length - 2, 1)
+
+
+def _probePng(f):
+    f.seek(8)
+    length, kind = struct.unpack('>I4s', f.read(8))
+    if kind != b'IHDR':
+        raise ImageProbeError('png without IHDR')
+    width, height, _, colorType = struct.unpack('>IIBB', f.read(10))
+    if colorType != 3:
+        return width, height, PNG_CHANNELS.get(colorType, 3)
+    # Paletted: grayscale only if every palette entry is gray.
+    f.seek(8 + 8 + length + 4)
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return width, height, 3
+        length, kind = struct.unpack('>I4s', header)
+        if kind == b'PLTE':
+            palette = bytearray(f.read(length))
+            return width, height, 1 if _grayPalette(palette, 3) else 3
+        if kind == b'IDAT':
+            return width, height, 3
+        f.seek(length + 4, 1)
+
+
+def _probeBmp(f):
+    f.seek(14)
+    headerSize = struct.unpack('<I', f.read(4))[0]
+    if headerSize == 12:
+        width, height, _, bpp = struct.unpack('<hhHH', f.read(8))
+        stride, colorsUsed = 3, 0
+    else:
+        width, height, _, bpp = struct.unpack('<iiHH', f.read(12))
+        stride = 4
+        colorsUsed = 0
+        if headerSize >= 40:
+            f.seek(14 + 32)
+            colorsUsed = struct.unpack('<I', f.read(4))[0]
+    height = abs(height)
+    if bpp > 8:
+        return width, height, 3
+    colors = colorsUsed or (1 << bpp)
+    f.seek(14 + headerSize)
+    palette = bytearray(f.read(colors * stride))
+    return width, height, 1 if _grayPalette(palette, stride) else 3
+
+
+def probeHeader(path):
+    """Return (width, height, channels) read from the file header only.
+
+    Supports JPEG, PNG and BMP; raises ImageProbeError for anything else.
+    Only a few hundred bytes are read, except for JPEGs with large
+    metadata segments, which are skipped with seeks rather than reads.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(8)
+        try:
+            if head[:2] == b'\xff\xd8':
+                return _probeJpeg(f)
+            if head == PNG_SIGNATURE:
+                return _probePng(f)
+            if head[:2] == b'BM':
+                return _probeBmp(f)
+        except struct.error:
+            raise ImageProbeError('truncated header in %s' % path)
+    raise ImageProbeError('unsupported image format: %s' % path)
+
+
+def probeImage(path):
+    """Return (width, height, channels), decoding the image only if needed."""
+    try:
+        return probeHeader(path)
+    except (ImageProbeError, IOError, OSError):
+        pass
+    try:
+        from PyQt5.QtGui import QImage
+    except ImportError:
+        from PyQt4.QtGui import QImage
+    image = QImage()
+    image.load(path)
+    return image.width(), image.height(), 1 if image.isGrayscale() else 3
@@ -0,0 +1,108 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+# Levels stop once their longer side would drop below this.
+MIN_LEVEL_SIZE = 256
+
+
+class PyramidSignals(QObject):
+    levelReady = pyqtSignal(int, int, object)
+
+
+class PyramidTask(QRunnable):
+
+    def __init__(self, pyramid, generation, image):
+        super(PyramidTask, self).__init__()
+        self.pyramid = pyramid
+        self.generation = generation
+        self.image = image
+
+    def stale(self):
+        return self.generation != self.pyramid.generation
+
+    def run(self):
+        image = self.image
+        factor = 1
+        while max(image.width(), image.height()) // 2 >= MIN_LEVEL_SIZE:
+            if self.stale():
+                return
+            # Halving the previous level each time is cheaper than scaling
+            # the full image down and looks the same.
+            image = image.scaled(max(1, image.width() // 2), max(1, image.height() // 2),
+                                 Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            factor *= 2
+            self.pyramid.signals.levelReady.emit(self.generation, factor, image)
+
+
+class ImagePyramid(QObject):
+    """Pre-downscaled copies of the canvas image at 1/2, 1/4, 1/8, ...
+
+    reset() takes a new image; the levels are built on a worker thread the
+    first time level() is asked for a scale below one half, and become
+    available one by one, largest first.  level() returns the smallest
+    level available that still has at least one image pixel per device
+    pixel at that scale, falling back to the full image.  levelReady is
+    emitted, in the GUI thread, each time another level is available.
+    """
+
+    levelReady = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super(ImagePyramid, self).__init__(parent)
+        self.generation = 0
+        self.image = None
+        self.pixmap = None
+        self.levels = {}
+        self.building = False
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = PyramidSignals()
+        self.signals.levelReady.connect(self.onLevelReady)
+
+    def reset(self, pixmap, image=None):
+        self.generation += 1
+        self.pixmap = pixmap
+        self.image = image
+        self.levels = {}
+        self.building = False
+
+    @staticmethod
+    def wantedFactor(scale):
+        """Largest power of two factor that keeps full display resolution."""
+        factor = 1
+        while scale * factor * 2 <= 1.0:
+            factor *= 2
+        return factor
+
+    def level(self, scale):
+        """Return (factor, pixmap) to draw at scale device pixels per image pixel."""
+        wanted = self.wantedFactor(scale)
+        if wanted > 1 and not self.building and self.pixmap is not None \
+                and not self.pixmap.isNull():
+            self.build()
+        best = 1
+        for factor in self.levels:
+            if best < factor <= wanted:
+                best = factor
+        if best == 1:
+            return 1, self.pixmap
+        return best, self.levels[best]
+
+    def build(self):
+        self.building = True
+        if self.image is None:
+            self.image = self.pixmap.toImage()
+        self.pool.start(PyramidTask(self, self.generation, self.image))
+
+    def onLevelReady(self, generation, factor, image):
+        if generation != self.generation:
+            return
+        self.levels[factor] = QPixmap.fromImage(image)
+        self.levelReady.emit(factor)
+
+    def clear(self):
+        self.reset(None)
@@ -0,0 +1,335 @@
+import json
+import sqlite3
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_BATCH_SIZE = 16
+
+# Answers from a server that does not know the batch request: it finds no
+# 'file' field, or has no such route.
+UNBATCHED_STATUS = (400, 404, 405, 413, 415, 501)
+
+# Sent by servers that say which model produced the answer.
+MODEL_VERSION_HEADER = 'X-Model-Version'
+
+# What the server's 200 answer stood for before it returned coordinates;
+# still used when the body is not a JSON array.  The values are the
+# centre, height and width of the box (or the four tetragon corners) as
+# fractions of the crop.
+PLACEHOLDER_BOX = [0.5, 0.5, 1, 0.5]
+PLACEHOLDER_TETRAGON = [0.3, 0.3, 0.6, 0.3, 0.6, 0.6, 0.3, 0.6]
+
+
+def encodeCrop(image, fmt):
+    """Encode a QImage to bytes in memory."""
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, fmt)
+    buffer.close()
+    return bytes(data)
+
+
+def parseResponse(body, tetragon):
+    """(corrections, ok) for a 200 response body: 4 or 8 fractions of the crop.
+
+    ok is False when the body holds no corrections and the placeholder
+    stands in for them.
+    """
+    try:
+        values = json.loads(body.decode('utf-8') if isinstance(body, bytes) else body)
+    except (ValueError, UnicodeDecodeError):
+        values = None
+    if isinstance(values, list) and len(values) in (4, 8) and \
+            all(isinstance(v, (int, float)) for v in values):
+        return [float(v) for v in values], True
+    return list(PLACEHOLDER_TETRAGON if tetragon else PLACEHOLDER_BOX), False
+
+
+def batchMeta(jobs):
+    """The 'meta' field of a batch request, describing each crop in order."""
+    return json.dumps([{'name': job.name, 'label': job.label, 'bigArea': list(job.bigArea),
+                        'tetragon': bool(job.tetragon)} for job in jobs])
+
+
+def parseBatchResponse(body, jobs):
+    """(corrections, ok) for each job, or None if this is not a batch answer.
+
+    A batch answer is a JSON array with one entry per crop, in the order
+    sent; each entry is read like a single response body.
+    """
+    try:
+        values = json.loads(body.decode('utf-8') if isinstance(body, bytes) else body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(jobs) or \
+            not all(v is None or isinstance(v, list) for v in values):
+        return None
+    return [parseResponse(json.dumps(v), job.tetragon) for v, job in zip(values, jobs)]
+
+
+class CheckJob(object):
+    """One shape to check: the crop around it and where the crop lies.
+
+    bigArea is (x1, y1, x2, y2) of the crop in image coordinates; name is
+    the file name the crop is uploaded under and key, if any, its
+    CheckCache key.  modelVersion is set from the server's answer, and
+    placeholder if that answer held no corrections.
+    """
+
+    def __init__(self, shape, label, crop, bigArea, tetragon, name, fmt, key=None):
+        self.shape = shape
+        self.label = label
+        self.crop = crop
+        self.bigArea = bigArea
+        self.tetragon = tetragon
+        self.name = name
+        self.fmt = fmt
+        self.key = key
+        self.modelVersion = None
+        self.placeholder = False
+
+
+class CheckSignals(QObject):
+    checked = pyqtSignal(int, object, object)
+    failed = pyqtSignal(int, object, object)
+    unbatched = pyqtSignal(int, object, object)
+
+
+class CheckTask(QRunnable):
+
+    def __init__(self, checker, generation, url, job):
+        super(CheckTask, self).__init__()
+        self.checker = checker
+        self.generation = generation
+        self.url = url
+        self.job = job
+
+    def stale(self):
+        return self.generation != self.checker.generation
+
+    def run(self):
+        if self.stale():
+            return
+        job = self.job
+        session = self.checker.takeSession()
+        try:
+            data = encodeCrop(job.crop, job.fmt)
+            response = session.post(
+                self.url, files={'file': (job.name, data)}, timeout=self.checker.timeout)
+        except requests.RequestException as e:
+            self.checker.signals.failed.emit(self.generation, job, e)
+            return
+        finally:
+            self.checker.giveSession(session)
+        # The body has been read, so the connection is back in the pool.
+        if response.status_code == 200:
+            job.modelVersion = response.headers.get(MODEL_VERSION_HEADER)
+            values, ok = parseResponse(response.content, job.tetragon)
+            job.placeholder = not ok
+            self.checker.signals.checked.emit(self.generation, job, values)
+        else:
+            self.checker.signals.failed.emit(self.generation, job, response)
+
+
+class BatchTask(CheckTask):
+    """Several jobs in one request: files 'crops' and a 'meta' field."""
+
+    def run(self):
+        if self.stale():
+            return
+        jobs = self.job
+        if not self.checker.batching:
+            # An earlier batch was turned down since this one was queued.
+            self.checker.signals.unbatched.emit(self.generation, self.url, jobs)
+            return
+        session = self.checker.takeSession()
+        try:
+            files = [('crops', (job.name, encodeCrop(job.crop, job.fmt))) for job in jobs]
+            response = session.post(self.url, data={'meta': batchMeta(jobs)}, files=files,
+                                    timeout=self.checker.timeout)
+        except requests.RequestException as e:
+            for job in jobs:
+                self.checker.signals.failed.emit(self.generation, job, e)
+            return
+        finally:
+            self.checker.giveSession(session)
+        if response.status_code in UNBATCHED_STATUS:
+            self.checker.signals.unbatched.emit(self.generation, self.url, jobs)
+        elif response.status_code == 200:
+            results = parseBatchResponse(response.content, jobs)
+            if results is None:
+                self.checker.signals.unbatched.emit(self.generation, self.url, jobs)
+                return
+            for job, (values, ok) in zip(jobs, results):
+                job.modelVersion = response.headers.get(MODEL_VERSION_HEADER)
+                job.placeholder = not ok
+                self.checker.signals.checked.emit(self.generation, job, values)
+        else:
+            for job in jobs:
+                self.checker.signals.failed.emit(self.generation, job, response)
+
+
+class LabelChecker(QObject):
+    """Send crops around shapes to the label-check server in the background.
+
+    check() queues one CheckJob per shape; up to `workers` requests run
+    at once, each taking a requests.Session from a small pool so the
+    connections are reused.  Unless batchSize is 1, jobs go out in
+    batches of up to batchSize crops per request; if the server does not
+    answer a batch with one result per crop, batching is turned off and
+    those jobs are sent one by one.  Results arrive in the GUI thread, in
+    completion order, through checked (the job and its corrections) or
+    failed (the job and the exception or non-200 response).  Each is
+    followed by progress with the number of jobs done and queued, and
+    finished is emitted once all are done.  cancel() drops everything
+    queued or in flight.
+
+    With a CheckCache, jobs whose key is cached are answered from it
+    straight away, and new answers other than placeholders are stored
+    once a check is finished.
+    A server that sends X-Model-Version with a new version empties the
+    cache first.  Cache errors do not stop a check; each is reported
+    through cacheFailed with the sqlite3.Error.
+    """
+
+    checked = pyqtSignal(object, object)
+    failed = pyqtSignal(object, object)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal()
+    cacheFailed = pyqtSignal(object)
+
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT,
+                 batchSize=DEFAULT_BATCH_SIZE, cache=None, parent=None):
+        super(LabelChecker, self).__init__(parent)
+        self.workers = workers
+        self.timeout = timeout
+        self.batchSize = batchSize
+        # Cleared when the server turns a batch down.
+        self.batching = batchSize > 1
+        self.cache = cache
+        # The last model version the server reported.
+        self.modelVersion = None
+        self.toStore = []
+        self.generation = 0
+        self.done = 0
+        self.total = 0
+        self.lock = threading.Lock()
+        self.sessions = []
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(workers)
+        self.signals = CheckSignals()
+        self.signals.checked.connect(self.onChecked)
+        self.signals.failed.connect(self.onFailed)
+        self.signals.unbatched.connect(self.onUnbatched)
+
+    def takeSession(self):
+        # Pooled by hand: threading.local does not last across tasks on
+        # threads Python did not start, such as those of QThreadPool.
+        with self.lock:
+            if self.sessions:
+                return self.sessions.pop()
+        session = requests.Session()
+        session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        return session
+
+    def giveSession(self, session):
+        with self.lock:
+            self.sessions.append(session)
+
+    def check(self, url, jobs):
+        """Queue jobs, after any still running; return the generation."""
+        jobs = list(jobs)
+        self.total += len(jobs)
+        cached, hits = {}, []
+        if self.cache is not None:
+            try:
+                cached = self.cache.lookup([job.key for job in jobs])
+            except sqlite3.Error as e:
+                self.cacheFailed.emit(e)
+            hits = [job for job in jobs if job.key in cached]
+            jobs = [job for job in jobs if job.key not in cached]
+        if self.batching and len(jobs) > 1:
+            # Spread the jobs evenly so every worker gets a batch.
+            size = min(self.batchSize, max(2, -(-len(jobs) // self.workers)))
+            for i in range(0, len(jobs), size):
+                self.pool.start(BatchTask(self, self.generation, url, jobs[i:i + size]))
+        else:
+            for job in jobs:
+                self.pool.start(CheckTask(self, self.generation, url, job))
+        self.progress.emit(self.done, self.total)
+        generation = self.generation
+        for job in hits:
+            if generation != self.generation:
+                # A slot cancelled the check.
+                break
+            self.checked.emit(job, cached[job.key])
+            self.jobDone()
+        return generation
+
+    def busy(self):
+        return self.done < self.total
+
+    def cancel(self):
+        self.generation += 1
+        self.done = self.total = 0
+        self.storeResults()
+
+    def onChecked(self, generation, job, values):
+        if generation == self.generation:
+            if self.cache is not None and job.key is not None:
+                if job.modelVersion is not None and job.modelVersion != self.modelVersion:
+                    # setModelVersion() empties the cache only if the
+                    # stored version differs; answers from an older model
+                    # are not kept either way.
+                    self.toStore = []
+                    try:
+                        self.cache.setModelVersion(job.modelVersion)
+                    except sqlite3.Error as e:
+                        self.cacheFailed.emit(e)
+                    self.modelVersion = job.modelVersion
+                if not job.placeholder:
+                    # A placeholder says nothing about the crop; ask again
+                    # next time.
+                    self.toStore.append((job.key, values))
+            self.checked.emit(job, values)
+            self.jobDone()
+
+    def onFailed(self, generation, job, error):
+        if generation == self.generation:
+            self.failed.emit(job, error)
+            self.jobDone()
+
+    def onUnbatched(self, generation, url, jobs):
+        if generation == self.generation:
+            self.batching = False
+            for job in jobs:
+                self.pool.start(CheckTask(self, generation, url, job))
+
+    def jobDone(self):
+        self.done += 1
+        self.progress.emit(self.done, self.total)
+        if self.done == self.total:
+            self.storeResults()
+            self.finished.emit()
+
+    def storeResults(self):
+        # Once per check, so a few hundred answers are one transaction.
+        if self.cache is not None and self.toStore:
+            try:
+                self.cache.store(self.toStore)
+            except sqlite3.Error as e:
+                self.cacheFailed.emit(e)
+        self.toStore = []
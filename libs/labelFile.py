@@ -1,15 +1,14 @@
 # Copyright (c) 2016 Tzutalin
 # Create by TzuTaLin <tzu.ta.lin@gmail.com>
 
-try:
-    from PyQt5.QtGui import QImage
-except ImportError:
-    from PyQt4.QtGui import QImage
-
 from base64 import b64encode, b64decode
+import hashlib
+import json
+from libs.imageProbe import probeImage
 from libs.pascal_voc_io import PascalVocReader
 from libs.pascal_voc_io import PascalVocWriter
 from libs.pascal_voc_io import XML_EXT
+from libs.pascal_voc_io import atomicWrite
 import os.path
 import sys
 
@@ -31,12 +30,15 @@ class LabelFile(object):
     # It might be changed as window creates
     suffix = '.xml'
 
-    def __init__(self, filename=None):
-        if filename is not None:
+    def __init__(self, filename=None, reader=None):
+        # Pass an already parsed reader to avoid parsing the xml twice.
+        if reader is None and filename is not None:
             reader = PascalVocReader(filename)
+        if reader is not None:
             self.shapes = reader.getShapes()
             self.imagePath = reader.imagePath
-            self.imageData = read(self.imagePath, None)
+            # The image itself is loaded (and cached) by the caller.
+            self.imageData = None
             self.verified = reader.verified
         else:
             self.shapes = ()
@@ -51,12 +53,9 @@ class LabelFile(object):
         imgFolderName = os.path.split(imgFolderPath)[-1]
         imgFileName = os.path.basename(imagePath)
         #imgFileNameWithoutExt = os.path.splitext(imgFileName)[0]
-        # Read from file path because self.imageData might be empty if saving to
-        # Pascal format
-        image = QImage()
-        image.load(imagePath)
-        imageShape = [image.height(), image.width(),
-                      1 if image.isGrayscale() else 3]
+        # Only the header is needed for <size>, no need to decode the image.
+        width, height, channels = probeImage(imagePath)
+        imageShape = [height, width, 1 if channels <= 2 else 3]
         writer = PascalVocWriter(imgFolderName, imgFileName,
                                  imageShape, localImgPath=imagePath)
         writer.verified = self.verified
@@ -82,8 +81,17 @@ class LabelFile(object):
         return
 
     def saveDarknetTxtFormat(self, imagePath, image, shapes, labelList):
+        shapeText = LabelFile.darknetText(image, shapes, labelList)
+        atomicWrite(LabelFile.darknetPath(imagePath), lambda f: f.write(shapeText.encode('utf-8')))
+        return
+
+    @staticmethod
+    def darknetPath(imagePath):
         imgFileNameWithoutExt = os.path.splitext(imagePath)[0]
-        annotationFilePath = imgFileNameWithoutExt + ".txt"
+        return imgFileNameWithoutExt + ".txt"
+
+    @staticmethod
+    def darknetText(image, shapes, labelList):
         shapeText = ""
         for shape in shapes:
             angle=shape['deg']/360
@@ -100,11 +108,29 @@ class LabelFile(object):
                 for item in abox:
                     shapeText += str(item)+" "
                 shapeText += str(angle) + "\n"
-        # print("Darknet annotation goes to: " + annotationFilePath)
-        f = open(annotationFilePath, 'w')
-        f.write(shapeText)
-        f.close()
-        return
+        return shapeText
+
+    @staticmethod
+    def shapesFingerprint(shapes, verified):
+        """Hash of what the Pascal VOC file records about shapes.
+
+        Labels, points, flags and angles, in order, and the verified
+        mark; colours are not saved, so they are left out.
+        """
+        canonical = [bool(verified)] + [
+            [shape['label'], [[round(x, 3), round(y, 3)] for x, y in shape['points']],
+             bool(shape['difficult']), bool(shape['tetragon']), round(shape['deg'], 3),
+             shape['shape3D']]
+            for shape in shapes]
+        text = json.dumps(canonical, default=str)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def textFingerprint(data):
+        """Hash of the bytes, or text, of a Darknet file."""
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        return hashlib.sha1(data).hexdigest()
 
     def toggleVerify(self):
         self.verified = not self.verified
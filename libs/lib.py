@@ -1,3 +1,4 @@
+import time
 from math import sqrt
 
 try:
@@ -64,6 +65,56 @@ class struct(object):
         self.__dict__.update(kwargs)
 
 
+class StageTimer(object):
+    """Record how long each named stage of a multi step operation took."""
+
+    def __init__(self):
+        self.timings = []
+        self.last = time.time()
+
+    def mark(self, stage):
+        now = time.time()
+        self.timings.append((stage, (now - self.last) * 1000.0))
+        self.last = now
+
+    def total(self):
+        return sum(ms for _, ms in self.timings)
+
+
+class LatencyCounter(object):
+    """Input latency of the canvas: from the first input event that was
+    not handled yet to the end of the frame that shows its effect.
+
+    events counts the input events received, updates the times they were
+    handled (coalesced events are handled together), frames the frames
+    sampled.  The last `size` samples, in ms, are kept for stats().
+    """
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        self.samples = []
+        self.events = 0
+        self.updates = 0
+        self.frames = 0
+
+    def record(self, ms):
+        self.frames += 1
+        self.samples.append(ms)
+        if len(self.samples) > self.size:
+            del self.samples[0]
+
+    def stats(self):
+        samples = sorted(self.samples)
+        count = len(samples)
+        return dict(events=self.events, updates=self.updates, frames=self.frames,
+                    mean=sum(samples) / count if count else 0.0,
+                    p95=samples[min(count - 1, int(count * 0.95))] if count else 0.0,
+                    max=samples[-1] if count else 0.0)
+
+
 def distance(p):
     return sqrt(p.x() * p.x() + p.y() * p.y())
 
@@ -4,20 +4,90 @@ import sys
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element, SubElement
 from lxml import etree
-import codecs
-from libs.canvas import Canvas
-from libs.shape import Shape
-# from libs.lib import distance
-try:
-    from PyQt5.QtGui import *
-    from PyQt5.QtCore import *
-    from PyQt5.QtWidgets import *
-except ImportError:
-    from PyQt4.QtGui import *
-    from PyQt4.QtCore import *
+import math
+import os
+import re
+import stat
+import tempfile
+from collections import namedtuple
 
 XML_EXT = '.xml'
 ENCODE_METHOD = 'utf-8'
+TETRAGON_KEYS = ['k%d%s' % (i, axis) for i in range(4) for axis in 'xy']
+SHAPE3D_KEYS = ['k%d%s' % (i, axis) for i in range(8) for axis in 'xy']
+
+
+# mkstemp creates files readable by the owner only; a new annotation gets
+# these permissions instead and a rewritten one keeps its own.
+FILE_MODE = 0o644
+
+
+# Characters outside the XML Char production; no parser reads them back.
+INVALID_XML_CHARS = re.compile(u'[^\u0009\u000a\u000d\u0020-\ud7ff\ue000-\ufffd'
+                               u'\U00010000-\U0010ffff]')
+
+
+def xmlEscape(text):
+    invalid = INVALID_XML_CHARS.search(text)
+    if invalid:
+        raise ValueError(u'Character %r cannot be saved in XML: %r' % (invalid.group(), text))
+    # The parser in prettify() normalizes line ends, so a bare CR becomes LF.
+    return text.replace(u'&', u'&amp;').replace(u'<', u'&lt;') \
+        .replace(u'>', u'&gt;').replace(u'\r\n', u'\n').replace(u'\r', u'\n')
+
+
+def xmlElement(depth, tag, text):
+    """One indented leaf element, as prettify() would print it."""
+    indent = u'\t' * depth
+    if not text:
+        return u'%s<%s/>' % (indent, tag)
+    # prettify() turns every double space into a tab, text included.
+    return u'%s<%s>%s</%s>' % (indent, tag, xmlEscape(text).replace(u'  ', u'\t'), tag)
+
+
+def rotatePoint(cx, cy, x, y, angle):
+    """Shape.rotatePoint on plain numbers, so this module needs no Qt."""
+    radians = (math.pi / 180) * angle
+    cos = math.cos(radians)
+    sin = math.sin(radians)
+    return ((cos * (x - cx)) + (sin * (y - cy)) + cx,
+            (cos * (y - cy)) - (sin * (x - cx)) + cy)
+
+
+# One annotated object, in the order MainWindow.loadLabels unpacks it.
+ShapeRecord = namedtuple('ShapeRecord', ['label', 'points', 'line_color', 'fill_color',
+                                         'difficult', 'tetragon', 'angle', 'shape3D'])
+
+
+def replaceFile(src, dst):
+    try:
+        os.replace(src, dst)
+    except AttributeError:
+        # Python 2: rename cannot overwrite an existing file on Windows.
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+def atomicWrite(targetFile, write):
+    """Call write(file) on a temporary file next to targetFile, then rename
+    it over targetFile, so that a crash or a concurrent reader never sees a
+    half-written annotation."""
+    folder = os.path.dirname(os.path.abspath(targetFile))
+    suffix = os.path.splitext(targetFile)[1] + '.tmp'
+    try:
+        mode = stat.S_IMODE(os.stat(targetFile).st_mode)
+    except OSError:
+        mode = FILE_MODE
+    fd, tmpPath = tempfile.mkstemp(prefix='.', suffix=suffix, dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as out_file:
+            write(out_file)
+        os.chmod(tmpPath, mode)
+        replaceFile(tmpPath, targetFile)
+    except:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
 
 class PascalVocWriter:
 
@@ -85,15 +155,12 @@ class PascalVocWriter:
         return top
 
     def rotateBackPoints(self, xmin, ymin, xmax, ymax, angle):
-        center=QPointF((xmin+xmax)/2,(ymin+ymax)/2)
+        cx, cy = (xmin+xmax)/2, (ymin+ymax)/2
+        k0=rotatePoint(cx, cy, xmin, ymin, -angle)
+        k2=rotatePoint(cx, cy, xmax, ymax, -angle)
+        return [(int(x), int(y)) for x, y in (k0, k2)]
 
-        k0=Shape.rotatePoint(self,center,QPointF(xmin,ymin),-angle)
-        k2=Shape.rotatePoint(self,center,QPointF(xmax,ymax),-angle)
-        rotatedPoints=[k0,k2]
-        points= [(int(point.x()),int(point.y())) for point in rotatedPoints]
-        return points
-
-    def addBndBox(self, xmin, ymin, xmax, ymax, name, difficult, tetragon, angle):
+    def addBndBox(self, xmin, ymin, xmax, ymax, name, difficult, tetragon=False, angle=0):
         if angle==0 or angle==360:
             bndbox = {'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax}
         else:
@@ -143,116 +210,122 @@ class PascalVocWriter:
         self.boxlist.append(bndbox)
 
 
+    def objectFields(self, each_object):
+        """
+            Return the (tag, text) pairs of an object and of its bndbox,
+            in document order
+        """
+        try:
+            name = unicode(each_object['name'])
+        except NameError:
+            # Py3: NameError: name 'unicode' is not defined
+            name = each_object['name']
+        truncated = "0"
+        if each_object["shape3D"]==False and each_object["tetragon"]==False:
+            if int(each_object['ymax']) == int(self.imgSize[0]) or (int(each_object['ymin'])== 1):
+                truncated = "1" # max == height or min
+            elif (int(each_object['xmax'])==int(self.imgSize[1])) or (int(each_object['xmin'])== 1):
+                truncated = "1" # max == width or min
+        fields = [('name', name),
+                  ('pose', "Unspecified"),
+                  ('truncated', truncated),
+                  ('difficult', str( bool(each_object['difficult']) & 1 )),
+                  ('tetragon', str(each_object['tetragon'])),
+                  ('shape3D', str(each_object['shape3D'])),
+                  ('angle', str(each_object['angle']))]
+        if each_object["shape3D"]==False:
+            if each_object['tetragon']==False:
+                bndbox = [(key, str(each_object[key])) for key in ('xmin', 'ymin', 'xmax', 'ymax')]
+            elif each_object['tetragon']==True:
+                bndbox = [(key, str(int(round(each_object[key],0)))) for key in TETRAGON_KEYS]
+            else:
+                bndbox = []
+        else:
+            bndbox = [(key, str(each_object[key])) for key in SHAPE3D_KEYS]
+        return fields, bndbox
+
     def appendObjects(self, top):
         for each_object in self.boxlist:
             object_item = SubElement(top, 'object')
-            name = SubElement(object_item, 'name')
-            try:
-                name.text = unicode(each_object['name'])
-            except NameError:
-                # Py3: NameError: name 'unicode' is not defined
-                name.text = each_object['name']
-            pose = SubElement(object_item, 'pose')
-            pose.text = "Unspecified"
-            truncated = SubElement(object_item, 'truncated')
-            if each_object["shape3D"]==False and each_object["tetragon"]==False:
-                if int(each_object['ymax']) == int(self.imgSize[0]) or (int(each_object['ymin'])== 1):
-                    truncated.text = "1" # max == height or min
-                elif (int(each_object['xmax'])==int(self.imgSize[1])) or (int(each_object['xmin'])== 1):
-                    truncated.text = "1" # max == width or min
-                else:
-                    truncated.text = "0"
-            else:
-                truncated.text = "0"
-            difficult = SubElement(object_item, 'difficult')
-            difficult.text = str( bool(each_object['difficult']) & 1 )
-
-            tetragon= SubElement(object_item, 'tetragon')
-            tetragon.text=str(each_object['tetragon'])
-
-            shape3D= SubElement(object_item, 'shape3D')
-            shape3D.text=str(each_object['shape3D'])
-
-            angle= SubElement(object_item, 'angle')
-            angle.text=str(each_object['angle'])
+            fields, box = self.objectFields(each_object)
+            for tag, text in fields:
+                SubElement(object_item, tag).text = text
             bndbox = SubElement(object_item, 'bndbox')
-            if each_object["shape3D"]==False:
-                if each_object['tetragon']==False:
-                    xmin = SubElement(bndbox, 'xmin')
-                    xmin.text = str(each_object['xmin'])
-                    ymin = SubElement(bndbox, 'ymin')
-                    ymin.text = str(each_object['ymin'])
-                    xmax = SubElement(bndbox, 'xmax')
-                    xmax.text = str(each_object['xmax'])
-                    ymax = SubElement(bndbox, 'ymax')
-                    ymax.text = str(each_object['ymax'])
-                elif each_object['tetragon']==True:
-                    k0x = SubElement(bndbox, 'k0x')
-                    k0x.text = str(int(round(each_object['k0x'],0)))
-                    k0y = SubElement(bndbox, 'k0y')
-                    k0y.text = str(int(round(each_object['k0y'],0)))
-                    k1x = SubElement(bndbox, 'k1x')
-                    k1x.text = str(int(round(each_object['k1x'],0)))
-                    k1y = SubElement(bndbox, 'k1y')
-                    k1y.text = str(int(round(each_object['k1y'],0)))
-                    k2x = SubElement(bndbox, 'k2x')
-                    k2x.text = str(int(round(each_object['k2x'],0)))
-                    k2y = SubElement(bndbox, 'k2y')
-                    k2y.text = str(int(round(each_object['k2y'],0)))
-                    k3x = SubElement(bndbox, 'k3x')
-                    k3x.text = str(int(round(each_object['k3x'],0)))
-                    k3y = SubElement(bndbox, 'k3y')
-                    k3y.text = str(int(round(each_object['k3y'],0)))
-            elif each_object["shape3D"]:
-                k0x = SubElement(bndbox, 'k0x')
-                k0x.text = str(each_object['k0x'])
-                k0y = SubElement(bndbox, 'k0y')
-                k0y.text = str(each_object['k0y'])
-                k1x = SubElement(bndbox, 'k1x')
-                k1x.text = str(each_object['k1x'])
-                k1y = SubElement(bndbox, 'k1y')
-                k1y.text = str(each_object['k1y'])
-                k2x = SubElement(bndbox, 'k2x')
-                k2x.text = str(each_object['k2x'])
-                k2y = SubElement(bndbox, 'k2y')
-                k2y.text = str(each_object['k2y'])
-                k3x = SubElement(bndbox, 'k3x')
-                k3x.text = str(each_object['k3x'])
-                k3y = SubElement(bndbox, 'k3y')
-                k3y.text = str(each_object['k3y'])
-                k4x = SubElement(bndbox, 'k4x')
-                k4x.text = str(each_object['k4x'])
-                k4y = SubElement(bndbox, 'k4y')
-                k4y.text = str(each_object['k4y'])
-                k5x = SubElement(bndbox, 'k5x')
-                k5x.text = str(each_object['k5x'])
-                k5y = SubElement(bndbox, 'k5y')
-                k5y.text = str(each_object['k5y'])
-                k6x = SubElement(bndbox, 'k6x')
-                k6x.text = str(each_object['k6x'])
-                k6y = SubElement(bndbox, 'k6y')
-                k6y.text = str(each_object['k6y'])
-                k7x = SubElement(bndbox, 'k7x')
-                k7x.text = str(each_object['k7x'])
-                k7y = SubElement(bndbox, 'k7y')
-                k7y.text = str(each_object['k7y'])
+            for tag, text in box:
+                SubElement(bndbox, tag).text = text
 
+    def headerFields(self):
+        fields = [(1, 'folder', self.foldername), (1, 'filename', self.filename)]
+        if self.localImgPath is not None:
+            fields.append((1, 'path', self.localImgPath))
+        if len(self.imgSize) == 3:
+            depth = str(self.imgSize[2])
+        else:
+            depth = '1'
+        fields += [(1, 'source', None),
+                   (2, 'database', self.databaseSrc),
+                   (-1, 'source', None),
+                   (1, 'size', None),
+                   (2, 'width', str(self.imgSize[1])),
+                   (2, 'height', str(self.imgSize[0])),
+                   (2, 'depth', depth),
+                   (-1, 'size', None),
+                   (1, 'segmented', '0')]
+        return fields
+
+    def serialize(self, out):
+        """
+            Write the annotation to the binary stream out, producing the
+            same bytes as prettify(genXML() + appendObjects()) but without
+            building, serializing and re-parsing a tree
+        """
+        if self.filename is None or \
+                self.foldername is None or \
+                self.imgSize is None:
+            return False
+        write = out.write
+        if self.verified:
+            write(b'<annotation verified="yes">\n')
+        else:
+            write(b'<annotation>\n')
+        lines = []
+        for depth, tag, text in self.headerFields():
+            if depth < 0:
+                lines.append(u'\t</%s>' % tag)
+            elif text is None:
+                lines.append(u'\t<%s>' % tag)
+            else:
+                lines.append(xmlElement(depth, tag, text))
+        write((u'\n'.join(lines) + u'\n').encode(ENCODE_METHOD))
+        for each_object in self.boxlist:
+            fields, box = self.objectFields(each_object)
+            lines = [u'\t<object>']
+            lines.extend(xmlElement(2, tag, text) for tag, text in fields)
+            if box:
+                lines.append(u'\t\t<bndbox>')
+                lines.extend(xmlElement(3, tag, text) for tag, text in box)
+                lines.append(u'\t\t</bndbox>')
+            else:
+                lines.append(u'\t\t<bndbox/>')
+            lines.append(u'\t</object>\n')
+            write(u'\n'.join(lines).encode(ENCODE_METHOD))
+        write(b'</annotation>\n')
+        return True
 
     def save(self, targetFile=None):
-        root = self.genXML()
-        self.appendObjects(root)
-        out_file = None
         if targetFile is None:
-            out_file = codecs.open(self.filename + XML_EXT, 'w', encoding=ENCODE_METHOD)
-        else:
-            out_file = codecs.open(targetFile, 'w', encoding=ENCODE_METHOD)
-        prettifyResult = self.prettify(root)
-        out_file.write(prettifyResult.decode('utf8'))
-        out_file.close()
+            targetFile = self.filename + XML_EXT
+        atomicWrite(targetFile, self.serialize)
 
 
 
 class PascalVocReader:
+    """Read a VOC annotation into ShapeRecords.
+
+    The file is parsed in a single pass over the children of each element
+    and rotated boxes are turned back with plain math, so a reader needs
+    neither Qt nor a QApplication and can run on worker threads.
+    """
 
     def __init__(self, filepath):
         self.shapes = []
@@ -265,105 +338,80 @@ class PascalVocReader:
         return self.shapes
 
     def makeBackRotatedShape(self, points, angle):
-        canvas=Canvas()
-        shape=Shape()
         xmax=points[2][0]
         xmin=points[0][0]
         ymax=points[2][1]
         ymin=points[0][1]
-
-        shape.centerPoint=QPointF(( xmin+xmax)/2,(ymin+ymax)/2)
-        shape.points= [QPointF(point[0],point[1]) for point in points]
-        rotatedShapePoints=canvas.getRotatedShape(shape,angle)
-        points= [(round(point.x(),0),round(point.y(),0)) for point in rotatedShapePoints]
-
-        return points
+        cx, cy = (xmin+xmax)/2, (ymin+ymax)/2
+        rotated = [rotatePoint(cx, cy, x, y, angle) for x, y in points]
+        return [(round(x, 0), round(y, 0)) for x, y in rotated]
 
     def addShape(self, label, bndbox, difficult, angle):
         if angle==360:
             angle=0
-        xmin = int(bndbox.find('xmin').text)
-        ymin = int(bndbox.find('ymin').text)
-        xmax = int(bndbox.find('xmax').text)
-        ymax = int(bndbox.find('ymax').text)
+        xmin = int(bndbox['xmin'])
+        ymin = int(bndbox['ymin'])
+        xmax = int(bndbox['xmax'])
+        ymax = int(bndbox['ymax'])
         points = [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)]
-        tetragon=False
         if angle>0:
             points=self.makeBackRotatedShape(points, angle)
-            # print(points)
-        self.shapes.append((label, points, None, None, difficult, tetragon, angle,False))
-
-    def addShape2(self,label, bndbox, difficult, angle):
-        k0x = int(bndbox.find('k0x').text)
-        k0y = int(bndbox.find('k0y').text)
-        k1x = int(bndbox.find('k1x').text)
-        k1y = int(bndbox.find('k1y').text)
-        k2x = int(bndbox.find('k2x').text)
-        k2y = int(bndbox.find('k2y').text)
-        k3x = int(bndbox.find('k3x').text)
-        k3y = int(bndbox.find('k3y').text)
-        points=[(k0x,k0y),(k1x,k1y),(k2x,k2y),(k3x,k3y)]
-        tetragon=True
-        self.shapes.append((label, points, None, None, difficult, tetragon, angle,False))
-        # print(self.shapes)
+        self.shapes.append(ShapeRecord(label, points, None, None, difficult, False, angle, False))
+
+    def addShape2(self, label, bndbox, difficult, angle):
+        points = self.keyPoints(bndbox, 4)
+        self.shapes.append(ShapeRecord(label, points, None, None, difficult, True, angle, False))
 
     def addShape3(self, label, bndbox, difficult, angle):
-        # print("kolkas veikia iki tiek")
-        points=[]
-        numberOfPoints,i=8,0
-        shape3D=True
-        while numberOfPoints>i:
-            k="k"+format(i)
-            x=int(bndbox.find(k +'x').text)
-            y=int(bndbox.find(k +'y').text)
-            points.append((x,y))
-            i+=1
-        self.shapes.append((label, points, None, None, difficult,False, angle, shape3D))
+        points = self.keyPoints(bndbox, 8)
+        self.shapes.append(ShapeRecord(label, points, None, None, difficult, False, angle, True))
+
+    def keyPoints(self, bndbox, count):
+        return [(int(bndbox['k%dx' % i]), int(bndbox['k%dy' % i])) for i in range(count)]
 
     def parseXML(self):
         assert self.filepath.endswith(XML_EXT), "Unsupport file format"
         parser = etree.XMLParser(encoding=ENCODE_METHOD)
-        xmltree = ElementTree.parse(self.filepath, parser=parser).getroot()
-        filename = xmltree.find('filename').text
-        self.imagePath = xmltree.find('path').text
-        try:
-            verified = xmltree.attrib['verified']
-            if verified == 'yes':
-                self.verified = True
-        except KeyError:
-            self.verified = False
-
-        for object_iter in xmltree.findall('object'):
-            bndbox = object_iter.find("bndbox")
-            label = object_iter.find('name').text
-            try:
-                tetragon=self.trueFalse(object_iter.find('tetragon').text)
-            except:
-                tetragon=False
-            difficult = False
-            try:
-                angle=int(object_iter.find('angle').text)
-            except:
-                angle=0
-            try:
-                shape3D=self.trueFalse(object_iter.find('shape3D').text)
-            except:
-                shape3D=False
-            if object_iter.find('difficult') is not None:
-                difficult = bool(int(object_iter.find('difficult').text))
-            if tetragon and shape3D==False:
-                # print("keturkampis")
-                self.addShape2(label, bndbox, difficult, angle)
-            elif shape3D:
-                # print("3d figura")
-                self.addShape3(label, bndbox, difficult, angle)
-            elif tetragon==False and shape3D==False:
-                # print("paprasta figura")
-                self.addShape(label, bndbox, difficult, angle)
-            else:
-                print("bad shape upload")
+        xmltree = etree.parse(self.filepath, parser=parser).getroot()
+        self.verified = xmltree.get('verified') == 'yes'
+        for child in xmltree:
+            if child.tag == 'object':
+                self.parseObject(child)
+            elif child.tag == 'path':
+                self.imagePath = child.text
         return True
 
+    def parseObject(self, object_iter):
+        label = None
+        difficult = False
+        tetragon = False
+        shape3D = False
+        angle = 0
+        bndbox = {}
+        for child in object_iter:
+            tag = child.tag
+            if tag == 'bndbox':
+                bndbox = dict((point.tag, point.text) for point in child)
+            elif tag == 'name':
+                label = child.text
+            elif tag == 'difficult':
+                difficult = bool(int(child.text))
+            elif tag == 'tetragon':
+                tetragon = self.trueFalse(child.text)
+            elif tag == 'shape3D':
+                shape3D = self.trueFalse(child.text)
+            elif tag == 'angle':
+                try:
+                    angle = int(child.text)
+                except (TypeError, ValueError):
+                    angle = 0
+        if shape3D:
+            self.addShape3(label, bndbox, difficult, angle)
+        elif tetragon:
+            self.addShape2(label, bndbox, difficult, angle)
+        else:
+            self.addShape(label, bndbox, difficult, angle)
+
     def trueFalse(self,stri):
         if stri=="True" or stri==True:
             return (True)
@@ -0,0 +1,153 @@
+import os.path
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.imageCache import fileIdentity
+from libs.labelFile import read
+from libs.pascal_voc_io import PascalVocReader
+from libs.pascal_voc_io import XML_EXT
+from libs.tiledImage import isTileable
+
+PREFETCH_FORWARD, PREFETCH_BACKWARD, PREFETCH_BOTH = range(3)
+
+
+def annotationPathFor(imagePath, saveDir=None):
+    """Return the VOC xml path loadFile would use for imagePath."""
+    if saveDir is not None:
+        basename = os.path.basename(os.path.splitext(imagePath)[0]) + XML_EXT
+        return os.path.join(saveDir, basename)
+    return os.path.splitext(imagePath)[0] + XML_EXT
+
+
+class PrefetchRecord(object):
+
+    def __init__(self, path, identity, imageData, image, reader=None):
+        self.path = path
+        self.identity = identity
+        self.imageData = imageData
+        self.image = image
+        self.reader = reader
+
+
+class PrefetchSignals(QObject):
+    # QRunnable is not a QObject, so the workers report through this.
+    finished = pyqtSignal(int, object)
+
+
+class PrefetchTask(QRunnable):
+
+    def __init__(self, prefetcher, generation, path, xmlPath):
+        super(PrefetchTask, self).__init__()
+        self.prefetcher = prefetcher
+        self.generation = generation
+        self.path = path
+        self.xmlPath = xmlPath
+
+    def stale(self):
+        return self.generation != self.prefetcher.generation
+
+    def run(self):
+        if self.stale():
+            return
+        identity = imageData = image = None
+        # Tiled images are never decoded whole, only their annotation helps.
+        if self.prefetcher.cache.peek(self.path) is None and not isTileable(self.path):
+            identity = fileIdentity(self.path)
+            imageData = read(self.path, None)
+            if imageData is None or self.stale():
+                return
+            image = QImage.fromData(imageData)
+            if image.isNull() or self.stale():
+                return
+        reader = None
+        if self.xmlPath and os.path.isfile(self.xmlPath):
+            try:
+                reader = PascalVocReader(self.xmlPath)
+            except Exception:
+                reader = None
+        record = PrefetchRecord(self.path, identity, imageData, image, reader)
+        self.prefetcher.signals.finished.emit(self.generation, record)
+
+
+class ImagePrefetcher(QObject):
+    """Decode the neighbours of the current image on a worker pool.
+
+    After every load, call prefetch() with the file list and the index of
+    the current image; the next/previous `depth` entries are read and decoded into the
+    shared ImageCache and have their annotation parsed in the background,
+    so that navigating to them is a cache hit.  cancel() drops everything
+    queued or in flight.
+    """
+
+    def __init__(self, cache, depth=2, direction=PREFETCH_BOTH, maxThreads=2, parent=None):
+        super(ImagePrefetcher, self).__init__(parent)
+        self.cache = cache
+        self.depth = depth
+        self.direction = direction
+        self.generation = 0
+        self.readers = {}
+        self.pending = set()
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(maxThreads)
+        self.signals = PrefetchSignals()
+        self.signals.finished.connect(self.onFinished)
+
+    def neighbours(self, imgList, index):
+        forward = [index + i for i in range(1, self.depth + 1)]
+        backward = [index - i for i in range(1, self.depth + 1)]
+        if self.direction == PREFETCH_FORWARD:
+            order = forward
+        elif self.direction == PREFETCH_BACKWARD:
+            order = backward
+        else:
+            # Interleave so the closest images in both directions come first.
+            order = [i for pair in zip(forward, backward) for i in pair]
+        return [imgList[i] for i in order if 0 <= i < len(imgList)]
+
+    def prefetch(self, imgList, index, saveDir=None):
+        if self.depth <= 0 or not 0 <= index < len(imgList):
+            return
+        self.cancel()
+        wanted = self.neighbours(imgList, index)
+        # Keep the annotations still in the window, forget the rest.  Images
+        # stay in the cache until its own LRU policy evicts them.
+        self.readers = dict((path, reader) for path, reader in self.readers.items()
+                            if path in wanted)
+        for path in wanted:
+            if path in self.readers and path in self.cache:
+                continue
+            self.pending.add(path)
+            task = PrefetchTask(self, self.generation, path,
+                                annotationPathFor(path, saveDir))
+            self.pool.start(task)
+
+    def cancel(self):
+        # Running tasks notice the new generation and abandon their work,
+        # queued ones return as soon as they are picked up.
+        self.generation += 1
+        self.pending.clear()
+
+    def takeReader(self, path, xmlPath):
+        """Return the prefetched annotation reader for path, or None."""
+        reader = self.readers.pop(path, None)
+        if reader is not None and reader.filepath != xmlPath:
+            return None
+        return reader
+
+    def clear(self):
+        self.cancel()
+        self.readers.clear()
+
+    def onFinished(self, generation, record):
+        if generation != self.generation:
+            return
+        self.pending.discard(record.path)
+        if record.image is not None:
+            self.cache.put(record.path, record.imageData, record.image, record.identity)
+        if record.reader is not None:
+            self.readers[record.path] = record.reader
@@ -0,0 +1,193 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+try:
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtCore import *
+
+from libs.labelFile import LabelFile
+from libs.pascal_voc_io import atomicWrite
+
+# Writes start this long after the first save queued since the last
+# ones started, so they do not compete with loading the next image.
+WRITE_DELAY_MS = 250
+
+# Everything a save needs, copied out of the window when it is queued:
+# shapes are the dicts of MainWindow.saveLabels with their points as
+# tuples, darknetText the contents of the Darknet file.  shapes is None
+# when the Pascal VOC file is unchanged and darknetText None when the
+# Darknet one is; that file is then not written.  journalSeq is the last
+# EditJournal record the shapes include.
+SaveRecord = namedtuple('SaveRecord', ['annotationPath', 'imagePath', 'shapes', 'verified',
+                                       'darknetText', 'lineColor', 'fillColor', 'journalSeq'])
+
+
+def writeRecord(record):
+    if record.shapes is not None:
+        labelFile = LabelFile()
+        labelFile.verified = record.verified
+        labelFile.savePascalVocFormat(record.annotationPath, list(record.shapes),
+                                      record.imagePath, None, record.lineColor, record.fillColor)
+    if record.darknetText is not None:
+        data = record.darknetText.encode('utf-8')
+        atomicWrite(LabelFile.darknetPath(record.imagePath), lambda f: f.write(data))
+
+
+class SaveSignals(QObject):
+    saved = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class SaveTask(QRunnable):
+
+    def __init__(self, queue, path):
+        super(SaveTask, self).__init__()
+        self.queue = queue
+        self.path = path
+
+    def run(self):
+        queue = self.queue
+        with queue.lock:
+            # Saves queued for this path while this task waited replaced
+            # the record; only the last one is written.
+            record = queue.pending.pop(self.path)
+            queue.started.discard(self.path)
+        try:
+            writeRecord(record)
+        except Exception as e:
+            # Nothing would see an exception escaping a QRunnable.
+            failure = (record, e)
+            with queue.lock:
+                if self.path not in queue.pending:
+                    queue.queued.discard(self.path)
+                queue.failures.append(failure)
+            queue.signals.failed.emit(failure)
+            return
+        with queue.lock:
+            if self.path not in queue.pending:
+                queue.queued.discard(self.path)
+            queue.written.add(self.path)
+            queue.writes += 1
+            queue.xmlWrites += record.shapes is not None
+            queue.darknetWrites += record.darknetText is not None
+        queue.signals.saved.emit(record)
+
+
+class SaveQueue(QObject):
+    """Write annotations on a background thread, in the order queued.
+
+    submit() takes a SaveRecord and returns at once; writing starts
+    writeDelay ms later, once the image being opened has loaded.  A
+    record queued for an annotation that is still waiting to be written
+    replaces the waiting one, so each file is written once however often
+    it was saved meanwhile.  A record that leaves both files unchanged
+    is only counted.  Files are written to a temporary file and renamed
+    into place.  saved (the record) and failed (the record and the
+    exception) report each write in the GUI thread; flush() blocks until
+    everything queued is on disk and returns the failures failed has not
+    reported yet, as (record, exception) pairs.
+    """
+
+    saved = pyqtSignal(object)
+    failed = pyqtSignal(object, object)
+
+    def __init__(self, parent=None, writeDelay=WRITE_DELAY_MS):
+        super(SaveQueue, self).__init__(parent)
+        self.lock = threading.Lock()
+        # annotation path -> the record to write, until its task takes it
+        self.pending = OrderedDict()
+        # pending paths whose task has been handed to the pool
+        self.started = set()
+        # paths waiting or being written
+        self.queued = set()
+        # paths written since takeWritten() last asked about them
+        self.written = set()
+        self.failures = []
+        self.submits = 0
+        self.coalesced = 0
+        self.writes = 0
+        self.xmlWrites = 0
+        self.darknetWrites = 0
+        self.xmlSkipped = 0
+        self.darknetSkipped = 0
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = SaveSignals()
+        self.signals.saved.connect(self.saved)
+        self.signals.failed.connect(self.onFailed)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(writeDelay)
+        self.timer.timeout.connect(self.startWrites)
+
+    def submit(self, record):
+        path = record.annotationPath
+        with self.lock:
+            self.submits += 1
+            self.xmlSkipped += record.shapes is None
+            self.darknetSkipped += record.darknetText is None
+            if record.shapes is None and record.darknetText is None:
+                return
+            waiting = self.pending.get(path)
+            if waiting is not None:
+                self.coalesced += 1
+                # A file this record leaves alone may still need the
+                # waiting record's version written.
+                if record.shapes is None:
+                    record = record._replace(shapes=waiting.shapes, verified=waiting.verified)
+                if record.darknetText is None:
+                    record = record._replace(darknetText=waiting.darknetText)
+            self.pending[path] = record
+            self.queued.add(path)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def startWrites(self):
+        self.timer.stop()
+        with self.lock:
+            paths = [path for path in self.pending if path not in self.started]
+            self.started.update(paths)
+        for path in paths:
+            self.pool.start(SaveTask(self, path))
+
+    def isQueued(self, path):
+        with self.lock:
+            return path in self.queued
+
+    def busy(self):
+        with self.lock:
+            return bool(self.queued)
+
+    def takeWritten(self, path):
+        """Whether path was written since the last call for it."""
+        with self.lock:
+            if path in self.written:
+                self.written.discard(path)
+                return True
+            return False
+
+    def flush(self):
+        self.startWrites()
+        self.pool.waitForDone()
+        with self.lock:
+            failures, self.failures = self.failures, []
+        # Report what was saved before returning; the failures taken
+        # above are not reported again.
+        QCoreApplication.sendPostedEvents(self, QEvent.MetaCall)
+        return failures
+
+    def onFailed(self, failure):
+        with self.lock:
+            if not any(f is failure for f in self.failures):
+                # Already returned by flush().
+                return
+            self.failures = [f for f in self.failures if f is not failure]
+        self.failed.emit(*failure)
+
+    def stats(self):
+        with self.lock:
+            return {'submits': self.submits, 'writes': self.writes,
+                    'coalesced': self.coalesced, 'queued': len(self.queued),
+                    'xmlWrites': self.xmlWrites, 'darknetWrites': self.darknetWrites,
+                    'xmlSkipped': self.xmlSkipped, 'darknetSkipped': self.darknetSkipped}
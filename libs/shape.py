@@ -1,7 +1,6 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 import math
-from scipy.spatial import ConvexHull
 
 try:
     from PyQt5.QtGui import *
@@ -11,6 +10,7 @@ except ImportError:
     from PyQt4.QtCore import *
 
 from libs.lib import distance
+from libs.geometry import rotatePoints, convexHull
 
 DEFAULT_LINE_COLOR = QColor(0, 255, 0, 128)
 DEFAULT_FILL_COLOR = QColor(255, 0, 0, 128)
@@ -36,9 +36,15 @@ class Shape(object):
     point_type = P_ROUND
     point_size = 6
     scale = 1.0
+    # How far above the shape the rotation handle is drawn.
+    rotation_handle_distance = 50
 
     def __init__(self, label=None, line_color=None,difficult = False):
         self.label = label
+        self._perimeter = None
+        # Called with the shape whenever its points change; the canvas
+        # uses it to keep its ShapeIndex current.
+        self.onChange = None
         self.points = []
         self.fill = False
         self.selected = False
@@ -65,6 +71,21 @@ class Shape(object):
             self.line_color = line_color
 
 
+    @property
+    def points(self):
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        self._points = points
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget the cached perimeter after changing points in place."""
+        self._perimeter = None
+        if self.onChange is not None:
+            self.onChange(self)
+
     def close(self):
         self._closed = True
 
@@ -78,10 +99,13 @@ class Shape(object):
             self.close()
         else:
             self.points.append(point)
+            self.invalidate()
 
     def popPoint(self):
         if self.points:
-            return self.points.pop()
+            point = self.points.pop()
+            self.invalidate()
+            return point
         return None
 
     def isClosed(self):
@@ -91,9 +115,9 @@ class Shape(object):
         self._closed = False
 
     def tetragonRotationPoint(self):
-        pixelsGoUp=50
+        pixelsGoUp=self.rotation_handle_distance
         cpp=self.centerPointPosition()
-        psiaudoPoints=[self.rotatePoint(cpp,point,-self.deg) for point in self.points]
+        psiaudoPoints=rotatePoints(self.points, cpp, -self.deg)
         minY=min([point.y() for point in psiaudoPoints])- pixelsGoUp
         zeroAnglePoint=QPointF(cpp.x(),minY)
         return self.rotatePoint(cpp,zeroAnglePoint,self.deg)
@@ -223,6 +247,10 @@ class Shape(object):
                 return i
         return None
     def overRotationPoint(self,point,epsilon):
+        # Set when the shape is painted; regions of the canvas are painted
+        # on their own, so a shape may not have been yet.
+        if self.rotationPoint is None:
+            return False
         if distance(self.rotationPoint - point) <= epsilon:
             return True
         return False
@@ -231,16 +259,23 @@ class Shape(object):
         return self.makePerimeter().contains(point)
 
     def boundingRect(self):
-        return self.makePerimeter().boundingRect()
+        self.makePerimeter()
+        return self._perimeter[1]
 
     def makePerimeter(self):# makes perimeter points
-        points=[[point.x(), point.y()] for point in self.points]
-        hull = ConvexHull(points)
-        perimeterIndex=hull._vertices
-        path = QPainterPath(self.points[perimeterIndex[0]])
-        for p in perimeterIndex[1:]:
-            path.lineTo(self.points[p])
-        return path
+        # Hovering asks every shape for this on every mouse move, so the
+        # path and its bounding rect are kept until the points change.
+        if self._perimeter is None:
+            if not self.points:
+                path = QPainterPath()
+                self._perimeter = (path, path.boundingRect())
+                return path
+            perimeterIndex = convexHull([(point.x(), point.y()) for point in self.points])
+            path = QPainterPath(self.points[perimeterIndex[0]])
+            for p in perimeterIndex[1:]:
+                path.lineTo(self.points[p])
+            self._perimeter = (path, path.boundingRect())
+        return self._perimeter[0]
 
 
     def moveBy(self, offset):
@@ -248,6 +283,7 @@ class Shape(object):
 
     def moveVertexBy(self, i, offset):
         self.points[i] = self.points[i] + offset
+        self.invalidate()
 
 
     def highlightVertex(self, i, action):
@@ -279,3 +315,4 @@ class Shape(object):
 
     def __setitem__(self, key, value):
         self.points[key] = value
+        self.invalidate()
@@ -0,0 +1,166 @@
+import math
+
+CELL_SIZE = 128
+# Shapes covering more cells than this are kept in one list that every
+# lookup checks, instead of being copied into hundreds of cells.
+MAX_CELLS = 256
+
+
+class ShapeIndex(object):
+    """Uniform grid over the extents of the canvas shapes, for hit-testing.
+
+    A shape's extent is the bounding box of its vertices and its rotation
+    handle, grown by margin, so every shape that can react to the cursor
+    at some position (near a vertex, over the rotation handle or inside
+    the shape) has that position inside its extent.  candidates() returns
+    just those shapes, topmost first: shapes keep the z order in which
+    they were added.
+
+    The index registers itself as the shapes' onChange callback; shapes
+    whose points changed are re-indexed on the next lookup, and are passed
+    on to listener if one is given.  revision counts the shapes added and
+    removed.
+    """
+
+    def __init__(self, margin=0.0, cellSize=CELL_SIZE, listener=None):
+        self.margin = margin
+        self.listener = listener
+        self.revision = 0
+        self.cellSize = float(cellSize)
+        self.cells = {}
+        self.large = set()
+        # shape -> (z, extent, cells or None for large shapes)
+        self.entries = {}
+        self.dirty = set()
+        self.counter = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, shape):
+        return shape in self.entries
+
+    def rebuild(self, shapes):
+        self.clear()
+        for shape in shapes:
+            self.add(shape)
+
+    def clear(self):
+        for shape in self.entries:
+            shape.onChange = None
+        self.cells = {}
+        self.large = set()
+        self.entries = {}
+        self.dirty = set()
+        self.counter = 0
+        self.revision += 1
+
+    def add(self, shape):
+        """Index shape on top of all the shapes added before it."""
+        if shape in self.entries:
+            self.remove(shape)
+        shape.onChange = self.markDirty
+        self.place(shape, self.counter)
+        self.counter += 1
+        self.revision += 1
+
+    def remove(self, shape):
+        if shape not in self.entries:
+            return
+        self.unplace(shape)
+        self.dirty.discard(shape)
+        shape.onChange = None
+        self.revision += 1
+
+    def markDirty(self, shape):
+        self.dirty.add(shape)
+        if self.listener is not None:
+            self.listener(shape)
+
+    def refresh(self):
+        for shape in self.dirty:
+            if shape in self.entries:
+                z = self.entries[shape][0]
+                self.unplace(shape)
+                self.place(shape, z)
+        self.dirty.clear()
+
+    def candidates(self, point):
+        """Shapes whose extent contains point, topmost first."""
+        self.refresh()
+        x, y = point.x(), point.y()
+        shapes = list(self.cells.get(self.cellOf(x, y), ()))
+        shapes.extend(self.large)
+        hits = []
+        for shape in shapes:
+            z, (xmin, ymin, xmax, ymax), _ = self.entries[shape]
+            if xmin <= x <= xmax and ymin <= y <= ymax:
+                hits.append((z, shape))
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        return [shape for _, shape in hits]
+
+    def intersecting(self, rect):
+        """Shapes whose extent intersects the QRectF rect, bottom first."""
+        self.refresh()
+        col0, row0 = self.cellOf(rect.left(), rect.top())
+        col1, row1 = self.cellOf(rect.right(), rect.bottom())
+        if (col1 - col0 + 1) * (row1 - row0 + 1) > len(self.cells):
+            shapes = set(self.entries)
+        else:
+            shapes = set(self.large)
+            for col in range(col0, col1 + 1):
+                for row in range(row0, row1 + 1):
+                    shapes.update(self.cells.get((col, row), ()))
+        hits = []
+        for shape in shapes:
+            z, (xmin, ymin, xmax, ymax), _ = self.entries[shape]
+            if xmin <= rect.right() and xmax >= rect.left() and \
+                    ymin <= rect.bottom() and ymax >= rect.top():
+                hits.append((z, shape))
+        hits.sort(key=lambda hit: hit[0])
+        return [shape for _, shape in hits]
+
+    def cellOf(self, x, y):
+        return int(math.floor(x / self.cellSize)), int(math.floor(y / self.cellSize))
+
+    def extent(self, shape):
+        xs = [p.x() for p in shape.points]
+        ys = [p.y() for p in shape.points]
+        if shape.points:
+            try:
+                handle = shape.tetragonRotationPoint()
+                xs.append(handle.x())
+                ys.append(handle.y())
+            except (ValueError, ZeroDivisionError):
+                pass
+        if not xs:
+            return None
+        m = self.margin
+        return min(xs) - m, min(ys) - m, max(xs) + m, max(ys) + m
+
+    def place(self, shape, z):
+        extent = self.extent(shape)
+        if extent is None:
+            self.entries[shape] = (z, (0, 0, -1, -1), [])
+            return
+        col0, row0 = self.cellOf(extent[0], extent[1])
+        col1, row1 = self.cellOf(extent[2], extent[3])
+        if (col1 - col0 + 1) * (row1 - row0 + 1) > MAX_CELLS:
+            self.large.add(shape)
+            self.entries[shape] = (z, extent, None)
+            return
+        cells = [(col, row) for col in range(col0, col1 + 1) for row in range(row0, row1 + 1)]
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(shape)
+        self.entries[shape] = (z, extent, cells)
+
+    def unplace(self, shape):
+        _, _, cells = self.entries.pop(shape)
+        if cells is None:
+            self.large.discard(shape)
+            return
+        for cell in cells:
+            members = self.cells[cell]
+            members.discard(shape)
+            if not members:
+                del self.cells[cell]
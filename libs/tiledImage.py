@@ -0,0 +1,221 @@
+import math
+from collections import OrderedDict
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.imagePyramid import ImagePyramid
+
+TILE_SIZE = 512
+# Images with at least this many pixels are decoded tile by tile.
+TILED_MIN_PIXELS = 64 * 1024 * 1024
+# The overview decoded on open() is at most this large on its longer side.
+OVERVIEW_SIZE = 2048
+DEFAULT_TILE_BYTES = 256 * 1024 * 1024
+
+
+def isTileable(path):
+    """True if path is large enough to tile and its format can decode a region.
+
+    Only formats whose Qt plugin reads a clip rect without decoding the
+    whole image (JPEG) qualify; anything else is loaded whole as before.
+    """
+    reader = QImageReader(path)
+    size = reader.size()
+    if not size.isValid() or not reader.supportsOption(QImageIOHandler.ClipRect):
+        return False
+    return size.width() * size.height() >= TILED_MIN_PIXELS
+
+
+def scaledSize(size, factor):
+    return QSize(int(math.ceil(size.width() / float(factor))),
+                 int(math.ceil(size.height() / float(factor))))
+
+
+def readRegion(path, rect, factor):
+    """Decode the image rect of path at 1/factor resolution."""
+    reader = QImageReader(path)
+    reader.setClipRect(rect)
+    reader.setScaledSize(scaledSize(rect.size(), factor))
+    return reader.read()
+
+
+class TileSignals(QObject):
+    decoded = pyqtSignal(int, object, object)
+
+
+class TileTask(QRunnable):
+
+    def __init__(self, tiles, generation, path, factor, keys):
+        super(TileTask, self).__init__()
+        self.tiles = tiles
+        self.generation = generation
+        self.path = path
+        self.factor = factor
+        self.keys = keys
+
+    def stale(self):
+        return self.generation != self.tiles.generation or \
+            self.tiles.wanted.isdisjoint(self.keys)
+
+    def run(self):
+        images = {}
+        if not self.stale():
+            # One read for all the tiles: the decoder has to go through the
+            # rows above a region anyway.
+            rects = [self.tiles.tileRect(key) for key in self.keys]
+            region = rects[0]
+            for rect in rects[1:]:
+                region = region.united(rect)
+            image = readRegion(self.path, region, self.factor)
+            if not image.isNull():
+                for key, rect in zip(self.keys, rects):
+                    offset = (rect.topLeft() - region.topLeft()) / self.factor
+                    images[key] = image.copy(QRect(offset, scaledSize(rect.size(), self.factor)))
+        self.tiles.signals.decoded.emit(self.generation, self.keys, images)
+
+
+class TiledImage(QObject):
+    """An image too large to decode whole, read in tiles as it is viewed.
+
+    open() reads the image size and decodes a small overview of the whole
+    image.  request() then asks for the tiles that cover a rect of the
+    image at the resolution a scale needs; they are decoded on a worker
+    thread and tilesReady is emitted as they arrive.  tiles() returns the
+    decoded tiles that cover a rect, coarser ones first, so drawing them
+    in order over the overview leaves the sharpest available on top.
+
+    Tiles are TILE_SIZE pixels at their own resolution, 1/factor of the
+    image for power of two factors, and are kept in an LRU bounded by
+    maxBytes.  All rects are in full resolution image coordinates.
+    """
+
+    tilesReady = pyqtSignal()
+
+    def __init__(self, maxBytes=DEFAULT_TILE_BYTES, parent=None):
+        super(TiledImage, self).__init__(parent)
+        self.maxBytes = maxBytes
+        self.generation = 0
+        self.path = None
+        self.size = QSize()
+        self.overview = None
+        self.overviewFactor = 1
+        self.cache = OrderedDict()
+        self.currentBytes = 0
+        self.pending = set()
+        self.wanted = frozenset()
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = TileSignals()
+        self.signals.decoded.connect(self.onDecoded)
+
+    def isOpen(self):
+        return self.path is not None
+
+    def open(self, path):
+        """Start showing path; return its overview QImage, or None."""
+        self.clear()
+        size = QImageReader(path).size()
+        if not size.isValid():
+            return None
+        factor = 1
+        while max(size.width(), size.height()) > OVERVIEW_SIZE * factor:
+            factor *= 2
+        overview = readRegion(path, QRect(QPoint(0, 0), size), factor)
+        if overview.isNull():
+            return None
+        self.path = path
+        self.size = size
+        self.overview = overview
+        self.overviewFactor = factor
+        return overview
+
+    def clear(self):
+        self.generation += 1
+        self.path = None
+        self.size = QSize()
+        self.overview = None
+        self.overviewFactor = 1
+        self.cache = OrderedDict()
+        self.currentBytes = 0
+        self.pending = set()
+        self.wanted = frozenset()
+
+    def factorFor(self, scale):
+        """Tile factor for scale device pixels per image pixel, or None
+        if the overview is sharp enough."""
+        factor = ImagePyramid.wantedFactor(scale)
+        return factor if factor < self.overviewFactor else None
+
+    def keysFor(self, rect, factor):
+        span = TILE_SIZE * factor
+        rect = rect.intersected(QRect(QPoint(0, 0), self.size))
+        if rect.isEmpty():
+            return []
+        return [(factor, col, row)
+                for row in range(rect.top() // span, rect.bottom() // span + 1)
+                for col in range(rect.left() // span, rect.right() // span + 1)]
+
+    def tileRect(self, key):
+        factor, col, row = key
+        span = TILE_SIZE * factor
+        return QRect(col * span, row * span, span, span).intersected(QRect(QPoint(0, 0), self.size))
+
+    def request(self, rect, scale):
+        """Decode the tiles covering rect at scale that are not cached yet.
+
+        Tiles still queued for an earlier request outside rect are dropped.
+        """
+        factor = self.factorFor(scale) if self.isOpen() else None
+        if factor is None:
+            self.wanted = frozenset()
+            return
+        keys = self.keysFor(rect, factor)
+        self.wanted = frozenset(keys)
+        missing = [key for key in keys if key not in self.cache and key not in self.pending]
+        if missing:
+            self.pending.update(missing)
+            self.pool.start(TileTask(self, self.generation, self.path, factor, missing))
+
+    def tiles(self, rect, scale):
+        """[(image rect, QPixmap)] of the cached tiles covering rect, coarsest first.
+
+        Where a tile at the resolution scale needs is missing, the cached
+        tile of the nearest coarser resolution is used instead.
+        """
+        factor = self.factorFor(scale) if self.isOpen() else None
+        if factor is None:
+            return []
+        found = {}
+        for key in self.keysFor(rect, factor):
+            f, col, row = key
+            while f < self.overviewFactor:
+                if key in self.cache:
+                    found[key] = self.cache.pop(key)
+                    self.cache[key] = found[key]
+                    break
+                f, col, row = f * 2, col // 2, row // 2
+                key = (f, col, row)
+        keys = sorted(found, key=lambda key: key[0], reverse=True)
+        return [(self.tileRect(key), found[key]) for key in keys]
+
+    def onDecoded(self, generation, keys, images):
+        if generation != self.generation:
+            return
+        self.pending.difference_update(keys)
+        for key, image in images.items():
+            pixmap = QPixmap.fromImage(image)
+            if key in self.cache:
+                old = self.cache.pop(key)
+                self.currentBytes -= old.width() * old.height() * 4
+            self.cache[key] = pixmap
+            self.currentBytes += pixmap.width() * pixmap.height() * 4
+        while self.currentBytes > self.maxBytes and self.cache:
+            pixmap = self.cache.pop(next(iter(self.cache)))
+            self.currentBytes -= pixmap.width() * pixmap.height() * 4
+        if images:
+            self.tilesReady.emit()
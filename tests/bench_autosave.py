@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""Time moving to the next image with autosave, writing inline or behind.
+
+    python tests/bench_autosave.py [shapes] [images]
+
+Each image gets `shapes` boxes and is left dirty, then openNextImg()
+saves it and loads the next one.  Compares waiting for the XML and
+Darknet files to be written before the next image loads, as saving
+used to, with handing the save to the background writer.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import labelImg
+
+
+def makeImages(folder, count):
+    paths = []
+    image = QImage(1600, 1200, QImage.Format_RGB32)
+    image.fill(QColor(90, 120, 150))
+    for i in range(count):
+        path = os.path.join(folder, 'img%03d.jpg' % i)
+        image.save(path, 'JPG', 90)
+        paths.append(path)
+    return paths
+
+
+def navigate(app, win, paths, shapes, inline, saveDir):
+    # Each run saves to a folder of its own, so it never loads what the
+    # other wrote.
+    os.mkdir(saveDir)
+    win.defaultSaveDir = saveDir
+    submit = win.saveQueue.submit
+    if inline:
+        def submitAndWait(record):
+            submit(record)
+            win.saveQueue.flush()
+        win.saveQueue.submit = submitAndWait
+    times = []
+    win.loadFile(paths[0])
+    for _ in paths[1:]:
+        # The time spent labelling an image is time the writer has.
+        while win.saveQueue.busy():
+            app.processEvents()
+            time.sleep(0.01)
+        app.processEvents()
+        labels = []
+        for _ in range(shapes):
+            x, y = random.randint(0, 1400), random.randint(0, 1000)
+            labels.append(('car', [(x, y), (x + 100, y), (x + 100, y + 80), (x, y + 80)],
+                           None, None, False, False, 0, False))
+        win.loadLabels(labels)
+        win.setDirty()
+        start = time.time()
+        win.openNextImg()
+        times.append((time.time() - start) * 1000)
+    win.saveQueue.flush()
+    win.saveQueue.submit = submit
+    times.sort()
+    return times[len(times) // 2]
+
+
+def main():
+    shapes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    random.seed(0)
+    tmp = tempfile.mkdtemp()
+    app, win = labelImg.get_main_app()
+    # Let the startup loadFile('') run first.
+    app.processEvents()
+    try:
+        paths = makeImages(tmp, count)
+        win.mImgList.setPaths(paths)
+        # The Darknet ids index the label history.
+        if 'car' not in win.labelHist:
+            win.labelHist.append('car')
+        inline = navigate(app, win, paths, shapes, True, os.path.join(tmp, 'inline'))
+        behind = navigate(app, win, paths, shapes, False, os.path.join(tmp, 'behind'))
+        print('%d shapes per image, median openNextImg: %.1f ms saving inline, '
+              '%.1f ms with the background writer' % (shapes, inline, behind))
+    finally:
+        win.close()
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Time refining every box of a busy 24 MP image with the local refiner.
+
+    python tests/bench_box_refiner.py [boxes]
+
+Boxes are drawn as dark rectangles, then given to the refiner a few
+pixels off; reports the time for all of them and how far they end up
+from the drawn edges.
+"""
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.boxRefiner import refineBoxes
+
+WIDTH, HEIGHT = 6000, 4000
+RUNS = 3
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    random.seed(0)
+    image = QImage(WIDTH, HEIGHT, QImage.Format_RGB32)
+    image.fill(QColor(200, 200, 200))
+    painter = QPainter(image)
+    drawn, boxes, windows = [], [], []
+    for _ in range(count):
+        x, y = random.randint(0, WIDTH - 200), random.randint(0, HEIGHT - 200)
+        w, h = random.randint(30, 150), random.randint(30, 150)
+        painter.fillRect(x, y, w, h, QColor(40, 60, 80))
+        drawn.append((x, y, x + w, y + h))
+    painter.end()
+    for x1, y1, x2, y2 in drawn:
+        box = [v + random.randint(-6, 6) for v in (x1, y1, x2, y2)]
+        padX, padY = (box[2] - box[0]) * 0.5, (box[3] - box[1]) * 0.5
+        boxes.append(box)
+        windows.append((max(0, box[0] - padX), max(0, box[1] - padY),
+                        min(WIDTH, box[2] + padX), min(HEIGHT, box[3] + padY)))
+    times = []
+    for _ in range(RUNS):
+        start = time.time()
+        refined = refineBoxes(image, boxes, windows)
+        times.append((time.time() - start) * 1000)
+    before = np.abs(np.array(boxes, np.float64) - drawn)
+    after = np.abs(refined - drawn)
+    print('%d boxes on %dx%d: %.0f ms; mean edge error %.2f px before, %.2f px after, '
+          '%.0f%% of edges exact' % (count, WIDTH, HEIGHT, min(times), before.mean(),
+                                     after.mean(), (after == 0).mean() * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Time dragging a box with a 1000 Hz mouse, handled per event or per frame.
+
+    python tests/bench_canvas_input.py [shapes]
+
+A 1000 Hz mouse delivers about 16 moves per 60 Hz frame.  Handling and
+painting every one of them, as mouseMoveEvent used to, is compared with
+the per-frame coalescing of Canvas.flushInput(), in CPU time per frame.
+The canvas latency counter reports the input to frame delay of the
+coalesced run.
+"""
+import os
+import random
+import sys
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.canvas import Canvas
+from libs.shape import Shape
+
+FRAMES = 30
+MOVES_PER_FRAME = 16
+
+
+def makeCanvas(count):
+    canvas = Canvas()
+    image = QImage(6000, 4000, QImage.Format_RGB32)
+    image.fill(QColor(90, 120, 150))
+    canvas.loadPixmap(QPixmap.fromImage(image), image)
+    random.seed(0)
+    shapes = []
+    for _ in range(count):
+        x, y = random.randint(0, 5800), random.randint(0, 3800)
+        shape = Shape(label='box')
+        for px, py in ((x, y), (x + 150, y), (x + 150, y + 150), (x, y + 150)):
+            shape.addPoint(QPointF(px, py))
+        shape.close()
+        shapes.append(shape)
+    canvas.loadShapes(shapes)
+    canvas.scale = 0.25
+    canvas.resize(1500, 1000)
+    canvas.show()
+    return canvas, shapes[0]
+
+
+def drag(app, canvas, shape, perEvent):
+    start = shape.points[0] * canvas.scale + QPointF(2, 2)
+    canvas.mousePressEvent(QMouseEvent(QEvent.MouseButtonPress, start,
+                                       Qt.LeftButton, Qt.LeftButton, Qt.NoModifier))
+    app.processEvents()
+    began = time.process_time()
+    pos = QPointF(start)
+    for _ in range(FRAMES * MOVES_PER_FRAME):
+        # One move per millisecond, with the event loop running between.
+        pos += QPointF(1, 1)
+        canvas.mouseMoveEvent(QMouseEvent(QEvent.MouseMove, pos,
+                                          Qt.LeftButton, Qt.LeftButton, Qt.NoModifier))
+        if perEvent:
+            canvas.flushInput()
+        app.processEvents()
+        time.sleep(0.001)
+    canvas.flushInput()
+    app.processEvents()
+    elapsed = (time.process_time() - began) * 1000 / FRAMES
+    canvas.mouseReleaseEvent(QMouseEvent(QEvent.MouseButtonRelease, pos,
+                                         Qt.LeftButton, Qt.NoButton, Qt.NoModifier))
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    app = QApplication(sys.argv)
+    canvas, shape = makeCanvas(count)
+    app.processEvents()
+    canvas.latency.reset()
+    perEvent = drag(app, canvas, shape, True)
+    perEventStats = canvas.latency.stats()
+    canvas.latency.reset()
+    coalesced = drag(app, canvas, shape, False)
+    stats = canvas.latency.stats()
+    print('%d shapes, %d moves per frame:' % (count, MOVES_PER_FRAME))
+    for name, cpu, stats in (('every move', perEvent, perEventStats),
+                             ('coalesced', coalesced, stats)):
+        print('  %-10s %.1f ms CPU per frame, %d events in %d updates, '
+              'latency %.1f ms mean, %.1f ms max'
+              % (name, cpu, stats['events'], stats['updates'], stats['mean'], stats['max']))
+
+if __name__ == '__main__':
+    main()
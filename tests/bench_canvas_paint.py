@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Time canvas frames while dragging a box over a 6000x4000 image.
+
+    python tests/bench_canvas_paint.py [shapes] [scale]
+
+Compares repainting the whole canvas, as every mouse move used to, with
+repainting only the region the dragged box covered before and after,
+with and without the cached layer of idle shapes.
+"""
+import os
+import random
+import sys
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs import canvas as canvasModule
+from libs.canvas import Canvas
+from libs.shape import Shape
+
+STEPS = 100
+
+
+def makeCanvas(count, scale):
+    canvas = Canvas()
+    image = QImage(6000, 4000, QImage.Format_RGB32)
+    image.fill(QColor(90, 120, 150))
+    painter = QPainter(image)
+    random.seed(0)
+    for _ in range(2000):
+        painter.fillRect(random.randint(0, 5900), random.randint(0, 3900), 100, 100,
+                         QColor(random.randint(0, 255), random.randint(0, 255), 0))
+    painter.end()
+    canvas.loadPixmap(QPixmap.fromImage(image))
+    shapes = []
+    for _ in range(count):
+        x, y = random.uniform(100, 5700), random.uniform(100, 3700)
+        shape = Shape('box')
+        for point in [(x, y), (x + 120, y), (x + 120, y + 90), (x, y + 90)]:
+            shape.addPoint(QPointF(*point))
+        shape.close()
+        shapes.append(shape)
+    canvas.loadShapes(shapes)
+    canvas.scale = scale
+    canvas.resize(int(6000 * scale), int(4000 * scale))
+    return canvas
+
+
+def drag(canvas, region):
+    shape = canvas.shapes[0]
+    canvas.selectShape(shape)
+    canvas.prevPoint = shape[0]
+    canvas.calculateOffsets(shape, shape[0])
+    # Render into an image of the canvas size: the same paintEvent calls a
+    # visible canvas gets, without needing a screen.
+    frame = QImage(canvas.size(), QImage.Format_ARGB32_Premultiplied)
+    canvas.render(frame)
+    start = time.time()
+    for step in range(STEPS):
+        before = canvas.shapeRect([shape])
+        canvas.boundedMoveShape(shape, canvas.prevPoint + QPointF(3, 2))
+        if region:
+            exposed = before.united(canvas.shapeRect([shape]))
+        else:
+            exposed = canvas.rect()
+        canvas.render(frame, exposed.topLeft(), QRegion(exposed))
+    return (time.time() - start) / STEPS * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    scale = float(sys.argv[2]) if len(sys.argv) > 2 else 0.25
+    app = QApplication(sys.argv)
+    layerPixels = canvasModule.LAYER_MAX_PIXELS
+    canvasModule.LAYER_MAX_PIXELS = 0
+    full = drag(makeCanvas(count, scale), False)
+    region = drag(makeCanvas(count, scale), True)
+    canvasModule.LAYER_MAX_PIXELS = layerPixels
+    layered = drag(makeCanvas(count, scale), True)
+    print('6000x4000, %d shapes, scale %.2f, ms/frame: full repaint %.2f, '
+          'dirty region %.2f, dirty region + shape layer %.2f'
+          % (count, scale, full, region, layered))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""Time journaling one shape edit against saving the whole annotation.
+
+    python tests/bench_edit_journal.py [shapes] [edits]
+
+An image with `shapes` boxes gets `edits` moves, 2 ms apart, each
+appended to the edit journal as MainWindow.journalShape does; that is
+compared with writing its XML and Darknet files, as every save does.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.editJournal import EditJournal
+from libs.labelFile import LabelFile
+from libs.saveQueue import SaveRecord, writeRecord
+from libs.shape import Shape
+
+
+def makeShapes(count):
+    shapes = []
+    for _ in range(count):
+        x, y = random.randint(0, 1400), random.randint(0, 1000)
+        shape = Shape(label='car')
+        for px, py in ((x, y), (x + 100, y), (x + 100, y + 80), (x, y + 80)):
+            shape.addPoint(QPointF(px, py))
+        shape.close()
+        shapes.append(shape)
+    return shapes
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    edits = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    random.seed(0)
+    app = QApplication.instance() or QApplication([])
+    tmp = tempfile.mkdtemp()
+    try:
+        imagePath = os.path.join(tmp, 'img.jpg')
+        image = QImage(1600, 1200, QImage.Format_RGB32)
+        image.fill(QColor(90, 120, 150))
+        image.save(imagePath, 'JPG', 90)
+        shapes = makeShapes(count)
+
+        journal = EditJournal(tmp, os.path.join(tmp, 'edits.journal'))
+        step = QPointF(1, 0)
+        times = []
+        for i in range(edits):
+            shape = shapes[i % count]
+            shape.moveBy(step)
+            start = time.perf_counter()
+            journal.shapeChanged(imagePath, shapes.index(shape), shape)
+            times.append(time.perf_counter() - start)
+            # Edits come in at most once a frame.
+            deadline = time.time() + 0.002
+            while time.time() < deadline:
+                app.processEvents()
+        journal.close()
+        times.sort()
+        stats = journal.stats()
+
+        dicts = tuple(dict(label=s.label, line_color=None, fill_color=None,
+                           points=[(p.x(), p.y()) for p in s.points], difficult=s.difficult,
+                           tetragon=s.tetragon, deg=s.deg, shape3D=s.shape3D) for s in shapes)
+        record = SaveRecord(os.path.join(tmp, 'img.xml'), imagePath, dicts, False,
+                            LabelFile.darknetText(QSize(1600, 1200), dicts, ['car']),
+                            None, None, 0)
+        saves = 20
+        start = time.time()
+        for _ in range(saves):
+            writeRecord(record)
+        saved = time.time() - start
+        print('%d shapes: %.1f us median, %.1f us p95 per journaled edit '
+              '(%d fsyncs for %d edits), %.1f ms per full save' %
+              (count, times[len(times) // 2] * 1e6, times[len(times) * 95 // 100] * 1e6,
+               stats['syncs'], edits, saved / saves * 1000))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
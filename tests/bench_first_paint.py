@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Time loading a 24 MP JPEG up to its first fit-window frame.
+
+    python tests/bench_first_paint.py [width] [height]
+
+Compares decoding the full image before the first frame with showing a
+reduced decode first, and reports how long the full image took to
+replace the preview in the background.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import labelImg
+
+RUNS = 5
+
+
+def firstPaint(app, win, path):
+    times = []
+    for _ in range(RUNS):
+        win.imageCache.clear()
+        start = time.time()
+        win.loadFile(path)
+        win.canvas.repaint()
+        times.append((time.time() - start) * 1000)
+    return min(times)
+
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 6000
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'photo.jpg')
+    app, win = labelImg.get_main_app()
+    win.resize(1600, 1000)
+    app.processEvents()
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(90, 120, 150))
+    painter = QPainter(image)
+    for i in range(0, width, 97):
+        painter.fillRect(i, 0, 40, height, QColor(200, i % 255, 30))
+    painter.end()
+    image.save(path, 'JPG', 90)
+    del image
+
+    try:
+        preview = firstPaint(app, win, path)
+        factor = win.canvas.imageSize().width() // win.canvas.pixmap.width()
+        start = time.time()
+        while win.previewPath is not None:
+            app.processEvents()
+        upgrade = (time.time() - start) * 1000
+
+        previewFactor = labelImg.previewFactor
+        labelImg.previewFactor = lambda path, size, ratio=1.0: (1, None)
+        full = firstPaint(app, win, path)
+        labelImg.previewFactor = previewFactor
+        print('%dx%d jpeg, fit window: first frame %.0f ms from the full image, '
+              '%.0f ms from a 1/%d decode (full image %.0f ms later)'
+              % (width, height, full, preview, factor, upgrade))
+    finally:
+        win.close()
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
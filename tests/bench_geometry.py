@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""Time rotating one shape point by point, with rotatePoints and with NumPy.
+
+    python tests/bench_geometry.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs import geometry
+from libs.shape import Shape
+
+try:
+    from PyQt5.QtCore import QPointF
+except ImportError:
+    from PyQt4.QtCore import QPointF
+
+
+def makeShape():
+    shape = Shape('box')
+    shape.points = [QPointF(100, 200), QPointF(180, 200), QPointF(180, 260), QPointF(100, 260)]
+    shape.centerPoint = shape.centerPointPosition()
+    return shape
+
+
+def perPointRotate(shape, angle):
+    return [Shape.rotatePoint(shape, shape.centerPoint, p, angle) for p in shape.points]
+
+
+def arrayRotate(shape, angle):
+    coords = geometry.toArray(shape.points)
+    center = np.array([shape.centerPoint.x(), shape.centerPoint.y()])
+    radians = np.radians(angle)
+    cos, sin = np.cos(radians), np.sin(radians)
+    d = coords - center
+    rotated = np.stack([cos * d[:, 0] + sin * d[:, 1], cos * d[:, 1] - sin * d[:, 0]], axis=1)
+    return [QPointF(x, y) for x, y in (rotated + center).tolist()]
+
+
+def best(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    shape = makeShape()
+    number = 20000
+    print('one shape of 4 points (rotation handle drag)')
+    print('per point      %6.2f us' % best(lambda: perPointRotate(shape, 30), number))
+    print('rotatePoints   %6.2f us' % best(
+        lambda: geometry.rotatePoints(shape.points, shape.centerPoint, 30), number))
+    print('NumPy arrays   %6.2f us' % best(lambda: arrayRotate(shape, 30), number))
+
+
+if __name__ == '__main__':
+    main()
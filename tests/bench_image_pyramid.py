@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Time a fit-window canvas frame of a 40 MP image with and without the pyramid.
+
+    python tests/bench_image_pyramid.py [width] [height]
+"""
+import os
+import sys
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.canvas import Canvas
+
+FRAMES = 10
+
+
+def frameTime(canvas, frame):
+    start = time.time()
+    for _ in range(FRAMES):
+        canvas.render(frame)
+    return (time.time() - start) / FRAMES * 1000
+
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 7744
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else 5184
+    app = QApplication(sys.argv)
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(90, 120, 150))
+    painter = QPainter(image)
+    for i in range(0, width, 97):
+        painter.fillRect(i, 0, 40, height, QColor(200, i % 255, 30))
+    painter.end()
+
+    canvas = Canvas()
+    canvas.loadPixmap(QPixmap.fromImage(image), image)
+    canvas.scale = min(1600.0 / width, 1000.0 / height)
+    canvas.resize(int(width * canvas.scale), int(height * canvas.scale))
+    frame = QImage(canvas.size(), QImage.Format_ARGB32_Premultiplied)
+
+    # The first frame starts building the levels; until they arrive every
+    # frame is drawn from the full image.
+    start = time.time()
+    canvas.render(frame)
+    while canvas.pyramid.level(canvas.scale)[0] < canvas.pyramid.wantedFactor(canvas.scale):
+        app.processEvents()
+    built = (time.time() - start) * 1000
+    pyramid = frameTime(canvas, frame)
+    canvas.pyramid.levels = {}
+    canvas.pyramid.building = True
+    full = frameTime(canvas, frame)
+    print('%dx%d at scale %.3f: full image %.1f ms/frame, level 1/%d %.1f ms/frame '
+          '(levels built in %.0f ms)'
+          % (width, height, canvas.scale, full, canvas.pyramid.wantedFactor(canvas.scale),
+             pyramid, built))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""Time checking a few hundred labels one crop per request or in batches.
+
+    python tests/bench_label_check.py [crops] [latency ms]
+
+Runs the stand-in server of check_server.py with a fixed delay per
+request, standing in for the network round-trip and server overhead,
+and reports crops checked per second for each batch size.
+"""
+import os
+import sys
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.labelChecker import LabelChecker, CheckJob
+from check_server import CheckServer
+
+BATCH_SIZES = (1, 4, 16, 64)
+
+
+def makeJobs(count):
+    crop = QImage(120, 90, QImage.Format_RGB32)
+    crop.fill(QColor(90, 120, 150))
+    return [CheckJob(object(), 'car', crop, (0, 0, 120, 90), False, 'car %d.png' % i, 'PNG')
+            for i in range(count)]
+
+
+def run(app, url, jobs, batchSize):
+    checker = LabelChecker(batchSize=batchSize)
+    finished = []
+    checker.finished.connect(lambda: finished.append(1))
+    start = time.time()
+    checker.check(url, jobs)
+    while not finished:
+        app.processEvents()
+        time.sleep(0.001)
+    elapsed = time.time() - start
+    checker.pool.waitForDone()
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 30.0
+    app = QApplication(sys.argv)
+    server = CheckServer(latency=latency / 1000.0)
+    url = server.start()
+    jobs = makeJobs(count)
+    try:
+        print('%d crops, %.0f ms per request:' % (count, latency))
+        for size in BATCH_SIZES:
+            server.requests = 0
+            elapsed = run(app, url, jobs, size)
+            print('  batch %-3d %5.2f s, %4d requests, %5.0f crops/s'
+                  % (size, elapsed, server.requests, count / elapsed))
+        server.batching = False
+        server.requests = 0
+        elapsed = run(app, url, jobs, 16)
+        print('  batch 16 to a server without batches: %.2f s, %d requests'
+              % (elapsed, server.requests))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
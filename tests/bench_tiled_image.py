@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Time showing a large JPEG decoded whole versus tile by tile.
+
+    python tests/bench_tiled_image.py [width] [height]
+
+Reports the time to the first frame and the decoded pixels held: the
+whole image, versus the overview plus the tiles of a 1600x1000 viewport
+at 100% zoom.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.tiledImage import TiledImage
+
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 16000
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else 12000
+    app = QApplication(sys.argv)
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'large.jpg')
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(90, 120, 150))
+    painter = QPainter(image)
+    for i in range(0, width, 97):
+        painter.fillRect(i, 0, 40, height, QColor(200, i % 255, 30))
+    painter.end()
+    image.save(path, 'JPG', 90)
+    del image
+
+    try:
+        start = time.time()
+        whole = QImage(path)
+        wholeTime = (time.time() - start) * 1000
+        wholePixels = whole.width() * whole.height()
+        del whole
+
+        tiles = TiledImage()
+        start = time.time()
+        overview = tiles.open(path)
+        overviewTime = (time.time() - start) * 1000
+        # A viewport in the middle of the image.
+        viewport = QRect(width // 2, height // 2, 1600, 1000)
+        tiles.request(viewport, 1.0)
+        while tiles.pending:
+            app.processEvents()
+        tileTime = (time.time() - start) * 1000 - overviewTime
+        tilePixels = sum(tile.width() * tile.height() for tile in tiles.cache.values())
+        print('%dx%d jpeg: whole decode %.0f ms, %.0f MP; overview %.0f ms + viewport '
+              'tiles %.0f ms, %.1f MP'
+              % (width, height, wholeTime, wholePixels / 1e6, overviewTime, tileTime,
+                 (overview.width() * overview.height() + tilePixels) / 1e6))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
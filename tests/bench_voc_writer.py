@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""Time the VOC writer against the tree + prettify path it replaced.
+
+    python tests/bench_voc_writer.py [objects] [repeats]
+"""
+import codecs
+import os
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.pascal_voc_io import PascalVocWriter, XML_EXT, ENCODE_METHOD
+
+
+def makeWriter(objects):
+    random.seed(0)
+    writer = PascalVocWriter('bench', 'bench', (2000, 3000, 3), localImgPath='/data/bench.jpg')
+    for i in range(objects):
+        x, y = random.randint(0, 2500), random.randint(0, 1500)
+        kind = i % 3
+        if kind == 0:
+            writer.addBndBox(x, y, x + 80, y + 60, 'box%d' % i, i % 2, False, 0)
+        elif kind == 1:
+            writer.addBndBox2([(x, y), (x + 80, y + 5), (x + 75, y + 60), (x - 3, y + 55)],
+                              'tetragon', 0, True, 0)
+        else:
+            writer.addBndBox3(True, [(x + j * 10, y + j * 7) for j in range(8)], 'cube', 0, 0)
+    return writer
+
+
+def treeSave(writer, targetFile):
+    root = writer.genXML()
+    writer.appendObjects(root)
+    out_file = codecs.open(targetFile, 'w', encoding=ENCODE_METHOD)
+    out_file.write(writer.prettify(root).decode('utf8'))
+    out_file.close()
+
+
+def main():
+    objects = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    writer = makeWriter(objects)
+    folder = tempfile.mkdtemp()
+    try:
+        target = os.path.join(folder, 'bench' + XML_EXT)
+        old = min(timeit.repeat(lambda: treeSave(writer, target), number=1, repeat=repeats))
+        with open(target, 'rb') as f:
+            expected = f.read()
+        new = min(timeit.repeat(lambda: writer.save(target), number=1, repeat=repeats))
+        with open(target, 'rb') as f:
+            assert f.read() == expected, 'output differs from the tree + prettify path'
+    finally:
+        shutil.rmtree(folder)
+    print('%d objects: tree + prettify %.2f ms, direct %.2f ms (%.1fx)'
+          % (objects, old * 1000, new * 1000, old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""A local stand-in for the label-check server.
+
+    python tests/check_server.py [--port 8000] [--no-batch] [--latency MS] [--per-crop MS]
+                                 [--model VERSION]
+
+Answers the single-crop request (one 'file' field) with a JSON array of
+corrections, and, unless --no-batch is given, the batch request ('crops'
+files and a 'meta' field) with one such array per crop.  Without batch
+support a batch request gets 400, as from a server that finds no 'file'.
+--latency adds a delay to every request and --per-crop one per crop, to
+compare the two protocols offline.  With --model, answers carry an
+X-Model-Version header.
+"""
+import argparse
+import email.parser
+import json
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+BOX_REPLY = [0.5, 0.5, 0.8, 0.6]
+TETRAGON_REPLY = [0.25, 0.25, 0.75, 0.25, 0.75, 0.75, 0.25, 0.75]
+
+
+def formFields(contentType, body):
+    """(name, filename, payload) of each part of a multipart/form-data body."""
+    header = b'Content-Type: ' + contentType.encode('ascii') + b'\r\n\r\n'
+    message = email.parser.BytesParser().parsebytes(header + body)
+    return [(part.get_param('name', header='content-disposition'), part.get_filename(),
+             part.get_payload(decode=True)) for part in message.get_payload()]
+
+
+class CheckHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers['Content-Length'])
+        fields = formFields(self.headers['Content-Type'], self.rfile.read(length))
+        files = [(name, filename, data) for name, filename, data in fields if filename]
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.requests += 1
+            server.uploads.extend((filename, data) for _, filename, data in files)
+        single = [f for f in files if f[0] == 'file']
+        crops = [f for f in files if f[0] == 'crops']
+        time.sleep(server.latency + server.perCrop * len(files))
+        if single:
+            filename = single[0][1]
+            if filename.startswith('bad'):
+                self.reply(500, b'no')
+            else:
+                self.reply(200, json.dumps(server.reply))
+        elif crops and server.batching:
+            meta = [json.loads(data) for name, _, data in fields if name == 'meta'][0]
+            if any(filename.startswith('bad') for _, filename, _ in crops):
+                self.reply(500, b'no')
+            else:
+                self.reply(200, json.dumps([server.tetragonReply if m['tetragon'] else server.reply
+                                            for m in meta]))
+        else:
+            self.reply(400, b'no file')
+
+    def reply(self, status, body):
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        if status == 200 and self.server.modelVersion is not None:
+            self.send_header('X-Model-Version', self.server.modelVersion)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class CheckServer(ThreadingMixIn, HTTPServer):
+    """The stand-in server; it counts the connections and requests it sees."""
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), batching=True, latency=0.0, perCrop=0.0,
+                 modelVersion=None):
+        HTTPServer.__init__(self, address, CheckHandler)
+        self.batching = batching
+        self.latency = latency
+        self.perCrop = perCrop
+        self.modelVersion = modelVersion
+        self.reply = BOX_REPLY
+        self.tetragonReply = TETRAGON_REPLY
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.uploads = []
+        self.requests = 0
+
+    def handle_error(self, request, client_address):
+        # Clients that time out leave a broken pipe behind.
+        pass
+
+    def url(self):
+        return 'http://%s:%d/' % self.server_address[:2]
+
+    def start(self):
+        """Serve from a daemon thread; return the url."""
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.url()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in label-check server.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--no-batch', action='store_true', help='answer only single crops')
+    parser.add_argument('--latency', type=float, default=0.0, help='ms added to every request')
+    parser.add_argument('--per-crop', type=float, default=0.0, help='ms added per crop')
+    parser.add_argument('--model', help='model version to report')
+    args = parser.parse_args()
+    server = CheckServer(('127.0.0.1', args.port), not args.no_batch,
+                         args.latency / 1000.0, args.per_crop / 1000.0, args.model)
+    print('Checking labels on %s%s' % (server.url(), '' if server.batching else ' (no batches)'))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""What the Qt tests share: the QApplication, waiting for events, shapes."""
+import os
+import sys
+import time
+from unittest import TestCase
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtCore import QPointF
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    from PyQt4.QtCore import QPointF
+    from PyQt4.QtGui import QApplication
+
+from libs.shape import Shape
+
+
+class QtTestCase(TestCase):
+    """A TestCase with the QApplication its Qt objects need."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    @classmethod
+    def tearDownClass(cls):
+        # Other tests create their own QApplication.
+        cls.app = None
+
+    def waitFor(self, condition, timeout=10):
+        """Process events until condition() holds; whether it did in time."""
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            self.app.processEvents()
+            time.sleep(0.002)
+        return condition()
+
+
+def corners(x1, y1, x2, y2):
+    """The corners of a box, clockwise from the top left."""
+    return [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+
+
+def makeShape(points, label='box', tetragon=False):
+    """A closed Shape through the (x, y) points."""
+    shape = Shape(label=label)
+    shape.tetragon = tetragon
+    shape.points = [QPointF(x, y) for x, y in points]
+    shape.close()
+    return shape
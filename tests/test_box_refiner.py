@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+from unittest import TestCase
+import unittest
+import os
+import sys
+
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.boxRefiner import refineBoxes, refineShapes, normalizedBox, edgeIntegrals
+from helpers import makeShape
+
+
+class TestBoxRefiner(TestCase):
+
+    def setUp(self):
+        self.image = QImage(400, 300, QImage.Format_RGB32)
+        self.image.fill(QColor(220, 220, 220))
+        painter = QPainter(self.image)
+        painter.fillRect(100, 80, 120, 60, QColor(30, 40, 50))
+        painter.fillRect(300, 200, 40, 40, QColor(30, 40, 50))
+        painter.end()
+
+    def test_edge_integrals(self):
+        g = np.array([[0, 10, 10], [0, 0, 30]], np.uint8)
+        cols, rows = edgeIntegrals(g)
+        # Steps between columns 0|1 and 1|2, summed over both rows.
+        self.assertEqual(cols[2].tolist(), [0, 10, 30, 0])
+        # Steps between rows 0|1, summed over the columns so far.
+        self.assertEqual(rows[1].tolist(), [0, 0, 10, 30])
+
+    def test_boxes_snap_to_edges(self):
+        boxes = [(96, 84, 223, 137), (303, 197, 338, 243)]
+        windows = [(40, 55, 280, 165), (285, 180, 360, 260)]
+        refined = refineBoxes(self.image, boxes, windows)
+        self.assertEqual(refined.tolist(), [[100, 80, 220, 140], [300, 200, 340, 240]])
+
+    def test_region_of_the_image(self):
+        # As the window of a tiled image passes the part it decoded.
+        boxes = [(96, 84, 223, 137), (303, 197, 338, 243)]
+        windows = [(40, 55, 280, 165), (285, 180, 360, 260)]
+        region = self.image.copy(QRect(40, 55, 320, 205))
+        refined = refineBoxes(region, boxes, windows, (40, 55))
+        self.assertEqual(refined.tolist(), [[100, 80, 220, 140], [300, 200, 340, 240]])
+
+    def test_flat_areas_are_left_alone(self):
+        refined = refineBoxes(self.image, [(10, 10, 50, 50)], [(0, 0, 70, 70)])
+        self.assertEqual(refined.tolist(), [[10, 10, 50, 50]])
+
+    def test_shapes_give_server_answers(self):
+        box = makeShape([(96, 84), (223, 84), (223, 137), (96, 137)])
+        tetragon = makeShape([(303, 197), (338, 197), (338, 243), (303, 243)], tetragon=True)
+        windows = [(40, 55, 280, 165), (285, 180, 360, 260)]
+        values = refineShapes(self.image, [box, tetragon], windows)
+        self.assertEqual(values[0], normalizedBox((100, 80, 220, 140), windows[0]))
+        self.assertEqual(len(values[1]), 8)
+        corners = np.array(values[1]).reshape(-1, 2) * (75, 80) + (285, 180)
+        self.assertTrue(np.allclose(corners, [(300, 200), (340, 200), (340, 240), (300, 240)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+import unittest
+import os
+import sys
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.canvas import Canvas, CURSOR_GRAB, CURSOR_DEFAULT
+from libs.lib import LatencyCounter
+from helpers import QtTestCase, corners, makeShape
+
+
+class TestCanvasInput(QtTestCase):
+
+    def setUp(self):
+        self.canvas = Canvas()
+        self.canvas.loadPixmap(QPixmap(400, 300))
+        self.canvas.resize(400, 300)
+        self.shape = makeShape(corners(100, 100, 200, 200))
+        self.canvas.loadShapes([self.shape])
+
+    def tearDown(self):
+        self.canvas.resetState()
+
+    def move(self, x, y):
+        self.canvas.mouseMoveEvent(QMouseEvent(QEvent.MouseMove, QPointF(x, y),
+                                               Qt.NoButton, Qt.NoButton, Qt.NoModifier))
+
+    def key(self, key):
+        self.canvas.keyPressEvent(QKeyEvent(QEvent.KeyPress, key, Qt.NoModifier))
+
+    def test_moves_are_coalesced(self):
+        for x in range(10, 150, 5):
+            self.move(x, 150)
+        # Nothing is handled until the frame timer fires.
+        self.assertIsNone(self.canvas.hShape)
+        self.assertEqual(self.canvas.latency.events, 28)
+        self.assertTrue(self.waitFor(lambda: self.canvas.latency.updates))
+        self.assertEqual(self.canvas.latency.updates, 1)
+        # Only the last position counted: inside the box.
+        self.assertIs(self.canvas.hShape, self.shape)
+
+    def test_cursor_changes_only_on_transitions(self):
+        calls = []
+        original = QApplication.changeOverrideCursor
+
+        def spy(cursor):
+            calls.append(cursor)
+            original(cursor)
+        QApplication.changeOverrideCursor = staticmethod(spy)
+        try:
+            for x in (150, 151, 152, 153):
+                self.move(x, 150)
+                self.canvas.flushInput()
+            self.assertEqual(QApplication.overrideCursor().shape(), CURSOR_GRAB)
+            self.assertEqual(calls, [])
+            self.move(300, 250)
+            self.canvas.flushInput()
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(QApplication.overrideCursor().shape(), CURSOR_DEFAULT)
+        finally:
+            QApplication.changeOverrideCursor = original
+        # A single override was pushed, so one restore clears it.
+        self.canvas.restoreCursor()
+        self.assertIsNone(QApplication.overrideCursor())
+        self.canvas.restoreCursor()
+
+    def test_key_repeats_are_coalesced(self):
+        self.canvas.selectShape(self.shape)
+        moved = []
+        self.canvas.shapeMoved.connect(lambda: moved.append(1))
+        for _ in range(5):
+            self.key(Qt.Key_Right)
+        self.key(Qt.Key_Down)
+        self.assertEqual(self.shape.points[0], QPointF(100, 100))
+        self.assertTrue(self.waitFor(lambda: moved))
+        self.assertEqual(moved, [1])
+        self.assertEqual(self.shape.points[0], QPointF(105, 101))
+
+    def test_nudges_stop_at_the_border(self):
+        shape = makeShape(corners(390, 10, 398, 20))
+        self.canvas.loadShapes([shape])
+        self.canvas.selectShape(shape)
+        self.canvas.movePixels(['Right'] * 5 + ['Up'])
+        self.assertEqual(shape.points[0], QPointF(392, 9))
+
+    def test_other_input_flushes_first(self):
+        self.move(150, 150)
+        self.canvas.mousePressEvent(QMouseEvent(QEvent.MouseButtonPress, QPointF(150, 150),
+                                                Qt.LeftButton, Qt.LeftButton, Qt.NoModifier))
+        self.assertIsNone(self.canvas.pendingMove)
+        self.assertIs(self.canvas.selectedShape, self.shape)
+
+    def test_latency_counter(self):
+        counter = LatencyCounter(size=3)
+        self.assertEqual(counter.stats()['mean'], 0.0)
+        for ms in (4.0, 1.0, 2.0, 3.0):
+            counter.record(ms)
+        stats = counter.stats()
+        self.assertEqual(stats['frames'], 4)
+        self.assertEqual(stats['mean'], 2.0)
+        self.assertEqual(stats['max'], 3.0)
+        self.assertEqual(stats['p95'], 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+from unittest import TestCase
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.checkCache import CheckCache, checkKey
+
+URL = 'http://localhost:8000/'
+
+
+class TestCheckCache(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.image = os.path.join(self.tmpdir, 'a.jpg')
+        with open(self.image, 'wb') as f:
+            f.write(b'x' * 100)
+        self.cache = CheckCache(os.path.join(self.tmpdir, 'cache', 'check.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_key(self):
+        key = checkKey(URL, self.image, (10, 20, 50.2, 60), False, 'car')
+        self.assertEqual(key, checkKey(URL, self.image, (10, 20, 50, 60), False, 'car'))
+        self.assertNotEqual(key, checkKey(URL, self.image, (10, 20, 50, 61), False, 'car'))
+        self.assertNotEqual(key, checkKey(URL, self.image, (10, 20, 50, 60), True, 'car'))
+        self.assertNotEqual(key, checkKey(URL, self.image, (10, 20, 50, 60), False, 'bus'))
+        # Another server may answer differently.
+        self.assertNotEqual(key, checkKey('http://other:5000/check', self.image,
+                                          (10, 20, 50, 60), False, 'car'))
+        # An edited image no longer matches.
+        with open(self.image, 'ab') as f:
+            f.write(b'y')
+        self.assertNotEqual(key, checkKey(URL, self.image, (10, 20, 50, 60), False, 'car'))
+        self.assertIsNone(checkKey(URL, os.path.join(self.tmpdir, 'missing.jpg'),
+                                   (0, 0, 1, 1), False, 'car'))
+
+    def test_store_and_lookup(self):
+        self.assertEqual(self.cache.lookup(['a', None]), {})
+        self.cache.store([('a', [0.5, 0.5, 1, 0.5]), ('b', [0.1] * 8), (None, [1, 2, 3, 4])])
+        self.assertEqual(self.cache.lookup(['a', 'b', 'c']),
+                         {'a': [0.5, 0.5, 1, 0.5], 'b': [0.1] * 8})
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+        # Persistent: a new instance sees the same answers.
+        other = CheckCache(self.cache.dbPath)
+        self.assertEqual(other.lookup(['a']), {'a': [0.5, 0.5, 1, 0.5]})
+
+    def test_least_recently_used_are_evicted(self):
+        self.cache.maxEntries = 2
+        self.cache.store([('a', [1, 1, 1, 1])])
+        self.cache.store([('b', [2, 2, 2, 2])])
+        self.cache.lookup(['a'])
+        self.cache.store([('c', [3, 3, 3, 3])])
+        self.assertEqual(self.cache.count(), 2)
+        self.assertEqual(sorted(self.cache.lookup(['a', 'b', 'c'])), ['a', 'c'])
+
+    def test_model_version(self):
+        self.assertIsNone(self.cache.modelVersion())
+        self.cache.store([('a', [1, 1, 1, 1])])
+        self.cache.setModelVersion('v1')
+        self.assertEqual(self.cache.count(), 0)
+        self.cache.store([('a', [1, 1, 1, 1])])
+        self.cache.setModelVersion('v1')
+        self.assertEqual(self.cache.count(), 1)
+        self.cache.setModelVersion('v2')
+        self.assertEqual(self.cache.count(), 0)
+        self.assertEqual(CheckCache(self.cache.dbPath).modelVersion(), 'v2')
+        self.cache.store([('a', [1, 1, 1, 1])])
+        self.cache.clear()
+        self.assertEqual(self.cache.lookup(['a']), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
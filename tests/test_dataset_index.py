@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+from unittest import TestCase
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.datasetIndex import DatasetIndex
+
+
+class TestDatasetIndex(TestCase):
+
+    def test_reconcile(self):
+        root = tempfile.mkdtemp()
+        image = os.path.join(root, 'a.bmp')
+        shutil.copy(os.path.join(dir_name, 'test.bmp'), image)
+        with open(os.path.join(root, 'a.xml'), 'w') as f:
+            f.write('<annotation verified="yes"><object/><object/></annotation>')
+        index = DatasetIndex(root, dbPath=os.path.join(root, 'index.sqlite'))
+
+        self.assertEqual(index.reconcile([image]), (1, 0))
+        self.assertEqual(index.paths(), [image])
+        record = index.record(image)
+        self.assertEqual(record[3:5], (512, 512))
+        self.assertEqual(record[7:], (1, 2))
+        # Nothing changed on disk, so nothing is probed again.
+        self.assertEqual(index.reconcile([image]), (0, 0))
+        self.assertEqual(index.reconcile([]), (0, 1))
+        self.assertEqual(index.paths(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+from unittest import TestCase
+import unittest
+import os
+import sys
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.dirScanner import scanImages
+
+
+class TestDirScanner(TestCase):
+
+    def test_scan_images(self):
+        root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(root, 'sub', 'deeper'))
+        names = ['b.jpg', 'A.PNG', 'notes.txt', os.path.join('sub', 'c.bmp'),
+                 os.path.join('sub', 'deeper', 'a.jpeg')]
+        for name in names:
+            open(os.path.join(root, name), 'w').close()
+        expected = [os.path.join(root, name) for name in
+                    ['A.PNG', 'b.jpg', os.path.join('sub', 'c.bmp'),
+                     os.path.join('sub', 'deeper', 'a.jpeg')]]
+        self.assertEqual(scanImages(root), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
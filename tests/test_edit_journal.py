@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import libs.editJournal
+from libs.editJournal import EditJournal, SyncTask, applyEdits
+from libs.pascal_voc_io import PascalVocReader
+from labelImg import MainWindow
+from helpers import QtTestCase, corners, makeShape
+
+
+class TestEditJournal(QtTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'edits.journal')
+        self.image = os.path.join(self.tmpdir, 'a.png')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_replays_unsaved_edits(self):
+        journal = EditJournal(self.tmpdir, self.path)
+        car, bus = makeShape(corners(10, 10, 50, 40), 'car'), makeShape(corners(60, 10, 90, 40), 'bus')
+        journal.shapeChanged(self.image, 0, car)
+        journal.shapeChanged(self.image, 1, bus)
+        car.moveBy(QPointF(5, 0))
+        car.difficult = True
+        journal.shapeChanged(self.image, 0, car)
+        journal.shapeDeleted(self.image, 1)
+        journal.pool.waitForDone()
+        # Read back as after a crash, with the first journal still open.
+        edits = EditJournal(self.tmpdir, self.path).unsavedEdits(self.image)
+        self.assertEqual(len(edits), 4)
+        self.assertEqual(applyEdits([], edits),
+                         [('car', [(15, 10), (55, 10), (55, 40), (15, 40)], None, None,
+                           True, False, 0, False)])
+        # Edits apply to the shapes the annotation already has.
+        base = [('person', [(0, 0), (1, 0), (1, 1), (0, 1)], None, None, False, False, 0, False)]
+        self.assertEqual([s[0] for s in applyEdits(base, edits)], ['car'])
+        journal.close()
+
+    def test_loaded_shapes_replace_the_annotation(self):
+        journal = EditJournal(self.tmpdir, self.path)
+        journal.shapeChanged(self.image, 0, makeShape(corners(1, 1, 5, 5), 'car'))
+        journal.shapesLoaded(self.image, [makeShape(corners(1, 1, 5, 5), 'bus'), makeShape(corners(2, 2, 6, 6), 'truck')])
+        journal.shapeDeleted(self.image, 0)
+        journal.close()
+        edits = EditJournal(self.tmpdir, self.path).unsavedEdits(self.image)
+        base = [('person', [(0, 0), (1, 0), (1, 1), (0, 1)], None, None, False, False, 0, False)]
+        self.assertEqual(applyEdits(base, edits),
+                         [('truck', [(2, 2), (6, 2), (6, 6), (2, 6)], None, None,
+                           False, False, 0, False)])
+
+    def test_saved_and_discarded_edits_are_dropped(self):
+        journal = EditJournal(self.tmpdir, self.path)
+        other = os.path.join(self.tmpdir, 'b.png')
+        journal.shapeChanged(self.image, 0, makeShape(corners(1, 1, 5, 5), 'car'))
+        upTo = journal.seq
+        journal.shapeChanged(self.image, 1, makeShape(corners(1, 1, 5, 5), 'bus'))
+        journal.shapeChanged(other, 0, makeShape(corners(1, 1, 5, 5), 'car'))
+        journal.saved(self.image, upTo)
+        self.assertEqual([edit[3] for edit in journal.unsavedEdits(self.image)], [1])
+        journal.discard(other)
+        reopened = EditJournal(self.tmpdir, self.path)
+        self.assertEqual(reopened.unsavedImages(), [self.image])
+        reopened.close()
+        # Once everything is saved the file is emptied.
+        journal.saved(self.image, journal.seq)
+        self.assertEqual(journal.unsavedImages(), [])
+        self.assertEqual(os.path.getsize(self.path), 0)
+        journal.close()
+
+    def test_save_started_is_found_by_fingerprint(self):
+        journal = EditJournal(self.tmpdir, self.path)
+        self.assertEqual(journal.saving(self.image, 'abc'), 0)
+        journal.shapeDeleted(self.image, 0)
+        upTo = journal.saving(self.image, 'abc')
+        journal.shapeDeleted(self.image, 0)
+        journal.close()
+        reopened = EditJournal(self.tmpdir, self.path)
+        self.assertEqual(len(reopened.unsavedEdits(self.image)), 2)
+        self.assertEqual(reopened.savedUpTo(self.image, 'abc'), upTo)
+        self.assertEqual(reopened.savedUpTo(self.image, 'def'), 0)
+        reopened.saved(self.image, upTo)
+        self.assertEqual([edit[0] for edit in reopened.unsavedEdits(self.image)], [upTo + 1])
+        reopened.close()
+
+    def test_torn_last_record(self):
+        journal = EditJournal(self.tmpdir, self.path)
+        journal.shapeChanged(self.image, 0, makeShape(corners(1, 1, 5, 5), 'car'))
+        journal.close()
+        with open(self.path, 'ab') as f:
+            f.write(b'[2,"s","')
+        journal = EditJournal(self.tmpdir, self.path)
+        self.assertEqual(len(journal.unsavedEdits(self.image)), 1)
+        journal.shapeDeleted(self.image, 0)
+        journal.close()
+        edits = EditJournal(self.tmpdir, self.path).unsavedEdits(self.image)
+        self.assertEqual(applyEdits([], edits), [])
+        self.assertEqual(len(edits), 2)
+
+    def test_appends_share_fsyncs(self):
+        journal = EditJournal(self.tmpdir, self.path)
+        car = makeShape(corners(10, 10, 50, 40), 'car')
+        for i in range(200):
+            journal.shapeChanged(self.image, 0, car)
+        self.assertEqual(journal.syncs, 0)
+        self.waitFor(lambda: journal.syncs)
+        journal.pool.waitForDone()
+        stats = journal.stats()
+        self.assertEqual((stats['appends'], stats['syncs']), (200, 1))
+        journal.close()
+
+    def test_sync_failures_are_reported(self):
+        journal = EditJournal(self.tmpdir, self.path)
+        journal.shapeChanged(self.image, 0, makeShape(corners(1, 1, 5, 5), 'car'))
+        journal.timer.stop()
+        errors = []
+        journal.syncFailed.connect(errors.append)
+        fd, pipe = journal.fd, os.pipe()
+        # fsync refuses a pipe.
+        journal.fd = pipe[1]
+        try:
+            SyncTask(journal).run()
+        finally:
+            journal.fd = fd
+            os.close(pipe[0])
+            os.close(pipe[1])
+        self.assertEqual(len(errors), 1)
+        stats = journal.stats()
+        self.assertEqual((stats['syncs'], stats['syncFailures']), (0, 1))
+        journal.close()
+
+    def test_window_recovers_edits(self):
+        image = QImage(200, 100, QImage.Format_RGB32)
+        image.fill(QColor(0, 0, 0))
+        image.save(self.image)
+        journalDir = libs.editJournal.JOURNAL_DIR
+        libs.editJournal.JOURNAL_DIR = self.tmpdir
+        classes = os.path.join(dir_name, '..', 'data', 'predefined_classes.txt')
+        try:
+            win = MainWindow(None, classes)
+            win.defaultSaveDir = self.tmpdir
+            win.openEditJournal(self.tmpdir)
+            win.loadFile(self.image)
+            win.loadLabels([('car', [(10, 20), (50, 20), (50, 60), (10, 60)],
+                             None, None, False, False, 0, False)])
+            win.journalShape(win.canvas.shapes[0])
+            win.canvas.selectShape(win.canvas.shapes[0])
+            win.canvas.moveOnePixel('Right')
+            # Gone without saving or discarding, as in a crash.
+            win.dirty = False
+            win.close()
+
+            win = MainWindow(None, classes)
+            win.defaultSaveDir = self.tmpdir
+            win.openEditJournal(self.tmpdir)
+            self.assertEqual(win.recoveredNote(), ', unsaved edits recovered for 1 images')
+            win.loadFile(self.image)
+            self.assertTrue(win.dirty)
+            self.assertEqual([(p.x(), p.y()) for p in win.canvas.shapes[0].points],
+                             [(11, 20), (51, 20), (51, 60), (11, 60)])
+            win.saveFile()
+            win.flushSaves()
+            self.assertEqual(win.editJournal.unsavedImages(), [])
+            shapes = PascalVocReader(os.path.join(self.tmpdir, 'a.xml')).getShapes()
+            self.assertEqual(shapes[0].points[0], (11, 20))
+            win.close()
+        finally:
+            libs.editJournal.JOURNAL_DIR = journalDir
+
+    def test_window_does_not_replay_written_save(self):
+        image = QImage(200, 100, QImage.Format_RGB32)
+        image.fill(QColor(0, 0, 0))
+        image.save(self.image)
+        journalDir = libs.editJournal.JOURNAL_DIR
+        libs.editJournal.JOURNAL_DIR = self.tmpdir
+        classes = os.path.join(dir_name, '..', 'data', 'predefined_classes.txt')
+        try:
+            win = MainWindow(None, classes)
+            win.defaultSaveDir = self.tmpdir
+            win.labelHist.append('car')
+            win.openEditJournal(self.tmpdir)
+            win.loadFile(self.image)
+            win.loadLabels([('car', [(10, 20), (50, 20), (50, 60), (10, 60)],
+                             None, None, False, False, 0, False),
+                            ('car', [(60, 20), (90, 20), (90, 60), (60, 60)],
+                             None, None, False, False, 0, False)])
+            for shape in win.canvas.shapes:
+                win.journalShape(shape)
+            win.canvas.selectShape(win.canvas.shapes[0])
+            win.deleteSelectedShape()
+            win.saveFile()
+            win.saveQueue.startWrites()
+            win.saveQueue.pool.waitForDone()
+            # The annotation is written but the program dies before
+            # hearing so.
+            win.saveQueue.saved.disconnect(win.annotationSaved)
+            win.dirty = False
+            win.close()
+
+            win = MainWindow(None, classes)
+            win.defaultSaveDir = self.tmpdir
+            win.openEditJournal(self.tmpdir)
+            win.loadFile(self.image)
+            self.assertFalse(win.dirty)
+            self.assertEqual([(p.x(), p.y()) for p in win.canvas.shapes[0].points],
+                             [(60, 20), (90, 20), (90, 60), (60, 60)])
+            self.assertEqual(win.editJournal.unsavedImages(), [])
+            win.close()
+        finally:
+            libs.editJournal.JOURNAL_DIR = journalDir
+
+
+if __name__ == '__main__':
+    unittest.main()
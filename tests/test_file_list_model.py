@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+from unittest import TestCase
+import unittest
+import os
+import sys
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.fileListModel import FileListModel
+
+
+class TestFileListModel(TestCase):
+
+    def test_rows(self):
+        model = FileListModel()
+        model.setPaths(['/a.jpg', '/b.jpg'])
+        model.appendPaths(['/c.jpg'])
+        self.assertEqual(model.rowCount(), 3)
+        self.assertEqual(model.rowOf('/c.jpg'), 2)
+        self.assertEqual(model.rowOf('/missing.jpg'), -1)
+        self.assertEqual(model[1], '/b.jpg')
+        self.assertTrue('/a.jpg' in model)
+        self.assertEqual(model.data(model.index(2)), '/c.jpg')
+        model.clear()
+        self.assertEqual(len(model), 0)
+        self.assertEqual(model.rowOf('/a.jpg'), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+from unittest import TestCase
+import unittest
+import os
+import sys
+
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs import geometry
+from libs.shape import Shape
+from helpers import makeShape
+
+try:
+    from PyQt5.QtCore import QPointF
+except ImportError:
+    from PyQt4.QtCore import QPointF
+
+
+class TestGeometry(TestCase):
+
+    def setUp(self):
+        self.shapes = [makeShape([(10, 20), (50, 20), (50, 80), (10, 80)]),
+                       makeShape([(-5, 0), (30, 0), (30, 40), (-5, 40)])]
+
+    def test_rotatePoints_matches_rotatePoint(self):
+        shape = self.shapes[0]
+        center = QPointF(30, 50)
+        expected = [Shape.rotatePoint(shape, center, p, 37) for p in shape.points]
+        self.assertEqual(geometry.rotatePoints(shape.points, center, 37), expected)
+        np.testing.assert_allclose(geometry.toArray(expected),
+                                   [(p.x(), p.y()) for p in expected])
+
+    def test_pointBounds(self):
+        self.assertEqual(geometry.pointBounds(self.shapes[0].points), [10, 20, 50, 80])
+        self.assertEqual(geometry.pointBounds(self.shapes[1].points), [-5, 0, 30, 40])
+
+
+if __name__ == '__main__':
+    unittest.main()
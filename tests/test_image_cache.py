@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+from unittest import TestCase
+import os
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.imageCache import ImageCache
+
+
+class TestImageCache(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.tmpdir, '%d.jpg' % i)
+            with open(path, 'wb') as f:
+                f.write(b'x' * 100)
+            self.paths.append(path)
+
+    def test_lru_eviction(self):
+        cache = ImageCache(maxBytes=250)
+        cache.put(self.paths[0], b'x' * 100, None)
+        cache.put(self.paths[1], b'x' * 100, None)
+        self.assertIsNotNone(cache.get(self.paths[0]))
+        cache.put(self.paths[2], b'x' * 100, None)
+        # paths[1] was the least recently used one.
+        self.assertIsNone(cache.get(self.paths[1]))
+        self.assertIsNotNone(cache.get(self.paths[0]))
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['bytes'], 200)
+
+    def test_invalidated_on_change(self):
+        cache = ImageCache()
+        cache.put(self.paths[0], b'x' * 100, None)
+        with open(self.paths[0], 'wb') as f:
+            f.write(b'y' * 50)
+        self.assertIsNone(cache.get(self.paths[0]))
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.imageLoader import ImageLoader, previewFactor, readPreview
+from libs.canvas import Canvas
+from libs.shape import Shape
+from helpers import QtTestCase
+
+
+class TestImageLoader(QtTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        image = QImage(3000, 2000, QImage.Format_RGB32)
+        image.fill(QColor(10, 200, 30))
+        self.jpg = os.path.join(self.tmp, 'photo.jpg')
+        self.png = os.path.join(self.tmp, 'photo.png')
+        image.save(self.jpg, 'JPG', 90)
+        image.save(self.png)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_preview_factor(self):
+        self.assertEqual(previewFactor(self.jpg, QSizeF(800, 600)), (2, QSize(3000, 2000)))
+        self.assertEqual(previewFactor(self.jpg, QSizeF(700, 600))[0], 4)
+        self.assertEqual(previewFactor(self.jpg, QSizeF(80, 60))[0], 8)
+        # At a pixel ratio of 2 the fitted image needs twice the pixels.
+        self.assertEqual(previewFactor(self.jpg, QSizeF(700, 600), 2.0)[0], 2)
+        self.assertEqual(previewFactor(self.jpg, QSizeF(3000, 2000))[0], 1)
+        # Other formats decode in full before scaling.
+        self.assertEqual(previewFactor(self.png, QSizeF(80, 60)), (1, QSize(3000, 2000)))
+
+    def test_read_preview(self):
+        image = readPreview(self.jpg, 4)
+        self.assertEqual((image.width(), image.height()), (750, 500))
+
+    def test_loader(self):
+        loader = ImageLoader()
+        records = []
+        loader.loaded.connect(lambda generation, record: records.append((generation, record)))
+        stale = loader.load(self.png)
+        generation = loader.load(self.jpg)
+        self.assertNotEqual(stale, generation)
+        self.assertTrue(self.waitFor(lambda: records))
+        loader.pool.waitForDone()
+        self.app.processEvents()
+        self.assertEqual([g for g, _ in records], [generation])
+        record = records[0][1]
+        self.assertEqual(record.path, self.jpg)
+        self.assertEqual(record.image.size(), QSize(3000, 2000))
+        self.assertEqual(len(record.imageData), os.path.getsize(self.jpg))
+
+    def test_canvas_preview(self):
+        canvas = Canvas()
+        preview = readPreview(self.jpg, 4)
+        canvas.loadPreview(QPixmap.fromImage(preview), QSize(3000, 2000))
+        self.assertEqual(canvas.imageSize(), QSize(3000, 2000))
+        self.assertTrue(canvas.outOfPixmap(QPointF(3001, 10)))
+        self.assertFalse(canvas.outOfPixmap(QPointF(2900, 1900)))
+
+        shape = Shape(label='box')
+        for x, y in ((2000, 1000), (2900, 1000), (2900, 1900), (2000, 1900)):
+            shape.addPoint(QPointF(x, y))
+        shape.close()
+        canvas.loadShapes([shape])
+
+        canvas.scale = 0.25
+        self.assertFalse(canvas.previewTooSmall())
+        canvas.scale = 0.3
+        self.assertTrue(canvas.previewTooSmall())
+
+        full = QImage(3000, 2000, QImage.Format_RGB32)
+        canvas.upgradePixmap(QPixmap.fromImage(full), full)
+        self.assertFalse(canvas.previewTooSmall())
+        self.assertEqual(canvas.imageSize(), QSize(3000, 2000))
+        self.assertEqual(canvas.shapes, [shape])
+        self.assertEqual(shape.points[2], QPointF(2900, 1900))
+
+
+if __name__ == '__main__':
+    unittest.main()
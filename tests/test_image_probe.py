@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import unittest
+import os
+import sys
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.imageProbe import probeHeader, ImageProbeError
+
+
+class TestImageProbe(TestCase):
+
+    def test_bmp(self):
+        self.assertEqual(probeHeader(os.path.join(dir_name, 'test.bmp')), (512, 512, 3))
+
+    def test_jpeg(self):
+        path = os.path.join(dir_name, u'臉書.jpg')
+        self.assertEqual(probeHeader(path), (33, 32, 3))
+
+    def test_unsupported(self):
+        with self.assertRaises(ImageProbeError):
+            probeHeader(os.path.join(dir_name, 'test_image_probe.py'))
+
+
+if __name__ == '__main__':
+    unittest.main()
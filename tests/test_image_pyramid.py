@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+import unittest
+import os
+import sys
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.imagePyramid import ImagePyramid
+from helpers import QtTestCase
+
+
+class TestImagePyramid(QtTestCase):
+
+    def test_wanted_factor(self):
+        self.assertEqual(ImagePyramid.wantedFactor(2.0), 1)
+        self.assertEqual(ImagePyramid.wantedFactor(0.6), 1)
+        self.assertEqual(ImagePyramid.wantedFactor(0.5), 2)
+        self.assertEqual(ImagePyramid.wantedFactor(0.2), 4)
+
+    def test_levels(self):
+        image = QImage(2001, 1000, QImage.Format_RGB32)
+        image.fill(QColor(10, 200, 30))
+        pixmap = QPixmap.fromImage(image)
+        pyramid = ImagePyramid()
+        pyramid.reset(pixmap, image)
+
+        # Nothing is built for zooms that need the full image.
+        self.assertEqual(pyramid.level(1.0), (1, pixmap))
+        self.assertFalse(pyramid.building)
+
+        # Until the right level is ready, the full image is used.
+        factor, level = pyramid.level(0.2)
+        self.assertTrue(pyramid.building)
+        self.assertTrue(self.waitFor(lambda: 4 in pyramid.levels))
+        factor, level = pyramid.level(0.2)
+        self.assertEqual(factor, 4)
+        self.assertEqual((level.width(), level.height()), (500, 250))
+        self.assertEqual(pyramid.level(0.3)[0], 2)
+        self.assertEqual(sorted(pyramid.levels), [2, 4])
+
+        pyramid.reset(QPixmap.fromImage(image))
+        self.assertEqual(pyramid.levels, {})
+        pyramid.pool.waitForDone()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+from libs.labelChecker import LabelChecker, CheckJob, encodeCrop, parseResponse, \
+    parseBatchResponse, PLACEHOLDER_BOX, PLACEHOLDER_TETRAGON
+from libs.checkCache import CheckCache
+from helpers import QtTestCase
+from check_server import CheckServer, TETRAGON_REPLY
+
+
+class TestLabelChecker(QtTestCase):
+
+    def setUp(self):
+        self.server = CheckServer()
+        self.url = self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def job(self, name, tetragon=False, key=None):
+        crop = QImage(40, 30, QImage.Format_RGB32)
+        crop.fill(QColor(10, 200, 30))
+        return CheckJob(object(), 'car', crop, (10, 20, 50, 50), tetragon, name, 'PNG', key)
+
+    def test_encode_crop(self):
+        data = encodeCrop(self.job('a.png').crop, 'PNG')
+        image = QImage.fromData(data)
+        self.assertEqual((image.width(), image.height()), (40, 30))
+
+    def test_parse_response(self):
+        self.assertEqual(parseResponse(b'[0.1, 0.2, 0.3, 0.4]', False),
+                         ([0.1, 0.2, 0.3, 0.4], True))
+        # Bodies without coordinates keep the old placeholder answers.
+        self.assertEqual(parseResponse(b'OK', False), (PLACEHOLDER_BOX, False))
+        self.assertEqual(parseResponse(b'[1, 2]', True), (PLACEHOLDER_TETRAGON, False))
+        # A real answer that happens to equal the placeholder is still one.
+        self.assertEqual(parseResponse(b'[0.5, 0.5, 1, 0.5]', False), (PLACEHOLDER_BOX, True))
+
+    def test_parse_batch_response(self):
+        jobs = [self.job('a.png'), self.job('b.png', tetragon=True)]
+        self.assertEqual(parseBatchResponse(b'[[0.1, 0.2, 0.3, 0.4], null]', jobs),
+                         [([0.1, 0.2, 0.3, 0.4], True), (PLACEHOLDER_TETRAGON, False)])
+        # A single answer, or one of the wrong length, is not a batch answer.
+        self.assertIsNone(parseBatchResponse(b'[0.1, 0.2, 0.3, 0.4]', jobs))
+        self.assertIsNone(parseBatchResponse(b'[[0.1, 0.2, 0.3, 0.4]]', jobs))
+        self.assertIsNone(parseBatchResponse(b'OK', jobs))
+
+    def runChecks(self, checker, jobs):
+        checked, failed = [], []
+        checker.checked.connect(lambda job, values: checked.append((job.name, values)))
+        checker.failed.connect(lambda job, error: failed.append(job.name))
+        finished = []
+        checker.finished.connect(lambda: finished.append(1))
+        checker.check(self.url, jobs)
+        self.assertTrue(self.waitFor(lambda: finished))
+        checker.pool.waitForDone()
+        return dict(checked), failed
+
+    def test_batches(self):
+        checker = LabelChecker(workers=2, batchSize=4)
+        jobs = [self.job('car %d.png' % i) for i in range(9)] + [self.job('t.png', tetragon=True)]
+        checked, failed = self.runChecks(checker, jobs)
+        self.assertEqual(failed, [])
+        self.assertEqual(len(checked), 10)
+        self.assertEqual(checked['car 3.png'], [0.5, 0.5, 0.8, 0.6])
+        self.assertEqual(checked['t.png'], TETRAGON_REPLY)
+        self.assertEqual(self.server.requests, 3)
+        self.assertTrue(checker.batching)
+
+    def test_falls_back_to_single_crops(self):
+        self.server.batching = False
+        checker = LabelChecker(workers=2, batchSize=4)
+        jobs = [self.job('car %d.png' % i) for i in range(6)]
+        checked, failed = self.runChecks(checker, jobs)
+        self.assertEqual(failed, [])
+        self.assertEqual(len(checked), 6)
+        self.assertFalse(checker.batching)
+        # One or two refused batches, then one request per crop.
+        self.assertIn(self.server.requests, (1 + 6, 2 + 6))
+        self.server.requests = 0
+        self.runChecks(checker, [self.job('car.png'), self.job('bus.png')])
+        self.assertEqual(self.server.requests, 2)
+
+    def test_cached_answers_skip_the_server(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = CheckCache(os.path.join(tmpdir, 'check.sqlite'))
+            checker = LabelChecker(workers=2, cache=cache)
+            jobs = [self.job('car %d.png' % i, key='k%d' % i) for i in range(4)]
+            checked, _ = self.runChecks(checker, jobs)
+            self.assertEqual(self.server.requests, 2)
+            self.assertEqual(cache.count(), 4)
+
+            # Answered at once, with no request.
+            self.server.requests = 0
+            self.server.reply = [0.1, 0.1, 0.1, 0.1]
+            hits = []
+            checker = LabelChecker(workers=2, cache=cache)
+            checker.checked.connect(lambda job, values: hits.append((job.name, values)))
+            checker.check(self.url, jobs[:3] + [self.job('new.png', key='k9')])
+            self.assertEqual(sorted(hits)[0], ('car 0.png', [0.5, 0.5, 0.8, 0.6]))
+            self.assertEqual(len(hits), 3)
+            self.assertTrue(self.waitFor(lambda: len(hits) == 4))
+            checker.pool.waitForDone()
+            self.assertEqual(self.server.requests, 1)
+            self.assertEqual(cache.count(), 5)
+
+            # A new model version empties the cache.
+            self.server.modelVersion = 'v2'
+            self.runChecks(checker, [self.job('other.png', key='k10')])
+            self.assertEqual(cache.modelVersion(), 'v2')
+            self.assertEqual(cache.count(), 1)
+
+            # Placeholders for bodies that are not coordinates are not kept.
+            self.server.reply = 'OK'
+            checked, _ = self.runChecks(checker, [self.job('odd.png', key='k11')])
+            self.assertEqual(checked['odd.png'], [0.5, 0.5, 1, 0.5])
+            self.assertEqual(cache.count(), 1)
+            self.server.reply = [0.5, 0.5, 1, 0.5]
+            self.runChecks(checker, [self.job('real.png', key='k12')])
+            self.assertEqual(cache.count(), 2)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_cache_errors_are_reported(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            # A folder where the database should be: every query fails.
+            checker = LabelChecker(workers=2, cache=CheckCache(tmpdir))
+            errors = []
+            checker.cacheFailed.connect(errors.append)
+            checked, _ = self.runChecks(checker, [self.job('car.png', key='k1')])
+            self.assertEqual(list(checked), ['car.png'])
+            self.assertEqual(len(errors), 2)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_results_stream_back(self):
+        cwd = os.getcwd()
+        checker = LabelChecker(workers=3, batchSize=1)
+        checked, failed, progress, finished = [], [], [], []
+        checker.checked.connect(lambda job, values: checked.append((job.name, values)))
+        checker.failed.connect(lambda job, error: failed.append((job.name, error.status_code)))
+        checker.progress.connect(lambda done, total: progress.append((done, total)))
+        checker.finished.connect(lambda: finished.append(checker.done))
+        jobs = [self.job('car %d.png' % i) for i in range(8)] + [self.job('bad.png')]
+        checker.check(self.url, jobs)
+        self.assertTrue(self.waitFor(lambda: finished))
+        self.assertEqual(finished, [9])
+        self.assertEqual(len(checked), 8)
+        self.assertEqual(checked[0][1], [0.5, 0.5, 0.8, 0.6])
+        self.assertEqual(failed, [('bad.png', 500)])
+        self.assertEqual(progress[0], (0, 9))
+        self.assertEqual(progress[-1], (9, 9))
+        self.assertEqual(sorted(name for name, _ in self.server.uploads),
+                         sorted(job.name for job in jobs))
+        self.assertEqual(QImage.fromData(self.server.uploads[0][1]).width(), 40)
+        # Each worker reuses a pooled connection.
+        self.assertLessEqual(len(self.server.connections), 3)
+        self.assertEqual(os.getcwd(), cwd)
+        checker.pool.waitForDone()
+
+    def test_requests_run_concurrently(self):
+        self.server.latency = 0.2
+        checker = LabelChecker(workers=4, batchSize=1)
+        finished = []
+        checker.finished.connect(lambda: finished.append(1))
+        start = time.time()
+        checker.check(self.url, [self.job('car %d.png' % i) for i in range(4)])
+        self.assertTrue(self.waitFor(lambda: finished))
+        self.assertLess(time.time() - start, 0.6)
+        checker.pool.waitForDone()
+
+    def test_timeout_and_cancel(self):
+        self.server.latency = 0.5
+        checker = LabelChecker(workers=1, timeout=0.1)
+        failed = []
+        checker.failed.connect(lambda job, error: failed.append(error))
+        checker.check(self.url, [self.job('slow.png')])
+        self.assertTrue(self.waitFor(lambda: failed))
+        self.assertIsInstance(failed[0], Exception)
+
+        checked = []
+        checker.checked.connect(lambda job, values: checked.append(job))
+        checker.check(self.url, [self.job('car.png')])
+        checker.cancel()
+        self.assertFalse(checker.busy())
+        checker.pool.waitForDone()
+        self.app.processEvents()
+        self.assertEqual(checked, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import libs.saveQueue
+from libs.saveQueue import SaveQueue, SaveRecord
+from libs.labelFile import LabelFile
+from libs.pascal_voc_io import PascalVocReader
+from labelImg import MainWindow
+from helpers import QtTestCase
+
+
+def box(label, x1, y1, x2, y2):
+    return dict(label=label, line_color=None, fill_color=None,
+                points=[(x1, y1), (x2, y1), (x2, y2), (x1, y2)],
+                difficult=False, tetragon=False, deg=0, shape3D=False)
+
+
+class TestSaveQueue(QtTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.imagePath = os.path.join(self.tmpdir, 'a.png')
+        image = QImage(200, 100, QImage.Format_RGB32)
+        image.fill(QColor(0, 0, 0))
+        image.save(self.imagePath)
+        self.queue = SaveQueue()
+
+    def tearDown(self):
+        self.queue.flush()
+        libs.saveQueue.writeRecord = self.writeRecord
+        shutil.rmtree(self.tmpdir)
+
+    writeRecord = staticmethod(libs.saveQueue.writeRecord)
+
+    def record(self, name, *shapes, **kwargs):
+        text = LabelFile.darknetText(QSize(200, 100), shapes, ['car', 'bus'])
+        return SaveRecord(os.path.join(kwargs.get('folder', self.tmpdir), name), self.imagePath,
+                          kwargs.get('xml', tuple(shapes)), False, kwargs.get('darknet', text),
+                          None, None, 0)
+
+    def test_writes_in_the_background(self):
+        saved = []
+        self.queue.saved.connect(saved.append)
+        record = self.record('a.xml', box('bus', 10, 20, 50, 60))
+        self.queue.submit(record)
+        # Nothing is written until the event loop has run for a while.
+        self.assertFalse(os.path.exists(record.annotationPath))
+        self.assertTrue(self.waitFor(lambda: saved))
+        self.assertIs(saved[0], record)
+        shapes = PascalVocReader(record.annotationPath).getShapes()
+        self.assertEqual(shapes[0].label, 'bus')
+        with open(os.path.join(self.tmpdir, 'a.txt')) as f:
+            self.assertTrue(f.read().startswith('1 '))
+        # Written through temporary files that were renamed into place.
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['a.png', 'a.txt', 'a.xml'])
+        self.assertFalse(self.queue.busy())
+        self.assertTrue(self.queue.takeWritten(record.annotationPath))
+        self.assertFalse(self.queue.takeWritten(record.annotationPath))
+
+    def test_repeated_saves_are_coalesced(self):
+        release = threading.Event()
+        written = []
+
+        def slowWrite(record):
+            if record.annotationPath.endswith('first.xml'):
+                release.wait(5)
+            written.append(record)
+            self.writeRecord(record)
+        libs.saveQueue.writeRecord = slowWrite
+        self.queue.submit(self.record('first.xml'))
+        for x in (10, 20, 30):
+            self.queue.submit(self.record('b.xml', box('car', x, 10, 100, 90)))
+        self.assertTrue(self.queue.isQueued(os.path.join(self.tmpdir, 'b.xml')))
+        release.set()
+        self.assertEqual(self.queue.flush(), [])
+        self.assertEqual([os.path.basename(r.annotationPath) for r in written],
+                         ['first.xml', 'b.xml'])
+        shapes = PascalVocReader(os.path.join(self.tmpdir, 'b.xml')).getShapes()
+        self.assertEqual(shapes[0].points[0], (30, 10))
+        stats = self.queue.stats()
+        self.assertEqual((stats['submits'], stats['writes'], stats['coalesced'], stats['queued']),
+                         (4, 2, 2, 0))
+
+    def test_unchanged_files_are_not_written(self):
+        saved = []
+        self.queue.saved.connect(saved.append)
+        self.queue.submit(self.record('a.xml', box('car', 10, 20, 50, 60), darknet=None))
+        self.queue.submit(self.record('b.xml', xml=None, darknet=None))
+        self.queue.flush()
+        self.app.processEvents()
+        self.assertEqual(len(saved), 1)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['a.png', 'a.xml'])
+        # A waiting record still gets written for the file a later one leaves alone.
+        self.queue.submit(self.record('c.xml', box('car', 1, 1, 5, 5)))
+        self.queue.submit(self.record('c.xml', box('bus', 1, 1, 5, 5), darknet=None))
+        self.queue.flush()
+        with open(os.path.join(self.tmpdir, 'a.txt')) as f:
+            self.assertTrue(f.read().startswith('0 '))
+        self.assertEqual(PascalVocReader(os.path.join(self.tmpdir, 'c.xml')).getShapes()[0].label,
+                         'bus')
+        stats = self.queue.stats()
+        self.assertEqual((stats['xmlWrites'], stats['darknetWrites']), (2, 1))
+        self.assertEqual((stats['xmlSkipped'], stats['darknetSkipped']), (1, 3))
+
+    def test_fingerprint(self):
+        shapes = [box('car', 10, 20, 50, 60), box('bus', 1, 1, 5, 5)]
+        fingerprint = LabelFile.shapesFingerprint(shapes, False)
+        self.assertEqual(LabelFile.shapesFingerprint([dict(s) for s in shapes], False),
+                         fingerprint)
+        self.assertNotEqual(LabelFile.shapesFingerprint(shapes, True), fingerprint)
+        self.assertNotEqual(LabelFile.shapesFingerprint(shapes[::-1], False), fingerprint)
+        shapes[0]['deg'] = 5
+        self.assertNotEqual(LabelFile.shapesFingerprint(shapes, False), fingerprint)
+
+    def test_window_skips_unchanged_saves(self):
+        win = MainWindow(None, os.path.join(dir_name, '..', 'data', 'predefined_classes.txt'))
+        try:
+            win.defaultSaveDir = self.tmpdir
+            win.labelHist = ['bus', 'car']
+            win.loadFile(self.imagePath)
+            win.loadLabels([('car', [(10, 20), (50, 20), (50, 60), (10, 60)],
+                             None, None, False, False, 0, False)])
+            win.setDirty()
+            win.saveFile()
+            win.flushSaves()
+
+            def writes():
+                stats = win.saveQueue.stats()
+                return stats['xmlWrites'], stats['darknetWrites']
+            self.assertEqual(writes(), (1, 1))
+            win.saveFile()
+            win.flushSaves()
+            self.assertEqual(writes(), (1, 1))
+            # Only the Pascal VOC file records the verified mark.
+            win.verifyImg()
+            win.flushSaves()
+            self.assertEqual(writes(), (2, 1))
+            # The fingerprints of a loaded image match its files.
+            win.loadFile(self.imagePath)
+            win.saveFile()
+            win.flushSaves()
+            self.assertEqual(writes(), (2, 1))
+            # Only the Darknet file numbers the labels.
+            win.labelHist = ['car', 'bus']
+            win.saveFile()
+            win.flushSaves()
+            self.assertEqual(writes(), (2, 2))
+            with open(os.path.join(self.tmpdir, 'a.txt')) as f:
+                self.assertTrue(f.read().startswith('0 '))
+        finally:
+            win.close()
+
+    def test_failures_are_reported(self):
+        failed = []
+        self.queue.failed.connect(lambda record, error: failed.append((record, error)))
+        missing = os.path.join(self.tmpdir, 'missing')
+        record = self.record('a.xml', box('car', 1, 1, 5, 5), folder=missing)
+        self.queue.submit(record)
+        self.assertTrue(self.waitFor(lambda: failed))
+        self.assertIs(failed[0][0], record)
+        self.assertIsInstance(failed[0][1], OSError)
+        # Not reported twice, and flush() returns what has not been.
+        self.assertEqual(self.queue.flush(), [])
+        self.queue.submit(record)
+        failures = self.queue.flush()
+        self.assertEqual(len(failures), 1)
+        self.app.processEvents()
+        self.assertEqual(len(failed), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+from unittest import TestCase
+import unittest
+import os
+import sys
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.geometry import convexHull
+from helpers import makeShape
+
+try:
+    from PyQt5.QtCore import QPointF, QRectF
+except ImportError:
+    from PyQt4.QtCore import QPointF, QRectF
+
+
+class TestShapePerimeter(TestCase):
+
+    def test_convex_hull(self):
+        box3D = [(0, 0), (10, 0), (10, 10), (0, 10), (2, 2), (12, 2), (12, 12), (2, 12)]
+        self.assertEqual(sorted(convexHull(box3D)), [0, 1, 3, 5, 6, 7])
+        self.assertEqual(sorted(convexHull([(0, 0), (5, 5), (10, 10)])), [0, 2])
+        self.assertEqual(convexHull([(1, 1)]), [0])
+
+    def test_cached_until_points_change(self):
+        shape = makeShape([(10, 10), (50, 10), (50, 40), (10, 40)])
+        path = shape.makePerimeter()
+        self.assertIs(shape.makePerimeter(), path)
+        self.assertEqual(shape.boundingRect(), QRectF(10, 10, 40, 30))
+        self.assertTrue(shape.containsPoint(QPointF(20, 20)))
+
+        shape.moveBy(QPointF(100, 0))
+        self.assertFalse(shape.containsPoint(QPointF(20, 20)))
+        self.assertTrue(shape.containsPoint(QPointF(120, 20)))
+
+        shape.moveVertexBy(2, QPointF(10, 10))
+        self.assertEqual(shape.boundingRect(), QRectF(110, 10, 50, 40))
+
+        shape[0] = QPointF(0, 0)
+        self.assertEqual(shape.boundingRect().topLeft(), QPointF(0, 0))
+
+        shape.points = [QPointF(0, 0), QPointF(5, 0), QPointF(5, 5), QPointF(0, 5)]
+        self.assertEqual(shape.boundingRect(), QRectF(0, 0, 5, 5))
+
+    def test_degenerate_shape(self):
+        shape = makeShape([(10, 10), (10, 10), (10, 10), (10, 10)])
+        self.assertFalse(shape.containsPoint(QPointF(10, 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+from unittest import TestCase
+import unittest
+import os
+import sys
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.shapeIndex import ShapeIndex
+from helpers import corners, makeShape
+
+try:
+    from PyQt5.QtCore import QPointF
+except ImportError:
+    from PyQt4.QtCore import QPointF
+
+
+class TestShapeIndex(TestCase):
+
+    def test_candidates_topmost_first(self):
+        bottom, top, far = makeShape(corners(0, 100, 300, 400)), makeShape(corners(100, 150, 150, 200)), makeShape(corners(1000, 1000, 1020, 1020))
+        index = ShapeIndex(margin=5)
+        index.rebuild([bottom, top, far])
+        self.assertEqual(index.candidates(QPointF(120, 170)), [top, bottom])
+        self.assertEqual(index.candidates(QPointF(250, 350)), [bottom])
+        self.assertEqual(index.candidates(QPointF(1022, 1022)), [far])
+        self.assertEqual(index.candidates(QPointF(600, 600)), [])
+        # The rotation handle sits 50 pixels above the shape.
+        self.assertEqual(index.candidates(QPointF(1010, 952)), [far])
+
+    def test_follows_edits(self):
+        a, b = makeShape(corners(0, 0, 50, 50)), makeShape(corners(500, 500, 550, 550))
+        index = ShapeIndex()
+        index.rebuild([a, b])
+        a.moveBy(QPointF(500, 500))
+        self.assertEqual(index.candidates(QPointF(10, 10)), [])
+        self.assertEqual(index.candidates(QPointF(520, 520)), [b, a])
+        b.moveVertexBy(2, QPointF(100, 100))
+        self.assertEqual(index.candidates(QPointF(640, 640)), [b])
+        index.remove(b)
+        self.assertIsNone(b.onChange)
+        self.assertEqual(index.candidates(QPointF(520, 520)), [a])
+        c = makeShape(corners(510, 510, 515, 515))
+        index.add(c)
+        self.assertEqual(index.candidates(QPointF(512, 512)), [c, a])
+
+    def test_large_shape(self):
+        huge, small = makeShape(corners(0, 60, 10000, 10060)), makeShape(corners(5000, 5000, 5010, 5010))
+        index = ShapeIndex()
+        index.rebuild([small, huge])
+        self.assertEqual(index.candidates(QPointF(5005, 5005)), [huge, small])
+        self.assertIn(huge, index.large)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import libs.tiledImage as tiledImage
+from libs.tiledImage import TiledImage, isTileable, TILE_SIZE
+from libs.canvas import Canvas
+from helpers import QtTestCase
+
+
+class TestTiledImage(QtTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        image = QImage(3000, 2000, QImage.Format_RGB32)
+        image.fill(QColor(10, 200, 30))
+        p = QPainter(image)
+        p.fillRect(2048, 1536, 512, 464, QColor(250, 0, 0))
+        p.end()
+        self.jpg = os.path.join(self.tmp, 'big.jpg')
+        self.png = os.path.join(self.tmp, 'big.png')
+        image.save(self.jpg, 'JPG', 95)
+        image.save(self.png)
+        self.minPixels = tiledImage.TILED_MIN_PIXELS
+        self.overviewSize = tiledImage.OVERVIEW_SIZE
+        tiledImage.TILED_MIN_PIXELS = 1000 * 1000
+        tiledImage.OVERVIEW_SIZE = 512
+
+    def tearDown(self):
+        tiledImage.TILED_MIN_PIXELS = self.minPixels
+        tiledImage.OVERVIEW_SIZE = self.overviewSize
+        shutil.rmtree(self.tmp)
+
+    def assertColor(self, pixmap, x, y, rgb):
+        color = QColor(pixmap.toImage().pixel(x, y))
+        for channel, expected in zip(color.getRgb()[:3], rgb):
+            self.assertAlmostEqual(channel, expected, delta=12)
+
+    def test_is_tileable(self):
+        self.assertTrue(isTileable(self.jpg))
+        # PNG cannot decode a region without decoding everything above it.
+        self.assertFalse(isTileable(self.png))
+        tiledImage.TILED_MIN_PIXELS = 3000 * 2000 + 1
+        self.assertFalse(isTileable(self.jpg))
+
+    def test_overview(self):
+        tiles = TiledImage()
+        overview = tiles.open(self.jpg)
+        self.assertEqual(tiles.size, QSize(3000, 2000))
+        self.assertEqual(tiles.overviewFactor, 8)
+        self.assertEqual((overview.width(), overview.height()), (375, 250))
+        self.assertIsNone(tiles.factorFor(0.1))
+        self.assertEqual(tiles.factorFor(0.3), 2)
+        self.assertEqual(tiles.factorFor(2.0), 1)
+
+    def test_tiles(self):
+        tiles = TiledImage()
+        tiles.open(self.jpg)
+        visible = QRect(1900, 1400, 800, 500)
+        self.assertEqual(tiles.tiles(visible, 1.0), [])
+        tiles.request(visible, 1.0)
+        self.assertTrue(self.waitFor(lambda: not tiles.pending))
+        # Columns 3-5 and rows 2-3 at full resolution.
+        self.assertEqual(len(tiles.cache), 6)
+        found = dict((rect.getRect(), tile) for rect, tile in tiles.tiles(visible, 1.0))
+        self.assertEqual(len(found), 6)
+        red = found[(2048, 1536, 512, 464)]
+        self.assertEqual((red.width(), red.height()), (512, 464))
+        self.assertColor(red, 256, 200, (250, 0, 0))
+        edge = found[(2560, 1536, 440, 464)]
+        self.assertColor(edge, 100, 100, (10, 200, 30))
+
+        # Zoomed out, the cached tiles stand in until the coarser ones arrive.
+        self.assertEqual(tiles.tiles(visible, 0.3), [])
+        tiles.request(visible, 0.3)
+        self.assertTrue(self.waitFor(lambda: not tiles.pending))
+        rects = [rect.getRect() for rect, _ in tiles.tiles(visible, 0.3)]
+        self.assertEqual(rects, [(1024, 1024, 1024, 976), (2048, 1024, 952, 976)])
+        # Zoomed in again, missing tiles fall back to the coarser level.
+        tiles.cache.pop((1, 4, 3))
+        found = [(key_rect.getRect(), tile.width()) for key_rect, tile in tiles.tiles(visible, 1.0)]
+        self.assertEqual(found[0], ((2048, 1024, 952, 976), 476))
+
+    def test_lru(self):
+        tiles = TiledImage(maxBytes=2 * TILE_SIZE * TILE_SIZE * 4)
+        tiles.open(self.jpg)
+        tiles.request(QRect(0, 0, 1500, 500), 1.0)
+        self.assertTrue(self.waitFor(lambda: not tiles.pending))
+        self.assertEqual(list(tiles.cache), [(1, 1, 0), (1, 2, 0)])
+        self.assertLessEqual(tiles.currentBytes, tiles.maxBytes)
+
+    def test_stale_requests(self):
+        tiles = TiledImage()
+        tiles.open(self.jpg)
+        tiles.request(QRect(0, 0, 100, 100), 1.0)
+        tiles.clear()
+        self.assertFalse(tiles.isOpen())
+        tiles.pool.waitForDone()
+        self.app.processEvents()
+        self.assertEqual(len(tiles.cache), 0)
+
+    def test_canvas_coordinates(self):
+        canvas = Canvas()
+        image = canvas.loadTiledImage(self.jpg)
+        self.assertEqual(image.width(), 375)
+        self.assertEqual(canvas.imageSize(), QSize(3000, 2000))
+        self.assertFalse(canvas.outOfPixmap(QPointF(2999, 1999)))
+        self.assertTrue(canvas.outOfPixmap(QPointF(3001, 10)))
+        self.assertEqual(canvas.intersectionPoint(QPointF(2900, 1000), QPointF(3100, 1000)),
+                         QPointF(3000, 1000))
+        canvas.scale = 0.1
+        self.assertEqual(canvas.minimumSizeHint(), QSize(300, 200))
+
+        # Painting asks for the visible tiles and draws them once decoded.
+        canvas.scale = 1.0
+        canvas.resize(3000, 2000)
+        frame = QImage(800, 500, QImage.Format_ARGB32)
+        canvas.render(frame, QPoint(), QRegion(QRect(2000, 1500, 800, 500)))
+        self.assertTrue(self.waitFor(lambda: not canvas.tiles.pending))
+        self.assertEqual(len(canvas.tiles.tiles(QRect(2000, 1500, 800, 500), 1.0)), 6)
+        canvas.render(frame, QPoint(), QRegion(QRect(2000, 1500, 800, 500)))
+        self.assertColor(QPixmap.fromImage(frame), 300, 300, (250, 0, 0))
+
+        canvas.loadPixmap(QPixmap(10, 10))
+        self.assertFalse(canvas.tiles.isOpen())
+        self.assertEqual(canvas.imageSize(), QSize(10, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
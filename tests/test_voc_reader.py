@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+from unittest import TestCase
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.pascal_voc_io import PascalVocWriter, PascalVocReader
+
+
+class TestPascalVocReader(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.xmlPath = os.path.join(self.folder, 'a.xml')
+        writer = PascalVocWriter('tests', 'a', (512, 512, 3), localImgPath='/data/a.jpg')
+        writer.verified = True
+        writer.addBndBox(60, 40, 430, 504, 'person', 1)
+        writer.addBndBox(100, 100, 200, 300, 'rotated', 0, False, 90)
+        writer.addBndBox2([(1, 2), (30, 4), (50, 60), (7, 80)], 'plate', 0, True, 0)
+        writer.addBndBox3(True, [(i, 2 * i) for i in range(8)], 'cube', 0, 0)
+        writer.save(self.xmlPath)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_records(self):
+        reader = PascalVocReader(self.xmlPath)
+        self.assertTrue(reader.verified)
+        self.assertEqual(reader.imagePath, '/data/a.jpg')
+        person, rotated, plate, cube = reader.getShapes()
+        self.assertEqual(person, ('person', [(60, 40), (430, 40), (430, 504), (60, 504)],
+                                  None, None, True, False, 0, False))
+        self.assertEqual(rotated.angle, 90)
+        self.assertEqual(rotated.points, [(100, 100), (100, 300), (200, 300), (200, 100)])
+        self.assertTrue(plate.tetragon)
+        self.assertEqual(plate.points, [(1, 2), (30, 4), (50, 60), (7, 80)])
+        self.assertTrue(cube.shape3D)
+        self.assertEqual(cube.points, [(i, 2 * i) for i in range(8)])
+
+    def test_without_qt(self):
+        script = ('import sys; sys.path.insert(0, %r)\n'
+                  'from libs.pascal_voc_io import PascalVocReader\n'
+                  'assert len(PascalVocReader(%r).getShapes()) == 4\n'
+                  'assert not [m for m in sys.modules if m.startswith(("PyQt4", "PyQt5"))]\n'
+                  % (os.path.join(dir_name, '..'), self.xmlPath))
+        self.assertEqual(subprocess.call([sys.executable, '-c', script]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
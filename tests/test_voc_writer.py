@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+from unittest import TestCase
+import unittest
+import io
+import os
+import shutil
+import stat
+import sys
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.pascal_voc_io import PascalVocWriter
+
+
+def sampleWriter(verified=False, localImgPath=u'/data/a  b.jpg'):
+    writer = PascalVocWriter('fo&lder', 'img', (512, 640, 3), localImgPath=localImgPath)
+    writer.verified = verified
+    writer.addBndBox(1, 40, 430, 504, 'person', 1)
+    writer.addBndBox(60, 40, 430, 504, u'臉書 <&> two  spaces', 0, False, 30)
+    writer.addBndBox2([(1.4, 2.6), (30, 4), (50, 60), (7, 80)], 'plate', 0, True, 0)
+    writer.addBndBox3(True, [(i, 2 * i) for i in range(8)], '', 0, 1)
+    return writer
+
+
+def prettified(writer):
+    root = writer.genXML()
+    writer.appendObjects(root)
+    return writer.prettify(root)
+
+
+class TestPascalVocWriter(TestCase):
+
+    def test_matches_prettify(self):
+        for verified in (False, True):
+            for localImgPath in (None, u'/data/a  b.jpg'):
+                writer = sampleWriter(verified, localImgPath)
+                out = io.BytesIO()
+                self.assertTrue(writer.serialize(out))
+                self.assertEqual(out.getvalue(), prettified(writer))
+
+    def test_save_replaces_atomically(self):
+        folder = tempfile.mkdtemp()
+        try:
+            target = os.path.join(folder, 'img.xml')
+            with open(target, 'w') as f:
+                f.write('old')
+            os.chmod(target, 0o640)
+            writer = sampleWriter()
+            writer.save(target)
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), prettified(writer))
+            self.assertEqual(os.listdir(folder), ['img.xml'])
+            # The annotation keeps its permissions; a new one gets the default.
+            self.assertEqual(stat.S_IMODE(os.stat(target).st_mode), 0o640)
+            writer.save(os.path.join(folder, 'new.xml'))
+            self.assertEqual(stat.S_IMODE(os.stat(os.path.join(folder, 'new.xml')).st_mode),
+                             0o644)
+        finally:
+            shutil.rmtree(folder)
+
+    def test_control_characters_are_refused(self):
+        folder = tempfile.mkdtemp()
+        try:
+            target = os.path.join(folder, 'img.xml')
+            writer = PascalVocWriter('folder', 'img', (512, 640, 3))
+            writer.addBndBox(1, 40, 430, 504, u'ca\x01t', 0)
+            self.assertRaises(ValueError, writer.save, target)
+            self.assertEqual(os.listdir(folder), [])
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    unittest.main()